@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Session agent: keeps an unlocked vault key in memory, like ssh-agent.
+
+Run ``python agent.py`` (optionally with ``--ttl`` seconds) and leave it
+running. The first CLI command that has to derive the key hands it to the
+agent, with the absolute path of its vault; later commands ask the agent
+to read, search, save, encrypt or decrypt entries instead of running the
+KDF again. The agent never sees the master password. The key is forgotten
+after the TTL, on ``lock``, or when the agent exits.
+
+Requests and replies are single JSON lines over a Unix domain socket. The
+socket lives in a directory only the owner can enter, is itself mode 0600,
+and connections from other users are refused by peer credentials where the
+platform reports them.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import time
+
+from itertools import islice
+
+from cache import VaultCache
+from database import VaultFile, close_vault, get_password_by_id, iter_metadata, mark_password_used, save_password
+from derive_key import Cipher
+
+SOCKET_ENV = 'PASSWORD_MANAGER_AGENT_SOCK'
+SOCKET_NAME = 'agent.sock'
+DEFAULT_TTL = 15 * 60
+CLIENT_TIMEOUT = 5.0
+MAX_REQUEST_BYTES = 1 << 20
+
+
+class AgentError(Exception):
+    """The agent refused or failed a request"""
+
+
+def default_socket_path():
+    """$PASSWORD_MANAGER_AGENT_SOCK, else a per-user directory in the runtime or temp dir"""
+    if os.environ.get(SOCKET_ENV):
+        return os.environ[SOCKET_ENV]
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(base, f"password-manager-{os.getuid()}", SOCKET_NAME)
+
+
+def prepare_socket_dir(path):
+    """Create the socket's directory as 0700, or check an existing one is private to us"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise AgentError(f"{directory} must be owned by you and not accessible to others")
+
+
+class AgentState:
+    """The unlocked session the agent is holding, if any.
+
+    The CLI also uses one directly, in-process, when there is no agent, so
+    every command goes through the same ops either way.
+    """
+
+    def __init__(self, default_ttl=DEFAULT_TTL):
+        self.default_ttl = default_ttl
+        self.vault_file = None  # VaultFile of the unlocked vault
+        self.cipher = None
+        self.vault = None
+        self.expires_at = 0.0
+
+    @property
+    def unlocked(self):
+        return self.cipher is not None and time.monotonic() < self.expires_at
+
+    def add(self, vault_path, key, ttl=None):
+        """Hold key for the existing vault file at vault_path, an absolute path"""
+        if not os.path.isabs(vault_path) or not os.path.isfile(vault_path):
+            raise AgentError(f"No vault file at {vault_path}")
+        self.lock()
+        self.vault_file = VaultFile(vault_path)
+        self.cipher = Cipher(key if isinstance(key, bytes) else key.encode())
+        self.vault = VaultCache(self.cipher, self.vault_file)
+        self.expires_at = time.monotonic() + (ttl or self.default_ttl)
+
+    def lock(self):
+        if self.vault_file is not None:
+            close_vault(self.vault_file)
+        self.vault_file = self.cipher = self.vault = None
+        self.expires_at = 0.0
+
+    def require_unlocked(self):
+        if not self.unlocked:
+            self.lock()
+            raise AgentError("Agent is locked")
+
+    def request(self, op, **fields):
+        """Same call as AgentClient.request, for in-process use"""
+        return self.handle(dict(fields, op=op))
+
+    def handle(self, request):
+        """Run one request dict and return the reply fields"""
+        op = request.get('op')
+        if op == 'status':
+            if not self.unlocked:
+                self.lock()
+                return {'unlocked': False}
+            return {'unlocked': True, 'vault': self.vault_file.path,
+                    'expires_in': round(self.expires_at - time.monotonic())}
+        if op == 'add':
+            self.add(request['vault'], request['key'], request.get('ttl'))
+            return {}
+        if op == 'lock':
+            self.lock()
+            return {}
+
+        self.require_unlocked()
+        if op == 'encrypt':
+            return {'token': self.cipher.encrypt(request['password']).decode()}
+        if op == 'decrypt':
+            return {'password': self.cipher.decrypt(request['token'].encode())}
+        if op == 'get':
+            entry = get_password_by_id(request['id'], self.cipher, self.vault_file)
+            if entry is None:
+                raise AgentError(f"No password entry with id {request['id']}")
+            mark_password_used(entry['id'], self.vault_file)
+            return {'entry': entry}
+        if op == 'list':
+            entries = iter_metadata(self.vault_file, request.get('order_by', 'id'), key=self.cipher)
+            return {'entries': list(islice(entries, request.get('limit')))}
+        if op == 'search':
+            self.vault.load()  # another process may have changed the vault since
+            if not self.vault.encrypted_metadata:
+                self.vault.load_all()  # Plain metadata is searched in memory
+            entries = self.vault.filter(request['query'])
+            if request.get('secrets'):
+                return {'entries': [self.vault.with_secret(entry) for entry in entries]}
+            return {'entries': [{'id': e.id, 'website': e.website, 'username': e.username} for e in entries]}
+        if op == 'save':
+            entry_id = save_password(request['website'], request['username'], request['password'], self.cipher,
+                                     self.vault_file)
+            return {'id': entry_id}
+        raise AgentError(f"Unknown op {op!r}")
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    # The agent serves one connection at a time: a client that stops
+    # talking is dropped after this long instead of blocking everyone else
+    timeout = CLIENT_TIMEOUT
+
+    def handle(self):
+        if not self.server.peer_allowed(self.request):
+            return
+        try:
+            line = self.rfile.readline(MAX_REQUEST_BYTES)
+        except OSError:  # Timed out, or the client went away
+            return
+        try:
+            reply = dict(self.server.state.handle(json.loads(line)), ok=True)
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e) or type(e).__name__}
+        self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class AgentServer(socketserver.UnixStreamServer):
+    """Serves one request per connection, in order, and expires the key between requests"""
+
+    def __init__(self, path, state):
+        self.state = state
+        super().__init__(path, AgentRequestHandler)
+
+    def server_bind(self):
+        # Create the socket file with no access for anyone else from the start
+        old_umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(old_umask)
+
+    def peer_allowed(self, conn):
+        if not hasattr(socket, 'SO_PEERCRED'):
+            return True  # directory and socket permissions still apply
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', creds)
+        return uid == os.getuid()
+
+    def service_actions(self):
+        if self.state.cipher is not None and not self.state.unlocked:
+            self.state.lock()
+
+
+def serve(path=None, ttl=DEFAULT_TTL):
+    """Run the agent in the foreground until interrupted"""
+    path = path or default_socket_path()
+    prepare_socket_dir(path)
+    if os.path.exists(path):
+        if AgentClient(path).available():
+            raise AgentError(f"An agent is already listening on {path}")
+        os.remove(path)  # left behind by an agent that did not shut down cleanly
+
+    state = AgentState(ttl)
+    server = AgentServer(path, state)
+    # Clean up (forget the key, remove the socket) on kill as well as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"{SOCKET_ENV}={path}; export {SOCKET_ENV};", flush=True)
+    try:
+        server.serve_forever(poll_interval=1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state.lock()
+        server.server_close()
+        os.remove(path)
+
+
+class AgentClient:
+    """Talks to a running agent, one connection per request"""
+
+    def __init__(self, path=None, timeout=CLIENT_TIMEOUT):
+        self.path = path or default_socket_path()
+        self.timeout = timeout
+
+    def request(self, op, **fields):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(self.timeout)
+            conn.connect(self.path)
+            conn.sendall(json.dumps(dict(fields, op=op)).encode() + b'\n')
+            with conn.makefile('rb') as f:
+                line = f.readline()
+        if not line:
+            raise AgentError("Agent closed the connection")
+        reply = json.loads(line)
+        if not reply.pop('ok'):
+            raise AgentError(reply['error'])
+        return reply
+
+    def available(self):
+        """True if an agent answers on the socket"""
+        try:
+            self.request('status')
+            return True
+        except (OSError, ValueError, AgentError):
+            return False
+
+    def status(self):
+        return self.request('status')
+
+    def add(self, vault_path, key, ttl=None):
+        """Hand the agent the derived key of the vault file at vault_path"""
+        key = key.decode() if isinstance(key, bytes) else key
+        self.request('add', vault=os.path.abspath(vault_path), key=key, ttl=ttl)
+
+    def lock(self):
+        self.request('lock')
+
+    def encrypt(self, password):
+        return self.request('encrypt', password=password)['token'].encode()
+
+    def decrypt(self, token):
+        return self.request('decrypt', token=token.decode() if isinstance(token, bytes) else token)['password']
+
+    def get(self, entry_id):
+        return self.request('get', id=entry_id)['entry']
+
+    def list(self, order_by='id', limit=None):
+        return self.request('list', order_by=order_by, limit=limit)['entries']
+
+    def search(self, query, secrets=False):
+        return self.request('search', query=query, secrets=secrets)['entries']
+
+    def save(self, website, username, password):
+        return self.request('save', website=website, username=username, password=password)['id']
+
+
+def connect_agent(path=None):
+    """Return a client for a running agent, or None if there is none"""
+    client = AgentClient(path)
+    if not os.path.exists(client.path) or not client.available():
+        return None
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password manager session agent")
+    parser.add_argument("--ttl", type=int, default=DEFAULT_TTL, help="seconds to keep a key (default: %(default)s)")
+    parser.add_argument("--socket", help=f"socket path (default: ${SOCKET_ENV} or a per-user runtime dir)")
+    args = parser.parse_args()
+    try:
+        serve(args.socket, args.ttl)
+    except AgentError as e:
+        parser.exit(1, f"agent: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Password health audit: reused, weak and duplicate entries.
+
+Every secret gets a fingerprint, an HMAC-SHA256 under the vault key's
+audit subkey, and a strength score from 0 to 4. Both are cached per entry
+in the password_audit table. Changing or deleting an entry drops its row,
+so a re-audit only decrypts and scores entries that are new or changed
+since the last one. Finding reuse is then a single pass grouping the
+cached fingerprints; no secret is compared, or kept, in plaintext.
+
+Fingerprints are keyed, so they cannot be checked against a dictionary
+without the vault key, but they do show which entries share a secret to
+anyone who can read the file.
+"""
+
+import hmac
+import math
+import time
+from collections import defaultdict
+
+import parallel
+from database import open_vault, get_password_metadata
+from derive_key import as_cipher
+
+# Bump when scoring changes, so cached scores are recomputed
+AUDIT_VERSION = 1
+
+# Entries decrypted and scored per batch
+AUDIT_BATCH_SIZE = 2_000
+
+FINGERPRINT_SIZE = 16
+
+# Score = how many of these entropy thresholds (bits) a password reaches;
+# below WEAK_SCORE counts as weak
+SCORE_BITS = (30, 45, 60, 80)
+WEAK_SCORE = 2
+
+# Character pools, by the classes a password draws from
+POOL_SIZES = (
+    (str.islower, 26),
+    (str.isupper, 26),
+    (str.isdigit, 10),
+)
+SYMBOL_POOL = 33      # printable ASCII punctuation and space
+NON_ASCII_POOL = 100  # a rough guess; rarely decides a score
+
+# Scored 0 whatever their length, compared case-insensitively
+COMMON_PASSWORDS = frozenset({
+    '123456', '123456789', '12345678', '12345', '1234567', '1234567890', '111111', '000000', '123123',
+    'password', 'password1', 'password123', 'passw0rd', 'qwerty', 'qwerty123', 'qwertyuiop', 'abc123',
+    'iloveyou', 'admin', 'welcome', 'letmein', 'monkey', 'dragon', 'football', 'baseball', 'sunshine',
+    'princess', 'master', 'shadow', 'superman', 'trustno1', 'starwars', 'whatever', 'login', 'hello',
+    'changeme', 'secret', 'zaq12wsx', '1q2w3e4r', 'asdfghjkl',
+})
+
+BADGES = ('reused', 'weak')
+
+
+def fingerprint(audit_key, password):
+    """Keyed fingerprint of a secret: equal secrets give equal fingerprints"""
+    return hmac.digest(audit_key, password.encode(), 'sha256')[:FINGERPRINT_SIZE]
+
+
+def strength_bits(password):
+    """Rough entropy of a password in bits.
+
+    Each character is worth log2 of the pool its classes span, except that
+    one repeating or continuing a run (aaa, abc, 321) is worth a single bit.
+    """
+    if password.casefold() in COMMON_PASSWORDS:
+        return 0.0
+
+    pool = sum(size for test, size in POOL_SIZES if any(test(ch) for ch in password if ch.isascii()))
+    if any(ch.isascii() and not ch.isalnum() for ch in password):
+        pool += SYMBOL_POOL
+    if any(not ch.isascii() for ch in password):
+        pool += NON_ASCII_POOL
+    if pool <= 1:
+        return 0.0
+
+    per_char = math.log2(pool)
+    bits = 0.0
+    previous = previous_step = None
+    for ch in password:
+        step = ord(ch) - ord(previous) if previous is not None else None
+        if step is not None and (step == 0 or (abs(step) == 1 and step == previous_step)):
+            bits += 1
+        else:
+            bits += per_char
+        previous, previous_step = ch, step
+    return bits
+
+
+def score_password(password):
+    """0 (trivial) to 4 (strong)"""
+    bits = strength_bits(password)
+    return sum(bits >= threshold for threshold in SCORE_BITS)
+
+
+def score_many(audit_key, passwords):
+    """(fingerprint, score) of each password; a secret repeated in the batch is scored once"""
+    scores = {}
+    results = []
+    for password in passwords:
+        digest = fingerprint(audit_key, password)
+        if digest not in scores:
+            scores[digest] = score_password(password)
+        results.append((digest, scores[digest]))
+    return results
+
+
+class AuditResult:
+    """One audit of a vault: per-entry scores and the entries sharing a secret"""
+
+    def __init__(self, rows, audited, seconds, metadata=None):
+        self.scores = {entry_id: score for entry_id, _, score in rows}
+        self.audited = audited  # entries decrypted and scored by this run; the rest came from the cache
+        self.seconds = seconds
+
+        groups = defaultdict(list)
+        for entry_id, digest, _ in rows:
+            groups[digest].append(entry_id)
+        self.reuse_groups = [ids for ids in groups.values() if len(ids) > 1]
+        self._reuse_counts = {entry_id: len(ids) for ids in self.reuse_groups for entry_id in ids}
+
+        # Entries that are the same login twice: website, username and secret all equal
+        self.duplicate_groups = []
+        self.entries = {entry['id']: entry for entry in metadata} if metadata is not None else {}
+        if metadata is not None:
+            digests = {entry_id: digest for entry_id, digest, _ in rows}
+            logins = defaultdict(list)
+            for entry in self.entries.values():
+                if entry['id'] in digests:
+                    logins[entry['website'].casefold(), entry['username'].casefold(),
+                           digests[entry['id']]].append(entry['id'])
+            self.duplicate_groups = [ids for ids in logins.values() if len(ids) > 1]
+
+    def reuse_count(self, entry_id):
+        """How many entries, this one included, share its secret (0 if it is unique)"""
+        return self._reuse_counts.get(entry_id, 0)
+
+    def is_weak(self, entry_id):
+        score = self.scores.get(entry_id)
+        return score is not None and score < WEAK_SCORE
+
+    def issues(self, entry_id):
+        """The BADGES that apply to an entry"""
+        return [badge for badge, applies in zip(BADGES, (self.reuse_count(entry_id), self.is_weak(entry_id)))
+                if applies]
+
+    def flagged(self):
+        """Entries with at least one issue, with their metadata if it was read"""
+        duplicates = {entry_id for ids in self.duplicate_groups for entry_id in ids[1:]}
+        for entry_id in sorted(self.scores):
+            issues = self.issues(entry_id) + (['duplicate'] if entry_id in duplicates else [])
+            if issues:
+                entry = self.entries.get(entry_id, {})
+                yield {'id': entry_id, 'website': entry.get('website'), 'username': entry.get('username'),
+                       'score': self.scores[entry_id], 'reused': self.reuse_count(entry_id),
+                       'issues': ','.join(issues)}
+
+    def summary(self):
+        return {
+            'entries': len(self.scores),
+            'weak': sum(score < WEAK_SCORE for score in self.scores.values()),
+            'reused': len(self._reuse_counts),
+            'reuse_groups': len(self.reuse_groups),
+            'duplicates': sum(len(ids) - 1 for ids in self.duplicate_groups),
+            'audited': self.audited,
+            'seconds': self.seconds,
+        }
+
+
+def audit_vault(master_password, key, find_duplicates=False, batch_size=AUDIT_BATCH_SIZE, progress=None):
+    """Audit the vault, decrypting only entries without a current cached result.
+
+    Missing results are computed in batches (one parallel decryption, then
+    fingerprints and scores) and cached. find_duplicates also reads every
+    entry's metadata, to spot the same login saved twice. progress, if
+    given, is called as progress(audited, elapsed_seconds) after each batch.
+    """
+    start = time.perf_counter()
+    vault = open_vault(master_password)
+    cipher = as_cipher(key)
+    audited = 0
+
+    after_id = 0
+    while True:
+        rows = vault.unaudited_rows(after_id, AUDIT_VERSION, batch_size)
+        if not rows:
+            break
+        passwords = parallel.decrypt_many(cipher, [row[1] for row in rows])
+        vault.store_audit([(digest, score, AUDIT_VERSION, entry_id, token) for (entry_id, token), (digest, score)
+                           in zip(rows, score_many(cipher.audit_key, passwords))])
+        after_id = rows[-1][0]
+        audited += len(rows)
+        if progress:
+            progress(audited, time.perf_counter() - start)
+
+    metadata = get_password_metadata(master_password, cipher) if find_duplicates else None
+    return AuditResult(vault.audit_rows(), audited, time.perf_counter() - start, metadata)
@@ -0,0 +1,849 @@
+#!/usr/bin/env python3
+"""Performance benchmarks for the password manager core.
+
+Run a single suite with e.g. ``python benchmark.py database --rows 10000``.
+Every suite works on throwaway files in a temporary directory and a random
+Fernet key, so no real vault or master password is touched.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from cryptography.fernet import Fernet
+
+import audit
+import breach
+import database
+import generator
+import parallel
+import tracing
+import transfer
+from database import (Vault, CREATE_PASSWORDS_TABLE, SELECT_PASSWORD_BY_ID, INSERT_PASSWORD, PAGE_ORDERS, PAGE_SIZE,
+                      REKEY_BATCH_SIZE)
+from derive_key import Cipher, KDFS, benchmark_kdf, derive_key, tune_kdf, time_kdf, kdf_memory_bytes
+
+
+def timed(func, *args):
+    """Run func(*args) and return (result, seconds)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def print_table(title, header, rows):
+    """Print rows as a fixed-width table"""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    print(f"\n{title}")
+    for row in [header, ['-' * width for width in widths]] + rows:
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+
+
+def sample_entries(count):
+    """Deterministic fake entries for benchmarking"""
+    return [(f"site{i}.example.com", f"user{i}@example.com", f"password-{i:08d}") for i in range(count)]
+
+
+SYLLABLES = ['ka', 'lo', 'mi', 'net', 'box', 'hub', 'ra', 'zen', 'pay', 'shop', 'mail', 'cloud',
+             'tor', 'vi', 'sun', 'dev', 'go', 'bank', 'al', 'ex', 'pro', 'tek', 'ly', 'io']
+TLDS = ['com', 'org', 'net', 'io', 'dev', 'co.uk']
+
+
+def realistic_entries(count, seed=1):
+    """Fake entries with varied website and username text, for search benchmarks"""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        user = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+        entries.append((f"{name}.{rng.choice(TLDS)}", f"{user}{rng.randint(1, 999)}@{rng.choice(SYLLABLES)}mail.com",
+                        f"password-{i:08d}"))
+    return entries
+
+
+# Connection-per-call access, as database.py did before the Vault repository
+
+LEGACY_INSERT = "INSERT INTO passwords (website, username, password) VALUES (?, ?, ?)"
+
+def legacy_encrypt(key, password):
+    return Fernet(key).encrypt(password.encode())
+
+
+def legacy_decrypt(key, encrypted_password):
+    return Fernet(key).decrypt(encrypted_password).decode()
+
+
+def legacy_insert(db_name, website, username, password, key):
+    conn = sqlite3.connect(db_name)
+    conn.execute(LEGACY_INSERT, (website, username, legacy_encrypt(key, password)))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get(db_name, entry_id, key):
+    conn = sqlite3.connect(db_name)
+    row = conn.execute(SELECT_PASSWORD_BY_ID, (entry_id,)).fetchone()
+    conn.close()
+    return legacy_decrypt(key, row[3])
+
+
+def bench_database(rows):
+    """Ops/sec for single-row inserts and reads: connection per call vs one Vault"""
+    key = Fernet.generate_key()
+    entries = sample_entries(rows)
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, 'legacy.db')
+        conn = sqlite3.connect(legacy_db)
+        conn.execute(CREATE_PASSWORDS_TABLE)
+        conn.close()
+
+        def legacy_inserts():
+            for website, username, password in entries:
+                legacy_insert(legacy_db, website, username, password, key)
+
+        def legacy_reads():
+            for entry_id in range(1, rows + 1):
+                legacy_get(legacy_db, entry_id, key)
+
+        vault = Vault(os.path.join(tmp, 'vault.db'))
+
+        def vault_inserts():
+            for website, username, password in entries:
+                vault.save(website, username, password, key)
+
+        def vault_reads():
+            for entry_id in range(1, rows + 1):
+                vault.get_by_id(entry_id, key)
+
+        for label, func in [("insert", legacy_inserts), ("read", legacy_reads)]:
+            _, seconds = timed(func)
+            results.append([label, "connection per call", f"{rows / seconds:,.0f}"])
+        for label, func in [("insert", vault_inserts), ("read", vault_reads)]:
+            _, seconds = timed(func)
+            results.append([label, "Vault (WAL, one connection)", f"{rows / seconds:,.0f}"])
+        vault.close()
+
+    print_table(f"database: {rows:,} single-row operations", ["op", "access", "ops/sec"], results)
+    return results
+
+
+def bench_cipher(rows):
+    """Decryption throughput: new Fernet per row vs a reused Cipher vs the batch path"""
+    key = Fernet.generate_key()
+    cipher = Cipher(key)
+    tokens = cipher.encrypt_many([password for _, _, password in sample_entries(rows)])
+
+    methods = [
+        ("Fernet(key) per row", lambda: [legacy_decrypt(key, token) for token in tokens]),
+        ("Cipher.decrypt per row", lambda: [cipher.decrypt(token) for token in tokens]),
+        ("Cipher.decrypt_many", lambda: cipher.decrypt_many(tokens)),
+    ]
+    results = []
+    for label, func in methods:
+        _, seconds = timed(func)
+        results.append([label, f"{seconds * 1000:,.0f} ms", f"{rows / seconds:,.0f}"])
+
+    print_table(f"cipher: decrypt {rows:,} tokens", ["method", "time", "rows/sec"], results)
+    return results
+
+
+def bench_parallel(rows, worker_counts):
+    """Bulk decryption time per worker count, for threads and processes"""
+    cipher = Cipher(Fernet.generate_key())
+    tokens = cipher.encrypt_many([password for _, _, password in sample_entries(rows)])
+    results = []
+
+    for mode in ("thread", "process"):
+        baseline = None
+        for workers in worker_counts:
+            # One worker is the serial path, whichever mode was asked for
+            _, seconds = timed(parallel.decrypt_many, cipher, tokens, workers, mode)
+            baseline = baseline or seconds
+            results.append([mode, workers, f"{seconds * 1000:,.0f} ms", f"{rows / seconds:,.0f}",
+                            f"{baseline / seconds:.2f}x"])
+
+    print_table(f"parallel: decrypt {rows:,} tokens on {os.cpu_count()} CPUs",
+                ["mode", "workers", "time", "rows/sec", "speed-up"], results)
+    return results
+
+
+def bench_import(rows, workers):
+    """Rows/sec for per-row saves vs batched import_entries in one transaction"""
+    key = Fernet.generate_key()
+    entries = [{'website': w, 'username': u, 'password': p} for w, u, p in sample_entries(rows)]
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = Vault(os.path.join(tmp, 'per_row.db'))
+
+        def per_row():
+            for entry in entries:
+                vault.save(entry['website'], entry['username'], entry['password'], key)
+
+        _, seconds = timed(per_row)
+        results.append(["save() per row", f"{rows / seconds:,.0f}"])
+        vault.close()
+
+        for pool in sorted({1, workers}):
+            vault = Vault(os.path.join(tmp, f'import_{pool}.db'))
+            stats = vault.import_entries(entries, key, workers=pool)
+            label = "import_entries" if pool == 1 else f"import_entries, {pool} threads"
+            results.append([label, f"{stats['rows_per_sec']:,.0f}"])
+            vault.close()
+
+    print_table(f"import: {rows:,} rows", ["method", "rows/sec"], results)
+    return results
+
+
+def bench_export(sizes):
+    """Throughput and peak Python heap of a streaming export, per vault size"""
+    key = Fernet.generate_key()
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)  # vault files are resolved relative to the working directory
+        try:
+            for size in sizes:
+                master_password = f"bench-{size}"
+                entries = ({'website': w, 'username': u, 'password': p} for w, u, p in sample_entries(size))
+                database.import_entries(entries, key, master_password)
+
+                tracemalloc.start()
+                stats = transfer.export_archive(f"export-{size}.pmx", key, master_password, "passphrase")
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                database.close_vault(master_password)
+
+                results.append([f"{size:,}", f"{stats['rows_per_sec']:,.0f}", f"{peak / 1024:,.0f} KiB"])
+        finally:
+            os.chdir(cwd)
+
+    print_table("export: streaming archive", ["rows", "rows/sec", "peak heap"], results)
+    return results
+
+
+def bench_search(rows, queries):
+    """Per-keystroke latency of the trigram index while typing each query"""
+    from search import SearchIndex
+
+    index = SearchIndex()
+    entries = realistic_entries(rows)
+    _, build_seconds = timed(lambda: [index.add(i, w, u) for i, (w, u, _) in enumerate(entries, 1)])
+
+    # Linear scan over pre-lowered fields, for comparison
+    lowered = [(i, w.lower(), u.lower()) for i, (w, u, _) in enumerate(entries, 1)]
+
+    def linear(query):
+        return [i for i, w, u in lowered if query in w or query in u]
+
+    results = [["(build index)", "", f"{build_seconds * 1000:,.1f} ms", "", ""]]
+    for query in queries:
+        for length in range(1, len(query) + 1):
+            prefix = query[:length]
+            hits, seconds = timed(index.search, prefix)
+            _, linear_seconds = timed(linear, prefix)
+            results.append([query, prefix, f"{seconds * 1000:,.2f} ms", f"{linear_seconds * 1000:,.2f} ms",
+                            f"{len(hits):,}"])
+        index.search('')  # start the next query from scratch
+
+    print_table(f"search: typing into {rows:,} entries", ["query", "keystroke", "index", "linear scan", "hits"],
+                results)
+    return results
+
+
+def bench_migration(sizes):
+    """Time to upgrade a pre-versioned vault file in place, per migration"""
+    results = []
+    # Real Fernet tokens for 100-character passwords are about 200 bytes
+    fake_token = os.urandom(200)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"legacy-{size}.db")
+            conn = sqlite3.connect(path)
+            conn.execute(CREATE_PASSWORDS_TABLE)
+            conn.executemany(LEGACY_INSERT, ((w, u, fake_token) for w, u, _ in realistic_entries(size)))
+            conn.commit()
+            conn.close()
+            megabytes = os.path.getsize(path) / 2**20
+
+            vault, seconds = timed(Vault, path)
+            steps = ", ".join(f"v{version} {step * 1000:,.0f} ms" for version, step in vault.migration_log)
+            results.append([f"{size:,}", f"{megabytes:,.0f} MiB", f"{seconds * 1000:,.0f} ms", steps])
+            vault.close()
+
+    print_table("migration: legacy vault to current schema", ["rows", "file", "total", "steps"], results)
+    return results
+
+
+def bench_pagination(rows, page_size):
+    """First-page and deep-page latency of keyset paging vs loading all metadata"""
+    fake_token = os.urandom(200)
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = Vault(os.path.join(tmp, "paging.db"))
+        with vault.transaction() as conn:
+            conn.executemany(INSERT_PASSWORD, ((w, u, fake_token, now - i, now - i)
+                                               for i, (w, u, _) in enumerate(realistic_entries(rows))))
+
+        _, full_seconds = timed(vault.get_metadata)
+        results = [["(all metadata)", f"{rows:,}", f"{full_seconds * 1000:,.1f} ms", ""]]
+
+        columns = "id, website, username"
+        for order_by in PAGE_ORDERS:
+            first, first_seconds = timed(vault.get_page, columns, None, page_size, order_by)
+            # A page deep into the list: anchored on the entry at about 90%
+            anchor = vault.get_page(columns, None, rows * 9 // 10, order_by)[-1][0]
+            _, deep_seconds = timed(vault.get_page, columns, anchor, page_size, order_by)
+            results.append([order_by, f"{len(first):,}", f"{first_seconds * 1000:,.2f} ms",
+                            f"{deep_seconds * 1000:,.2f} ms"])
+        vault.close()
+
+    print_table(f"pagination: {page_size}-row pages of {rows:,} entries", ["order", "rows", "first page", "page at 90%"],
+                results)
+    return results
+
+
+def peak_rss_kib():
+    """Peak resident set size of this process image in KiB (Linux), else of the process"""
+    try:
+        # VmHWM starts over at exec, unlike ru_maxrss which children inherit
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_kdf(params):
+    """Run in a freshly spawned process: (seconds, peak RSS growth in KiB) of one derivation"""
+    before = peak_rss_kib()
+    seconds = time_kdf(params)
+    return seconds, peak_rss_kib() - before
+
+
+def bench_kdf(targets, kdfs):
+    """Unlock latency and memory cost of each KDF, auto-tuned to each target time"""
+    rate = benchmark_kdf()
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for kdf in kdfs:
+        for target in targets:
+            params = tune_kdf(kdf, target)
+            cost = ", ".join(f"{name}={value:,}" for name, value in params.items() if name not in ('kdf', 'salt'))
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                seconds, peak_kib = pool.submit(measure_kdf, params).result()
+            results.append([kdf, f"{target * 1000:,.0f} ms", cost, f"{seconds * 1000:,.0f} ms",
+                            f"{kdf_memory_bytes(params) / 2**20:,.0f} MiB", f"{peak_kib / 1024:,.0f} MiB"])
+
+    print_table(f"kdf: unlock cost per KDF (PBKDF2-SHA256 runs {rate:,.0f} iterations/sec here)",
+                ["kdf", "target", "parameters", "measured unlock", "memory cost", "peak RSS growth"], results)
+    return results
+
+
+def bench_rekey(rows):
+    """Re-encrypting a whole vault under a new key"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = Vault(os.path.join(tmp, "rekey.db"))
+        old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+        vault.import_entries(({'website': w, 'username': u, 'password': p} for w, u, p in realistic_entries(rows)),
+                             old_key)
+        stats = vault.rekey(old_key, new_key, '{}')
+        vault.close()
+
+    results = [[f"{stats['rekeyed']:,}", f"{stats['seconds']:.2f} s", f"{stats['rows_per_sec']:,.0f}"]]
+    print_table("rekey: re-encrypt every secret in one transaction", ["rows", "time", "rows/sec"], results)
+    return results
+
+
+class RotationInterrupted(Exception):
+    pass
+
+
+def bench_rotate(rows, batch_size):
+    """Master-password rotation into a new file: straight through, and resumed after an interruption"""
+    params = tune_kdf('pbkdf2-sha256', 0.01)
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for metadata in ("plaintext", "encrypted"):
+                for interrupted in (False, True):
+                    old_password, new_password = f"bench-{metadata}-{interrupted}", f"rotated-{metadata}-{interrupted}"
+                    key = derive_key(old_password, database.load_kdf_params(old_password, 'pbkdf2-sha256', 0.01))
+                    entries = ({'website': w, 'username': u, 'password': p} for w, u, p in realistic_entries(rows))
+                    database.import_entries(entries, key, old_password)
+                    if metadata == "encrypted":
+                        database.encrypt_vault_metadata(old_password, key)
+
+                    if interrupted:
+                        def stop_halfway(done, elapsed):
+                            if done >= rows // 2:
+                                raise RotationInterrupted
+                        try:
+                            database.rotate_master_password(old_password, key, new_password, params, batch_size,
+                                                            progress=stop_halfway)
+                        except RotationInterrupted:
+                            pass
+
+                    _, stats = database.rotate_master_password(old_password, key, new_password, params, batch_size)
+                    results.append([metadata, "resumed" if interrupted else "straight",
+                                    f"{stats['resumed_from']:,}", f"{stats['rotated'] - stats['resumed_from']:,}",
+                                    f"{stats['seconds']:.2f} s", f"{stats['rows_per_sec']:,.0f}"])
+                    database.close_vault(new_password)
+        finally:
+            os.chdir(cwd)
+
+    print_table(f"rotate: {rows:,} rows into a new vault, batches of {batch_size:,}",
+                ["metadata", "run", "resumed at", "copied", "time", "rows/sec"], results)
+    return results
+
+
+def bench_tracing(calls):
+    """Cost of the tracing hooks per call, with tracing off and on"""
+    def bare():
+        pass
+
+    hooked = tracing.traced('bench.hooked')(bare)
+    cipher = Cipher(Fernet.generate_key())
+    tokens = cipher.encrypt_many([f"password-{i:08d}" for i in range(calls // 100)])
+
+    def per_row_decrypt():
+        for token in tokens:
+            cipher.decrypt(token)
+
+    def spans():
+        for _ in range(calls):
+            with tracing.span('bench.span'):
+                pass
+
+    def best(func, repeat=3):
+        return min(timed(func)[1] for _ in range(repeat))
+
+    results = []
+    for state in ("off", "on"):
+        if state == "on":
+            tracing.enable(os.devnull)
+        bare_seconds = best(lambda: [bare() for _ in range(calls)])
+        hooked_seconds = best(lambda: [hooked() for _ in range(calls)])
+        span_seconds = best(spans)
+        decrypt_seconds = best(per_row_decrypt)
+        results.append([state, f"{(hooked_seconds - bare_seconds) / calls * 1e9:,.0f} ns",
+                        f"{span_seconds / calls * 1e9:,.0f} ns", f"{decrypt_seconds / len(tokens) * 1e6:,.2f} µs"])
+    tracing.disable()
+
+    print_table(f"tracing: overhead over {calls:,} calls", ["tracing", "traced() extra", "with span()",
+                                                          "cipher.decrypt per row"], results)
+    return results
+
+
+def bench_generator(count):
+    """Generated passwords per second by policy, against one secrets.choice call per character"""
+    import secrets
+
+    policies = [
+        ("charset 20", generator.CharsetPolicy()),
+        ("charset 12, no symbols", generator.CharsetPolicy(12, symbols='')),
+        ("charset 8", generator.CharsetPolicy(8)),
+        ("diceware 6", generator.DicewarePolicy()),
+    ]
+    results = []
+    for name, policy in policies:
+        passwords, seconds = timed(policy.generate, count)
+        assert len(passwords) == count
+        results.append([name, f"{policy.entropy_bits():.1f}", f"{count:,}", f"{count / seconds:,.0f}"])
+
+    # The per-character baseline, on a tenth of the work
+    alphabet, baseline_count = generator.CharsetPolicy().alphabet, max(count // 10, 1)
+    _, seconds = timed(lambda: [''.join(secrets.choice(alphabet) for _ in range(generator.DEFAULT_LENGTH))
+                                for _ in range(baseline_count)])
+    results.append(["secrets.choice per char", "", f"{baseline_count:,}", f"{baseline_count / seconds:,.0f}"])
+
+    print_table("generator: bulk os.urandom + rejection sampling", ["policy", "bits", "count", "per sec"], results)
+    return results
+
+
+def bench_audit(rows, reuse_every):
+    """Password health audit: a cold run, a cached re-run, and a re-run after one edit"""
+    master_password = "bench-audit"
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            key = derive_key(master_password, database.load_kdf_params(master_password, 'pbkdf2-sha256', 0.01))
+            # Every reuse_every-th entry shares one secret, so there is reuse to find
+            entries = ({'website': w, 'username': u, 'password': "shared-secret" if i % reuse_every == 0 else p}
+                       for i, (w, u, p) in enumerate(realistic_entries(rows)))
+            database.import_entries(entries, key, master_password)
+
+            for run in ("cold", "cached", "after 1 edit"):
+                if run == "after 1 edit":
+                    database.update_password(1, "edited.example.com", "edited", "a-new-secret", key, master_password)
+                result = audit.audit_vault(master_password, key, find_duplicates=True)
+                summary = result.summary()
+                results.append([run, f"{summary['audited']:,}", f"{summary['reused']:,}", f"{summary['weak']:,}",
+                                f"{summary['seconds'] * 1000:,.1f} ms"])
+            database.close_vault(master_password)
+        finally:
+            os.chdir(cwd)
+
+    print_table(f"audit: {rows:,} entries, one secret shared by every {reuse_every}th",
+                ["run", "scored", "reused", "weak", "time"], results)
+    return results
+
+
+def rss_kib():
+    """Current resident set size of this process in KiB (Linux), else the peak"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bench_breach(rows, lookups):
+    """Breach corpus: build time from an unsorted hash list, then lookup latency and the RSS it costs"""
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        source, path = os.path.join(tmp, "hashes.txt"), os.path.join(tmp, "corpus.pmb")
+        passwords = [f"breached-{i}" for i in range(lookups)]
+        with open(source, 'w') as f:
+            f.writelines(f"{breach.password_digest(p).hex().upper()}:1\n" for p in passwords)
+            f.writelines(f"{rng.randbytes(breach.RECORD_SIZE).hex().upper()}:1\n" for _ in range(rows - lookups))
+        with open(source) as lines:
+            stats = breach.build_corpus(lines, path)
+
+        rss_before = rss_kib()
+        results = []
+        with breach.BreachCorpus(path) as corpus:
+            for kind, candidates in (("hit", passwords), ("miss", [f"unseen-{i}" for i in range(lookups)])):
+                latencies = []
+                for i, password in enumerate(candidates):
+                    if i == 100 and kind == "hit":
+                        first_growth = rss_kib() - rss_before
+                    start = time.perf_counter()
+                    found = corpus.is_breached(password)
+                    latencies.append(time.perf_counter() - start)
+                    assert found == (kind == "hit")
+                latencies.sort()
+                results.append([kind, f"{lookups:,}", f"{statistics.median(latencies) * 1e6:.1f} µs",
+                                f"{latencies[int(len(latencies) * 0.99)] * 1e6:.1f} µs"])
+            rss_growth = rss_kib() - rss_before
+
+    print(f"\nbreach: built {stats['records']:,} hashes ({stats['bytes'] / 2**20:,.1f} MiB) in "
+          f"{stats['seconds']:.1f} s ({stats['rows_per_sec']:,.0f}/s)")
+    # Only pages near the ones lookups touch become resident (clean, shared page cache), however large the file
+    print(f"RSS growth: {first_growth:,} KiB after 100 lookups, {rss_growth:,} KiB after {2 * lookups:,}")
+    print_table("breach: lookup latency (mmap + fan-out + binary search)",
+                ["lookup", "count", "median", "p99"], results)
+    return results
+
+
+def bench_card_grid(sizes, full):
+    """First-render time and RSS growth of the card grid; needs a display"""
+    import gui
+    from cache import VaultCache
+
+    key = Fernet.generate_key()
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for size in sizes:
+                master_password = f"bench-{size}"
+                entries = ({'website': w, 'username': u, 'password': p} for w, u, p in sample_entries(size))
+                database.import_entries(entries, key, master_password)
+
+                modes = [("virtual", 0)] + ([("full", size)] if full else [])
+                for mode, threshold in modes:
+                    gui.VIRTUALIZE_THRESHOLD = threshold
+                    app = gui.PasswordManagerGUI()
+                    app.cipher, app.master_password = Cipher(key), master_password
+                    app.vault = VaultCache(app.cipher, master_password)
+                    app.vault.load()
+                    app.root.update()
+
+                    rss_before = rss_kib()
+                    _, seconds = timed(lambda: (app.show_main_screen(), app.root.update()))
+                    results.append([f"{size:,}", mode, f"{seconds * 1000:,.0f} ms",
+                                    f"{(rss_kib() - rss_before) / 1024:,.1f} MiB"])
+                    app.root.destroy()
+                database.close_vault(master_password)
+        finally:
+            os.chdir(cwd)
+
+    print_table("card grid: first render", ["entries", "mode", "render", "RSS growth"], results)
+    return results
+
+
+def bench_card_mutations(sizes, repeat):
+    """Add/edit/delete-to-repaint latency, diffed grid vs a full rebuild; needs a display"""
+    import gui
+    from cache import VaultCache
+
+    key = Fernet.generate_key()
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for size in sizes:
+                master_password = f"bench-{size}"
+                entries = ({'website': w, 'username': u, 'password': p} for w, u, p in sample_entries(size))
+                database.import_entries(entries, key, master_password)
+
+                app = gui.PasswordManagerGUI()
+                app.cipher, app.master_password = Cipher(key), master_password
+                app.vault = VaultCache(app.cipher, master_password)
+                app.vault.load_all()
+                app.show_main_screen()
+                app.root.update()
+                vault = app.vault
+                next_id = size + 1
+
+                # Only the cache changes: the database write runs off the Tk thread and is not timed
+                def add():
+                    nonlocal next_id
+                    vault.record_added(next_id, "bench.example", "bench")
+                    next_id += 1
+
+                def edit():
+                    entry = vault.entries()[1]
+                    vault.stage_update(entry.id, entry.website, entry.username + "+", "edited")
+
+                def delete():
+                    vault.stage_delete(vault.entries()[0].id)
+
+                def rebuild():
+                    passwords = vault.entries()
+                    app.rebuild_password_cards(passwords)
+                    app.update_stats(len(passwords), vault.total)
+
+                for name, mutate in (("add", add), ("edit", edit), ("delete", delete)):
+                    medians = []
+                    for repaint in (app.show_changed_entries, rebuild):
+                        samples = [timed(lambda: (mutate(), repaint(), app.root.update()))[1] for _ in range(repeat)]
+                        medians.append(statistics.median(samples))
+                    diffed, full = medians
+                    results.append([f"{size:,}", name, f"{diffed * 1000:,.1f} ms", f"{full * 1000:,.1f} ms",
+                                    f"{full / diffed:,.1f}x"])
+                app.root.destroy()
+                database.close_vault(master_password)
+        finally:
+            os.chdir(cwd)
+
+    print_table(f"card grid: mutation to repaint, median of {repeat}", ["entries", "change", "diffed", "rebuild",
+                                                                        "speedup"], results)
+    return results
+
+
+# Start-up budgets: median import time of each entry point in a fresh
+# interpreter (ms), and modules that must stay off its import path
+STARTUP_TARGETS = {
+    'gui': (150, ('cryptography', 'sqlite3', 'multiprocessing')),
+    'main': (120, ('tkinter', 'customtkinter')),
+    'agent': (100, ('tkinter', 'customtkinter')),
+}
+FIRST_PAINT_BUDGET_MS = 400
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_profile(module):
+    """Profile `import module` in a fresh interpreter with -X importtime.
+
+    Returns (cumulative ms, [(ms, name)] of its direct imports, names of every
+    module it pulled in).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=REPO_DIR, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, len(name) - len(name.lstrip()), name.strip()))
+
+    # importtime prints children before their parent; the target is the last top-level row
+    end = max(i for i, (_, depth, name) in enumerate(rows) if depth == 1 and name == module)
+    start = max((i for i, (_, depth, _) in enumerate(rows[:end]) if depth == 1), default=-1) + 1
+    pulled_in = rows[start:end]
+    direct = sorted(((ms, name) for ms, depth, name in pulled_in if depth == 3), reverse=True)
+    return rows[end][0], direct, [name for _, _, name in pulled_in]
+
+
+def first_paint_ms():
+    """Time from `import gui` to the login window's first paint, in a fresh process"""
+    code = ("import time; start = time.perf_counter(); import gui; app = gui.PasswordManagerGUI(); "
+            "app.root.update(); print((time.perf_counter() - start) * 1000)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO_DIR, check=True)
+    return float(result.stdout)
+
+
+def bench_startup(runs):
+    """Import time of each entry point against its budget; returns False on any regression"""
+    ok = True
+    results = []
+    for module, (budget, forbidden) in STARTUP_TARGETS.items():
+        profiles = [import_profile(module) for _ in range(runs)]
+        median = statistics.median(ms for ms, _, _ in profiles)
+        _, direct, pulled_in = profiles[-1]
+        leaked = sorted({root for root in forbidden for name in pulled_in
+                         if name == root or name.startswith(root + ".")})
+
+        status = "ok"
+        if median > budget:
+            status = "OVER BUDGET"
+        if leaked:
+            status = f"imports {', '.join(leaked)}"
+        ok = ok and status == "ok"
+        heaviest = ", ".join(f"{name} {ms:,.0f}" for ms, name in direct[:3])
+        results.append([module, f"{median:,.1f} ms", f"{budget} ms", status, heaviest])
+
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        paint = statistics.median(first_paint_ms() for _ in range(runs))
+        status = "ok" if paint <= FIRST_PAINT_BUDGET_MS else "OVER BUDGET"
+        ok = ok and status == "ok"
+        results.append(["gui first paint", f"{paint:,.1f} ms", f"{FIRST_PAINT_BUDGET_MS} ms", status, ""])
+
+    print_table(f"startup: median of {runs} fresh interpreters", ["entry point", "import", "budget", "status",
+                                                                  "heaviest direct imports (ms)"], results)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Password manager benchmarks")
+    suites = parser.add_subparsers(dest="suite", required=True)
+
+    database = suites.add_parser("database", help="single-row insert/read throughput")
+    database.add_argument("--rows", type=int, default=10_000)
+
+    cipher = suites.add_parser("cipher", help="per-row vs batched decryption")
+    cipher.add_argument("--rows", type=int, default=100_000)
+
+    parallel_suite = suites.add_parser("parallel", help="bulk decryption scaling across workers")
+    parallel_suite.add_argument("--rows", type=int, default=200_000)
+    parallel_suite.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+
+    bulk_import = suites.add_parser("import", help="bulk import throughput")
+    bulk_import.add_argument("--rows", type=int, default=20_000)
+    bulk_import.add_argument("--workers", type=int, default=4)
+
+    export = suites.add_parser("export", help="streaming export throughput and peak memory")
+    export.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+
+    breach_suite = suites.add_parser("breach", help="breach corpus build time, lookup latency and RSS")
+    breach_suite.add_argument("--rows", type=int, default=2_000_000)
+    breach_suite.add_argument("--lookups", type=int, default=10_000)
+
+    grid = suites.add_parser("grid", help="card grid render time and RSS (needs a display)")
+    grid.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    grid.add_argument("--full", action="store_true", help="also time the non-virtualized grid")
+
+    mutations = suites.add_parser("mutations", help="add/edit/delete repaint latency (needs a display)")
+    mutations.add_argument("--sizes", type=int, nargs="+", default=[40, 5_000],
+                           help="vault sizes; up to gui.VIRTUALIZE_THRESHOLD uses the per-id grid")
+    mutations.add_argument("--repeat", type=int, default=9)
+
+    search = suites.add_parser("search", help="per-keystroke search latency")
+    search.add_argument("--rows", type=int, default=50_000)
+    search.add_argument("--queries", nargs="+", default=["mailbox", "zenpay", "devtek.io", "alice"])
+
+    migration = suites.add_parser("migration", help="in-place schema upgrade time")
+    migration.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+
+    pagination = suites.add_parser("pagination", help="keyset page latency vs a full metadata load")
+    pagination.add_argument("--rows", type=int, default=100_000)
+    pagination.add_argument("--page-size", type=int, default=PAGE_SIZE)
+
+    kdf = suites.add_parser("kdf", help="unlock latency and memory cost per KDF, auto-tuned")
+    kdf.add_argument("--targets", type=float, nargs="+", default=[0.25, 0.5, 1.0],
+                     help="unlock times to tune for, in seconds")
+    kdf.add_argument("--kdfs", nargs="+", choices=list(KDFS), default=list(KDFS))
+
+    rekey = suites.add_parser("rekey", help="whole-vault re-encryption throughput")
+    rekey.add_argument("--rows", type=int, default=50_000)
+
+    rotate = suites.add_parser("rotate", help="resumable master-password rotation throughput")
+    rotate.add_argument("--rows", type=int, default=50_000)
+    rotate.add_argument("--batch-size", type=int, default=REKEY_BATCH_SIZE)
+
+    tracing_suite = suites.add_parser("tracing", help="per-call cost of the tracing hooks, off and on")
+    tracing_suite.add_argument("--calls", type=int, default=1_000_000)
+
+    generator_suite = suites.add_parser("generator", help="password generation throughput and entropy per policy")
+    generator_suite.add_argument("--count", type=int, default=1_000_000)
+
+    audit_suite = suites.add_parser("audit", help="password health audit time, cold and cached")
+    audit_suite.add_argument("--rows", type=int, default=50_000)
+    audit_suite.add_argument("--reuse-every", type=int, default=100)
+
+    startup = suites.add_parser("startup", help="entry-point import time vs budget; exits 1 on a regression")
+    startup.add_argument("--runs", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    if args.suite == "database":
+        bench_database(args.rows)
+    elif args.suite == "cipher":
+        bench_cipher(args.rows)
+    elif args.suite == "parallel":
+        bench_parallel(args.rows, args.workers)
+    elif args.suite == "import":
+        bench_import(args.rows, args.workers)
+    elif args.suite == "export":
+        bench_export(args.sizes)
+    elif args.suite == "search":
+        bench_search(args.rows, args.queries)
+    elif args.suite == "migration":
+        bench_migration(args.sizes)
+    elif args.suite == "pagination":
+        bench_pagination(args.rows, args.page_size)
+    elif args.suite == "kdf":
+        bench_kdf(args.targets, args.kdfs)
+    elif args.suite == "rekey":
+        bench_rekey(args.rows)
+    elif args.suite == "rotate":
+        bench_rotate(args.rows, args.batch_size)
+    elif args.suite == "breach":
+        bench_breach(args.rows, args.lookups)
+    elif args.suite == "tracing":
+        bench_tracing(args.calls)
+    elif args.suite == "generator":
+        bench_generator(args.count)
+    elif args.suite == "audit":
+        bench_audit(args.rows, args.reuse_every)
+    elif args.suite == "startup":
+        if not bench_startup(args.runs):
+            sys.exit(1)
+    elif args.suite == "grid":
+        bench_card_grid(args.sizes, args.full)
+    elif args.suite == "mutations":
+        bench_card_mutations(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Offline check of passwords against a breach corpus, without any network access.
+
+``python breach.py build pwned-passwords-sha1.txt`` turns a local
+HIBP-style list (one ``SHA1HEX[:COUNT]`` per line, in any order) into a
+compact corpus file:
+
+    header  magic (4) | version (2) | record size (2) | record count (8)
+    fan-out 65536 little-endian u64: records whose first two bytes are <= i
+    records sorted, distinct 20-byte SHA-1 digests
+
+A lookup memory-maps the file, reads two fan-out slots to narrow the search
+to one 2-byte prefix, then binary-searches that range. Only the handful of
+pages it touches are read, so a multi-GB corpus costs almost no RSS.
+Passwords are only ever hashed locally; nothing leaves the machine.
+"""
+
+import argparse
+import getpass
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from functools import partial
+
+CORPUS_ENV = 'PASSWORD_MANAGER_BREACH_CORPUS'
+DEFAULT_CORPUS = 'breached_passwords.pmb'
+
+MAGIC = b'PMBC'
+CORPUS_VERSION = 1
+RECORD_SIZE = 20  # SHA-1
+HEADER = struct.Struct('<4sHHQ')
+FANOUT_SLOTS = 1 << 16
+FANOUT = struct.Struct(f'<{FANOUT_SLOTS}Q')
+RECORDS_OFFSET = HEADER.size + FANOUT.size
+
+# Digests sorted in memory at once while building; larger inputs are sorted
+# in runs of this size and merged from temporary files
+BUILD_CHUNK_RECORDS = 1_000_000
+
+
+def password_digest(password):
+    """SHA-1 of the UTF-8 password, as HIBP lists them"""
+    return hashlib.sha1(password.encode()).digest()
+
+
+def default_corpus_path():
+    """$PASSWORD_MANAGER_BREACH_CORPUS, else breached_passwords.pmb next to the vaults"""
+    return os.environ.get(CORPUS_ENV) or DEFAULT_CORPUS
+
+
+def parse_digests(lines):
+    """The SHA-1 digests of HIBP-style lines; any :count suffix is ignored"""
+    for number, line in enumerate(lines, 1):
+        text = line.split(':', 1)[0].strip()
+        if not text:
+            continue
+        try:
+            digest = bytes.fromhex(text)
+        except ValueError:
+            digest = b''
+        if len(digest) != RECORD_SIZE:
+            raise ValueError(f"Line {number} is not a SHA-1 hash: {line.strip()[:60]!r}")
+        yield digest
+
+
+def sorted_runs(digests, tmp):
+    """Sort digests in chunks; yield each chunk as an iterator, spilled to a file if there are several"""
+    runs = []
+    while True:
+        chunk = sorted(d for _, d in zip(range(BUILD_CHUNK_RECORDS), digests))
+        if not chunk:
+            break
+        if len(chunk) < BUILD_CHUNK_RECORDS and not runs:
+            yield iter(chunk)  # Everything fitted in one chunk: no temporary files
+            return
+        path = os.path.join(tmp, f"run{len(runs)}")
+        with open(path, 'wb') as f:
+            f.write(b''.join(chunk))
+        runs.append(path)
+
+    for path in runs:
+        yield read_run(path)
+
+
+def read_run(path):
+    with open(path, 'rb', buffering=1 << 20) as f:
+        yield from iter(partial(f.read, RECORD_SIZE), b'')
+
+
+def build_corpus(lines, path, progress=None):
+    """Write a corpus file from HIBP-style lines; returns stats like the vault imports do"""
+    start = time.perf_counter()
+    counts = array('Q', bytes(8 * FANOUT_SLOTS))
+    written = 0
+
+    with tempfile.TemporaryDirectory() as tmp, open(path + '.tmp', 'wb') as out:
+        out.write(bytes(RECORDS_OFFSET))  # header and fan-out are filled in at the end
+        previous = None
+        for digest in heapq.merge(*sorted_runs(parse_digests(lines), tmp)):
+            if digest == previous:
+                continue
+            out.write(digest)
+            counts[digest[0] << 8 | digest[1]] += 1
+            previous = digest
+            written += 1
+            if progress and written % BUILD_CHUNK_RECORDS == 0:
+                progress(written, time.perf_counter() - start)
+
+        total = 0
+        for prefix, count in enumerate(counts):
+            total += count
+            counts[prefix] = total
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, CORPUS_VERSION, RECORD_SIZE, written))
+        out.write(FANOUT.pack(*counts))
+    os.replace(path + '.tmp', path)
+
+    seconds = time.perf_counter() - start
+    return {'records': written, 'bytes': os.path.getsize(path), 'seconds': seconds,
+            'rows_per_sec': written / seconds if seconds else 0.0}
+
+
+class _Records:
+    """The corpus's record array as a sequence of bytes, for bisect"""
+
+    def __init__(self, mapped):
+        self.mapped = mapped
+
+    def __getitem__(self, index):
+        offset = RECORDS_OFFSET + index * RECORD_SIZE
+        return self.mapped[offset:offset + RECORD_SIZE]
+
+
+class BreachCorpus:
+    """A memory-mapped corpus file; use as a context manager, or close() it"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self.mapped) < RECORDS_OFFSET:
+                raise ValueError(f"{path} is truncated or not a breach corpus")
+            magic, version, record_size, self.count = HEADER.unpack_from(self.mapped)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a breach corpus; build one with: python breach.py build")
+            if version != CORPUS_VERSION or record_size != RECORD_SIZE:
+                raise ValueError(f"{path} has an unsupported corpus version; rebuild it")
+            if len(self.mapped) != RECORDS_OFFSET + self.count * RECORD_SIZE:
+                raise ValueError(f"{path} is truncated or corrupt; rebuild it")
+        except ValueError:
+            self.mapped.close()
+            raise
+        if hasattr(self.mapped, 'madvise'):
+            # Lookups touch a page or two at random; read-ahead would only inflate RSS
+            self.mapped.madvise(mmap.MADV_RANDOM)
+        self.records = _Records(self.mapped)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.mapped.close()
+
+    def prefix_range(self, digest):
+        """[lo, hi) of the records sharing digest's first two bytes"""
+        prefix = digest[0] << 8 | digest[1]
+        hi = struct.unpack_from('<Q', self.mapped, HEADER.size + 8 * prefix)[0]
+        lo = struct.unpack_from('<Q', self.mapped, HEADER.size + 8 * (prefix - 1))[0] if prefix else 0
+        return lo, hi
+
+    def contains_digest(self, digest):
+        lo, hi = self.prefix_range(digest)
+        index = bisect_left(self.records, digest, lo, hi)
+        return index < hi and self.records[index] == digest
+
+    def is_breached(self, password):
+        return self.contains_digest(password_digest(password))
+
+    def breached_entries(self, entries):
+        """The entries (dicts with a 'password', as get_passwords returns) whose secret is in the corpus"""
+        return [entry for entry in entries if self.is_breached(entry['password'])]
+
+
+def open_corpus(path=None, required=False):
+    """Open the corpus at path (default: default_corpus_path()); None if there is none, unless required"""
+    path = path or default_corpus_path()
+    if not os.path.exists(path):
+        if required:
+            raise ValueError(f"No breach corpus at {path}; build one with: python breach.py build")
+        return None
+    return BreachCorpus(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline breached-password corpus")
+    parser.add_argument("--corpus", help=f"corpus file (default: ${CORPUS_ENV} or {DEFAULT_CORPUS})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build the corpus from an HIBP-style SHA-1 list")
+    build.add_argument("source", help="text file of SHA1HEX[:COUNT] lines, in any order")
+    commands.add_parser("check", help="check one password, read from stdin or a prompt")
+    args = parser.parse_args()
+    path = args.corpus or default_corpus_path()
+
+    try:
+        if args.command == "build":
+            with open(args.source, encoding='ascii', errors='replace') as lines:
+                stats = build_corpus(lines, path, progress=lambda done, elapsed: print(
+                    f"\r{done:,} hashes ({done / elapsed if elapsed else 0:,.0f}/sec)", end='', flush=True,
+                    file=sys.stderr))
+            print(f"\nWrote {stats['records']:,} hashes ({stats['bytes']:,} bytes) to {path} "
+                  f"in {stats['seconds']:.1f}s", file=sys.stderr)
+            return 0
+
+        password = sys.stdin.readline().rstrip('\n') if not sys.stdin.isatty() else getpass.getpass("Password: ")
+        with open_corpus(path, required=True) as corpus:
+            breached = corpus.is_breached(password)
+    except (ValueError, OSError) as e:
+        parser.exit(2, f"breach: {e}\n")
+    print("breached" if breached else "not found")
+    return 1 if breached else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
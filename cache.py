@@ -0,0 +1,245 @@
+from database import (get_encrypted_page, count_passwords, get_password_by_id, save_password,
+                      update_password, delete_password, import_entries, mark_password_used, find_entries,
+                      metadata_encrypted, PAGE_SIZE)
+from search import SearchIndex
+from tracing import trace_methods
+
+
+class EntryHandle:
+    """One vault entry as listed: plaintext metadata plus the still-encrypted password.
+
+    Supports item access for the metadata fields, so it can stand in for the
+    entry dicts the rest of the code passes around. token is None for entries
+    written this session; their secret is then read back from the database.
+    """
+
+    __slots__ = ('id', 'website', 'username', 'token')
+    FIELDS = ('id', 'website', 'username')
+
+    def __init__(self, entry_id, website, username, token=None):
+        self.id = entry_id
+        self.website = website
+        self.username = username
+        self.token = token
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __repr__(self):
+        return f"EntryHandle({self.id!r}, {self.website!r}, {self.username!r})"
+
+
+@trace_methods('cache')
+class VaultCache:
+    """Session-scoped, in-memory view of the unlocked vault.
+
+    Entries are kept as EntryHandles: metadata in plaintext, the password
+    still encrypted. A secret is decrypted only when reveal() is asked for
+    it, when a card is opened, copied or edited, and is not kept.
+
+    Metadata is read in keyset pages: load() fetches the first page, and
+    load_more() the next one. A UI can instead read pages with fetch_page()
+    on a worker thread and cache them with add_page(). Searching covers the
+    pages loaded so far, unless the vault's metadata is encrypted: its blind
+    index is queried instead.
+
+    Changes are split into a database write and a cache update, so a UI can
+    run the write on a worker thread and apply, or undo, the cache side
+    itself.
+    """
+
+    def __init__(self, cipher, master_password, page_size=PAGE_SIZE):
+        self.cipher = cipher
+        self.master_password = master_password
+        self.page_size = page_size
+        self.total = 0         # entries in the vault, loaded or not
+        self.complete = False  # True once every page has been loaded
+        self.encrypted_metadata = False
+        self._entries = {}     # id -> EntryHandle, kept in id order
+        self.cursor = None     # id of the last entry fetched, where the next page starts
+        self._index = SearchIndex()
+
+        # Pages read in the background can cross changes made meanwhile: a
+        # page read before a save lacks the new entry, and one read before a
+        # delete still has the old one. Both are reconciled in add_page().
+        self._added = {}       # id -> EntryHandle saved while pages were still loading
+        self._deleting = set() # ids staged for delete whose write has not finished
+
+        # Runs database writes nobody waits for, such as last-used stamps;
+        # the GUI points this at its database worker
+        self.defer = lambda func, *args: func(*args)
+
+    def load(self):
+        """(Re)load the vault metadata, starting with the first page"""
+        self._entries.clear()
+        self._index.clear()
+        self._added.clear()  # Saved already, so read back with the pages
+        self.cursor = None
+        self.complete = False
+        self.encrypted_metadata = metadata_encrypted(self.master_password)
+        self.total = count_passwords(self.master_password)
+        self.load_more()
+
+    def load_more(self):
+        """Load the next page of metadata; returns the new entries"""
+        if self.complete:
+            return []
+        return self.add_page(self.cursor, self.fetch_page(self.cursor))
+
+    def fetch_page(self, after, limit=None):
+        """Read the page of metadata after id after (None: from the start); never touches the cache"""
+        return get_encrypted_page(self.master_password, after, limit or self.page_size, key=self.cipher)
+
+    def add_page(self, after, rows, limit=None):
+        """Cache a page fetch_page(after, limit) returned; returns its entries.
+
+        A page fetched before a reload, or before another page was added, no
+        longer follows the cursor: it is dropped and [] returned.
+        """
+        if self.complete or after != self.cursor:
+            return []
+
+        page = [EntryHandle(*row) for row in rows if row[0] not in self._deleting]
+        for entry in page:
+            self._added.pop(entry.id, None)
+            self._store(entry)
+        if rows:
+            self.cursor = rows[-1][0]
+        if len(rows) < (limit or self.page_size):
+            self.complete = True
+            # Saved after the last page was read; their ids are the highest
+            page += sorted(self._added.values(), key=lambda entry: entry.id)
+            for entry in self._added.values():
+                self._store(entry)
+            self._added.clear()
+        return page
+
+    def load_all(self):
+        """Load every remaining page"""
+        while not self.complete:
+            self.load_more()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self):
+        """Return every cached entry in id order"""
+        return list(self._entries.values())
+
+    def filter(self, search_term):
+        """Return the loaded entries whose website or username contains search_term.
+
+        Call load_all() first to search the whole vault. With encrypted
+        metadata, matches are by word prefix instead (see
+        database.Vault.search), and come from every page, loaded or not.
+        """
+        if not search_term:
+            return self.entries()
+
+        if self.encrypted_metadata:
+            return self.matched(self.find(search_term))
+
+        entries = self._entries
+        return [entries[entry_id] for entry_id in self._index.search(search_term)]
+
+    def find(self, search_term):
+        """Rows matching search_term through the blind index (encrypted metadata only); never touches the cache"""
+        return find_entries(self.master_password, self.cipher, search_term)
+
+    def matched(self, rows):
+        """The entries of rows find() returned, as cached if they are, minus any being deleted"""
+        entries = self._entries
+        return [entries.get(row[0]) or EntryHandle(*row) for row in rows if row[0] not in self._deleting]
+
+    # Database side of each change. These never touch the cached entries, so
+    # they can run on a worker thread while the UI thread applies the change
+    # to the cache with the methods below.
+
+    def save(self, website, username, password):
+        """Insert a new entry into the database and return its id"""
+        return save_password(website, username, password, self.cipher, self.master_password)
+
+    def write_update(self, entry_id, website, username, password):
+        update_password(entry_id, website, username, password, self.cipher, self.master_password)
+
+    def write_delete(self, entry_id):
+        delete_password(entry_id, self.master_password)
+
+    def write_import(self, entries, **options):
+        """Bulk-import entries into the database; call load() afterwards"""
+        return import_entries(entries, self.cipher, self.master_password, **options)
+
+    # Cache side of each change
+
+    def record_added(self, entry_id, website, username):
+        """Account for an entry the database has just stored"""
+        self.total += 1
+        self._deleting.discard(entry_id)  # The id may be reused once a delete has landed
+        if self.complete:
+            self._store(EntryHandle(entry_id, website, username))
+        else:
+            # Added by add_page with the last page, unless a page read since has it
+            self._added[entry_id] = EntryHandle(entry_id, website, username)
+
+    def stage_update(self, entry_id, website, username, password):
+        """Show an edit before it is written; returns what restore() needs to undo it.
+
+        Only a cached entry is changed in place. An entry that is not cached
+        (an encrypted-metadata search result, or one on a page not yet
+        loaded) is left to be read back from the database.
+        """
+        previous = self._entries.get(entry_id)
+        if previous is not None:
+            self._store(EntryHandle(entry_id, website, username, self.cipher.encrypt(password)))
+        return entry_id, previous, False
+
+    def stage_delete(self, entry_id):
+        """Hide an entry before it is deleted; returns what restore() needs to undo it"""
+        previous = self._entries.pop(entry_id, None) or self._added.pop(entry_id, None)
+        self._index.remove(entry_id)
+        self._deleting.add(entry_id)
+        self.total -= 1  # Cached or not, the entry is counted in total
+        return entry_id, previous, True
+
+    def record_deleted(self, entry_id):
+        """Account for a staged delete the database has now made"""
+        self._deleting.discard(entry_id)
+
+    def restore(self, staged):
+        """Undo a stage_update or stage_delete, given what it returned, after the database write failed"""
+        entry_id, previous, deleted = staged
+        if deleted:
+            self.total += 1
+            self._deleting.discard(entry_id)
+        if previous is None:
+            return  # Not cached: a page still to be read brings it back
+        if deleted and not self.complete and entry_id > (self.cursor or 0):
+            self._added[entry_id] = previous  # Saved this session, past the pages read so far
+            return
+        self._store(previous)
+        if deleted:
+            self._entries = dict(sorted(self._entries.items()))  # Back into id order
+
+    def reveal(self, entry_id):
+        """Decrypt and return the password of a single entry"""
+        handle = self._entries.get(entry_id)
+        if handle is not None and handle.token is not None:
+            password = self.cipher.decrypt(handle.token)
+        else:
+            entry = get_password_by_id(entry_id, self.cipher, self.master_password)
+            if entry is None:
+                raise KeyError(f"No password entry with id {entry_id}")
+            password = entry['password']
+        self.defer(mark_password_used, entry_id, self.master_password)
+        return password
+
+    def with_secret(self, entry):
+        """Return a plain dict of entry that also carries its decrypted password"""
+        return {'id': entry['id'], 'website': entry['website'], 'username': entry['username'],
+                'password': self.reveal(entry['id'])}
+
+    def _store(self, entry):
+        self._entries[entry.id] = entry
+        self._index.add(entry.id, entry.website, entry.username)
@@ -1,6 +1,153 @@
+import os
 import sqlite3
 import hashlib
-from derive_key import encrypt_password, decrypt_password
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from derive_key import (as_cipher, forget_ciphers, tune_kdf, load_legacy_kdf_params, encode_kdf_header,
+                        decode_kdf_header, derive_key, DEFAULT_KDF, TARGET_UNLOCK_SECONDS, LEGACY_SALT_FILE)
+from search import blind_index_tokens, blind_query_tokens, blind_match, BLIND_FIELDS
+from tracing import trace_methods
+import parallel
+
+# Statements are kept as module constants so sqlite3's statement cache
+# reuses the prepared statement on every call
+CREATE_PASSWORDS_TABLE = '''CREATE TABLE IF NOT EXISTS passwords (
+                id INTEGER PRIMARY KEY,
+                website TEXT NOT NULL,
+                username TEXT NOT NULL,
+                password BLOB NOT NULL
+              )
+            '''
+INSERT_PASSWORD = ("INSERT INTO passwords (website, username, password, created_at, updated_at) "
+                   "VALUES (?, ?, ?, ?, ?)")
+SELECT_PASSWORDS = "SELECT id, website, username, password FROM passwords"
+SELECT_PASSWORDS_IN_ORDER = "SELECT id, website, username, password FROM passwords ORDER BY id"
+SELECT_METADATA = "SELECT id, website, username FROM passwords ORDER BY id"
+SELECT_PASSWORD_BY_ID = "SELECT id, website, username, password FROM passwords WHERE id=?"
+UPDATE_PASSWORD = "UPDATE passwords SET website=?, username=?, password=?, updated_at=? WHERE id=?"
+MARK_PASSWORD_USED = "UPDATE passwords SET last_used_at=? WHERE id=?"
+SELECT_META = "SELECT value FROM vault_meta WHERE name=?"
+BUMP_CHANGES = "UPDATE vault_meta SET value = CAST(value AS INTEGER) + 1 WHERE name = 'changes'"
+INSERT_META_IF_ABSENT = "INSERT INTO vault_meta (name, value) VALUES (?, ?) ON CONFLICT (name) DO NOTHING"
+UPSERT_META = "INSERT INTO vault_meta (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value=excluded.value"
+SELECT_METADATA_AFTER = "SELECT id, website, username FROM passwords WHERE id > ? ORDER BY id LIMIT ?"
+SELECT_ENTRIES_AFTER = "SELECT id, website, username, password FROM passwords WHERE id > ? ORDER BY id LIMIT ?"
+UPDATE_SECRET = "UPDATE passwords SET password=? WHERE id=?"
+UPDATE_ENTRY_CIPHERTEXT = "UPDATE passwords SET website=?, username=?, password=? WHERE id=?"
+UPDATE_METADATA_CIPHERTEXT = "UPDATE passwords SET website=?, username=? WHERE id=?"
+DELETE_PASSWORD = "DELETE FROM passwords WHERE id=?"
+INSERT_BLIND_TOKEN = "INSERT OR IGNORE INTO blind_index (token, entry_id) VALUES (?, ?)"
+DELETE_BLIND_TOKENS = "DELETE FROM blind_index WHERE entry_id=?"
+SELECT_ROWS_TO_COPY = ("SELECT id, website, username, password, created_at, updated_at, last_used_at "
+                       "FROM passwords WHERE id > ? ORDER BY id LIMIT ?")
+INSERT_COPIED_ROW = ("INSERT INTO passwords (id, website, username, password, created_at, updated_at, last_used_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)")
+SELECT_ALL_META = "SELECT name, value FROM vault_meta"
+CREATE_ROTATION_CHECKPOINT = '''CREATE TABLE rotation_checkpoint (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                source TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                last_id INTEGER NOT NULL,
+                copied INTEGER NOT NULL
+              )
+            '''
+SELECT_ROTATION_CHECKPOINT = "SELECT source, fingerprint, last_id, copied FROM rotation_checkpoint"
+UPDATE_ROTATION_CHECKPOINT = "UPDATE rotation_checkpoint SET last_id=?, copied=?"
+SELECT_BLIND_MATCHES = "SELECT entry_id FROM blind_index WHERE token=?"
+SELECT_UNAUDITED_AFTER = ("SELECT p.id, p.password FROM passwords p LEFT JOIN password_audit a ON a.entry_id = p.id "
+                          "WHERE p.id > ? AND (a.entry_id IS NULL OR a.version != ?) ORDER BY p.id LIMIT ?")
+# Stores a result only if the entry still has the ciphertext that was audited
+UPSERT_AUDIT = ("INSERT OR REPLACE INTO password_audit (entry_id, fingerprint, score, version) "
+                "SELECT id, ?, ?, ? FROM passwords WHERE id=? AND password=?")
+SELECT_AUDIT = "SELECT entry_id, fingerprint, score FROM password_audit ORDER BY entry_id"
+DELETE_AUDIT = "DELETE FROM password_audit WHERE entry_id=?"
+
+# vault_meta 'metadata' value of vaults that store website and username encrypted
+METADATA_ENCRYPTED = 'encrypted'
+
+# Rows encrypted and inserted per executemany() call during bulk import
+IMPORT_BATCH_SIZE = 500
+
+# Rows fetched per fetchmany() call when streaming the vault
+STREAM_CHUNK_SIZE = 500
+
+# Rows re-encrypted per batch when a vault moves to a new key
+REKEY_BATCH_SIZE = 5_000
+
+# Suffix of the file a master-password rotation writes the new vault into
+ROTATION_SUFFIX = '.rotating'
+
+# Default page size and the sort orders available for keyset pagination
+PAGE_SIZE = 200
+PAGE_ORDERS = ('id', 'website', 'username', 'recent')
+
+
+def migrate_create_passwords(conn):
+  """v1: the original passwords table (already present in pre-versioned vaults)"""
+  conn.execute(CREATE_PASSWORDS_TABLE)
+
+
+def migrate_timestamps_and_indexes(conn):
+  """v2: entry timestamps plus indexes for lookups by website/username and recency sorts.
+
+  The new columns default to NULL, so ADD COLUMN only rewrites the schema and
+  takes constant time; existing entries simply have unknown timestamps. The
+  indexes are the only part that scales with the vault, at O(n log n).
+  """
+  conn.execute("ALTER TABLE passwords ADD COLUMN created_at INTEGER")
+  conn.execute("ALTER TABLE passwords ADD COLUMN updated_at INTEGER")
+  conn.execute("ALTER TABLE passwords ADD COLUMN last_used_at INTEGER")
+  conn.execute("CREATE INDEX idx_passwords_website ON passwords (website COLLATE NOCASE)")
+  conn.execute("CREATE INDEX idx_passwords_username ON passwords (username COLLATE NOCASE)")
+  conn.execute("CREATE INDEX idx_passwords_updated_at ON passwords (updated_at)")
+
+
+def migrate_vault_meta(conn):
+  """v3: per-vault settings, starting with the key-derivation header"""
+  conn.execute("CREATE TABLE vault_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+
+def migrate_blind_index(conn):
+  """v4: blind-index tokens for vaults that opt into encrypted metadata (empty otherwise)"""
+  conn.execute("CREATE TABLE blind_index (token BLOB NOT NULL, entry_id INTEGER NOT NULL, "
+               "PRIMARY KEY (token, entry_id)) WITHOUT ROWID")
+  conn.execute("CREATE INDEX idx_blind_index_entry ON blind_index (entry_id)")
+
+
+def migrate_password_audit(conn):
+  """v5: cached per-entry audit results (keyed secret fingerprint and strength score)"""
+  conn.execute("CREATE TABLE password_audit (entry_id INTEGER PRIMARY KEY, fingerprint BLOB NOT NULL, "
+               "score INTEGER NOT NULL, version INTEGER NOT NULL)")
+
+
+def migrate_change_counter(conn):
+  """v6: vault_meta 'changes', bumped by triggers on every insert, update and delete of an entry.
+
+  Timestamps only have one-second resolution, so this is what tells an
+  interrupted rotation whether the rows it already copied are still current.
+  """
+  conn.execute("INSERT INTO vault_meta (name, value) VALUES ('changes', '0') ON CONFLICT (name) DO NOTHING")
+  for event in ('INSERT', 'UPDATE', 'DELETE'):
+    conn.execute(f"CREATE TRIGGER passwords_changed_{event.lower()} AFTER {event} ON passwords "
+                 f"BEGIN {BUMP_CHANGES}; END")
+
+
+# Schema migrations, applied in order. A vault's PRAGMA user_version is the
+# number of migrations it has already had, so never reorder or edit these;
+# append new ones instead.
+MIGRATIONS = [
+  migrate_create_passwords,
+  migrate_timestamps_and_indexes,
+  migrate_vault_meta,
+  migrate_blind_index,
+  migrate_password_audit,
+  migrate_change_counter,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
 
 def get_user_db_name(master_password):
   """Generate a unique database name based on the master password"""
@@ -8,129 +155,902 @@ def get_user_db_name(master_password):
   password_hash = hashlib.sha256(master_password.encode()).hexdigest()[:16]
   return f'vault_{password_hash}.db'
 
-def create_database(master_password):
-  db_name = get_user_db_name(master_password)
-  conn = sqlite3.connect(db_name)
-  c = conn.cursor()
 
-  # Create table
-  c.execute('''CREATE TABLE IF NOT EXISTS passwords (
-                id INTEGER PRIMARY KEY,
-                website TEXT NOT NULL,
-                username TEXT NOT NULL,
-                password BLOB NOT NULL
-              )
-            ''')
+class VaultFile:
+  """Names a vault by its file rather than its master password.
 
-  # Save (commit) the changes
-  conn.commit()
+  Accepted wherever the module-level functions take a master_password, by
+  holders of the derived key alone, such as the agent, which is never told
+  the master password and may run in another directory.
+  """
 
-  # Close the connection
-  conn.close()
+  __slots__ = ('path',)
 
+  def __init__(self, path):
+    self.path = os.path.abspath(path)
 
-def save_password(website, username, password, key, master_password):
-  # Encrypt the password using the derived key
-  encrypted_password = encrypt_password(key, password)
-  db_name = get_user_db_name(master_password)
-  conn = sqlite3.connect(db_name)
-  c = conn.cursor()
+  def __repr__(self):
+    return f"VaultFile({self.path!r})"
 
-  # Insert a row of data
-  c.execute("INSERT INTO passwords (website, username, password) VALUES (?, ?, ?)",
-    (website, username, encrypted_password))
 
-  # Save (commit) the changes
-  conn.commit()
+def vault_file_name(master_password):
+  """The file of the vault a master password (or VaultFile) names"""
+  if isinstance(master_password, VaultFile):
+    return master_password.path
+  return get_user_db_name(master_password)
 
-  # Close the connection
-  conn.close()
 
+@trace_methods('vault')
+class Vault:
+  """Repository for one vault file, owning a single connection for the unlocked session"""
 
-def get_passwords(key, master_password):
-  db_name = get_user_db_name(master_password)
-  conn = sqlite3.connect(db_name)
-  c = conn.cursor()
-
-  # Query the database with ID
-  c.execute("SELECT id, website, username, password FROM passwords")
-
-  # Decrypt the passwords
-  rows = c.fetchall()
-  passwords = []
-  if rows:
-    for row in rows:
-      entry_id, website, username, encrypted_pw = row # unpack the row
-      decrypted_pw = decrypt_password(key, encrypted_pw)
-      passwords.append({
-        'id': entry_id,
-        'website': website,
-        'username': username,
-        'password': decrypted_pw
-      })
-
-  # Close the connection
-  conn.close()
-  return passwords
+  def __init__(self, db_name):
+    self.db_name = db_name
+    self.is_new = not os.path.exists(db_name)
+    # Autocommit mode: transactions are opened explicitly in transaction().
+    # The connection is shared with worker threads, so access is serialized by _lock.
+    self._conn = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False,
+                                 cached_statements=64)
+    self._lock = threading.RLock()
 
+    # WAL lets readers run alongside a writer and makes each commit a single
+    # append; NORMAL sync is safe against corruption in WAL mode
+    self._conn.execute("PRAGMA journal_mode=WAL")
+    self._conn.execute("PRAGMA synchronous=NORMAL")
 
-def update_password(entry_id, website, username, password, key, master_password):
-  """Update an existing password entry"""
-  # Encrypt the password using the derived key
-  encrypted_password = encrypt_password(key, password)
-  db_name = get_user_db_name(master_password)
-  conn = sqlite3.connect(db_name)
-  c = conn.cursor()
+    # (version, seconds) for every migration applied when opening the vault
+    self.migration_log = []
+    self.create_schema()
 
-  # Update the entry
-  c.execute("UPDATE passwords SET website=?, username=?, password=? WHERE id=?",
-    (website, username, encrypted_password, entry_id))
+  @contextmanager
+  def transaction(self, immediate=False):
+    """Run a block inside one explicit transaction, rolling back on error.
 
-  # Save (commit) the changes
-  conn.commit()
+    immediate takes the file's write lock up front, so what the block reads
+    cannot change before it writes.
+    """
+    with self._lock:
+      self._conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+      try:
+        yield self._conn
+      except BaseException:
+        self._conn.execute("ROLLBACK")
+        raise
+      self._conn.execute("COMMIT")
 
-  # Close the connection
-  conn.close()
+  def create_schema(self):
+    """Bring the file up to SCHEMA_VERSION, one transaction per migration.
 
+    Each migration holds the write lock and re-reads the version under it,
+    so when two processes open an old vault at once, the second one finds
+    the migrations the first has applied and skips them.
+    """
+    if self.check_schema_version(self._conn.execute("PRAGMA user_version").fetchone()[0]):
+      return  # Up to date: no need for the write lock
+    while True:
+      start = time.perf_counter()
+      with self.transaction(immediate=True) as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if self.check_schema_version(version):
+          return
+        MIGRATIONS[version](conn)
+        conn.execute(f"PRAGMA user_version = {version + 1}")
+      self.migration_log.append((version + 1, time.perf_counter() - start))
 
-def delete_password(entry_id, master_password):
-  """Delete a password entry"""
-  db_name = get_user_db_name(master_password)
-  conn = sqlite3.connect(db_name)
-  c = conn.cursor()
+  def check_schema_version(self, version):
+    """True if version is current; raises if it is newer than this program"""
+    if version > SCHEMA_VERSION:
+      raise RuntimeError(f"{self.db_name} uses schema version {version}, "
+                         f"newer than this program supports ({SCHEMA_VERSION})")
+    return version == SCHEMA_VERSION
 
-  # Delete the entry
-  c.execute("DELETE FROM passwords WHERE id=?", (entry_id,))
+  @property
+  def encrypted_metadata(self):
+    """True if website and username are stored as Fernet tokens and searched through blind_index.
 
-  # Save (commit) the changes
-  conn.commit()
+    Read from the file every time, since another process (the CLI, while an
+    agent holds this vault open) can switch it on.
+    """
+    return self.get_meta('metadata') == METADATA_ENCRYPTED
 
-  # Close the connection
-  conn.close()
+  def seal_metadata(self, cipher, website, username, encrypted):
+    """The website and username as stored"""
+    if not encrypted:
+      return website, username
+    return cipher.encrypt(website).decode(), cipher.encrypt(username).decode()
 
+  def open_metadata(self, rows, key):
+    """Decrypt the website and username (columns 1 and 2) of raw rows if they are encrypted"""
+    if not rows or not self.encrypted_metadata:
+      return rows
+    if key is None:
+      raise ValueError("This vault's metadata is encrypted; reading it needs the vault key")
+    fields = as_cipher(key).decrypt_many([row[1] for row in rows] + [row[2] for row in rows])
+    return [(row[0], website, username) + tuple(row[3:])
+            for row, website, username in zip(rows, fields, fields[len(rows):])]
 
-def get_password_by_id(entry_id, key, master_password):
-  """Get a specific password entry by ID"""
-  db_name = get_user_db_name(master_password)
-  conn = sqlite3.connect(db_name)
-  c = conn.cursor()
-
-  # Query the database for specific ID
-  c.execute("SELECT id, website, username, password FROM passwords WHERE id=?", (entry_id,))
-  row = c.fetchone()
-
-  if row:
-    entry_id, website, username, encrypted_pw = row
-    decrypted_pw = decrypt_password(key, encrypted_pw)
-    result = {
+  def index_entry(self, conn, cipher, entry_id, website, username):
+    """(Re)write an entry's blind-index tokens"""
+    conn.execute(DELETE_BLIND_TOKENS, (entry_id,))
+    self.index_entries(conn, cipher, [(entry_id, website, username)])
+
+  def index_entries(self, conn, cipher, entries):
+    """Add blind-index tokens for (id, website, username) entries that have none yet"""
+    # Sorted, so a batch goes into the token B-tree in one ordered pass
+    conn.executemany(INSERT_BLIND_TOKEN, sorted((token, entry_id) for entry_id, website, username in entries
+                                                for token in blind_index_tokens(cipher.index_key, website, username)))
+
+  def save(self, website, username, password, key):
+    """Insert a new entry and return its id"""
+    cipher = as_cipher(key)
+    encrypted_password = cipher.encrypt(password)
+    now = int(time.time())
+    with self.transaction() as conn:
+      encrypted = self.encrypted_metadata
+      stored_website, stored_username = self.seal_metadata(cipher, website, username, encrypted)
+      entry_id = conn.execute(INSERT_PASSWORD, (stored_website, stored_username, encrypted_password, now,
+                                                now)).lastrowid
+      if encrypted:
+        self.index_entry(conn, cipher, entry_id, website, username)
+      return entry_id
+
+  def get_all(self, key):
+    """Return every entry with its password decrypted"""
+    with self._lock:
+      rows = self.open_metadata(self._conn.execute(SELECT_PASSWORDS).fetchall(), key)
+
+    # Decrypt the whole column in batches, across cores for large vaults
+    passwords = parallel.decrypt_many(key, [row[3] for row in rows])
+    return [{
       'id': entry_id,
       'website': website,
       'username': username,
-      'password': decrypted_pw
+      'password': password
+    } for (entry_id, website, username, _), password in zip(rows, passwords)]
+
+  def iter_chunks(self, chunk_size=STREAM_CHUNK_SIZE, key=None):
+    """Yield lists of raw (id, website, username, encrypted_password) rows in id order.
+
+    Uses a private read-only connection, so the whole iteration sees one
+    consistent snapshot without holding the session lock, and fetches
+    chunk_size rows at a time so memory stays flat however large the vault is.
+    Encrypted metadata is decrypted with key; the password never is.
+    """
+    conn = sqlite3.connect(Path(self.db_name).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+      cursor = conn.execute(SELECT_PASSWORDS_IN_ORDER)
+      while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+          break
+        yield self.open_metadata(rows, key)
+    finally:
+      conn.close()
+
+  def iter_rows(self, chunk_size=STREAM_CHUNK_SIZE, key=None):
+    """Yield raw rows one at a time, see iter_chunks"""
+    for rows in self.iter_chunks(chunk_size, key):
+      yield from rows
+
+  def get_page(self, columns, after_id=None, limit=PAGE_SIZE, order_by='id', key=None):
+    """Return up to limit rows of columns that sort after the entry after_id.
+
+    Keyset pagination: every page is an index range scan starting just past
+    the previous page's last entry, so reading page n costs the same as
+    reading page 1. 'website' and 'username' sort case-insensitively with id
+    as tie-breaker; 'recent' is newest updated_at first, followed by entries
+    that predate timestamps (newest id first). Except for 'id', after_id must
+    still exist, otherwise KeyError is raised.
+
+    columns must start with "id, website, username"; with encrypted metadata
+    those are decrypted with key, and only the 'id' and 'recent' orders exist.
+    """
+    if order_by not in PAGE_ORDERS:
+      raise ValueError(f"Unknown order_by {order_by!r}, expected one of {PAGE_ORDERS}")
+    if self.encrypted_metadata and order_by in BLIND_FIELDS:
+      raise ValueError(f"Cannot page by {order_by}: this vault's metadata is encrypted")
+    return self.open_metadata(self._get_page(columns, after_id, limit, order_by), key)
+
+  def _get_page(self, columns, after_id, limit, order_by):
+    with self._lock:
+      if order_by == 'id':
+        where, params = ("id > ?", (after_id,)) if after_id is not None else ("1", ())
+        return self._conn.execute(f"SELECT {columns} FROM passwords WHERE {where} ORDER BY id LIMIT ?",
+                                  params + (limit,)).fetchall()
+
+      sort_column = 'updated_at' if order_by == 'recent' else order_by
+      anchor = None
+      if after_id is not None:
+        anchor = self._conn.execute(f"SELECT {sort_column} FROM passwords WHERE id = ?", (after_id,)).fetchone()
+        if anchor is None:
+          raise KeyError(f"No password entry with id {after_id}")
+
+      if order_by in ('website', 'username'):
+        # Spelled out rather than as a row value, which SQLite won't seek a NOCASE index with
+        where, params = "1", ()
+        if anchor is not None:
+          where = f"{order_by} COLLATE NOCASE >= ? AND ({order_by} COLLATE NOCASE > ? OR id > ?)"
+          params = (anchor[0], anchor[0], after_id)
+        return self._conn.execute(f"SELECT {columns} FROM passwords WHERE {where} "
+                                  f"ORDER BY {order_by} COLLATE NOCASE, id LIMIT ?", params + (limit,)).fetchall()
+
+      # 'recent': timestamped entries first, then the NULL section
+
+      rows = []
+      if anchor is None or anchor[0] is not None:
+        where, params = "updated_at IS NOT NULL", ()
+        if anchor is not None:
+          where, params = where + " AND (updated_at, id) < (?, ?)", (anchor[0], after_id)
+        rows = self._conn.execute(f"SELECT {columns} FROM passwords WHERE {where} "
+                                  f"ORDER BY updated_at DESC, id DESC LIMIT ?", params + (limit,)).fetchall()
+
+      if len(rows) < limit:
+        where, params = "updated_at IS NULL", ()
+        if anchor is not None and anchor[0] is None:
+          where, params = where + " AND id < ?", (after_id,)
+        rows += self._conn.execute(f"SELECT {columns} FROM passwords WHERE {where} "
+                                   f"ORDER BY id DESC LIMIT ?", params + (limit - len(rows),)).fetchall()
+      return rows
+
+  def count(self):
+    with self._lock:
+      return self._conn.execute("SELECT COUNT(*) FROM passwords").fetchone()[0]
+
+  def get_metadata(self, key=None):
+    """Return id, website and username of every entry; nothing is decrypted unless the metadata is encrypted"""
+    with self._lock:
+      rows = self.open_metadata(self._conn.execute(SELECT_METADATA).fetchall(), key)
+    return [{'id': entry_id, 'website': website, 'username': username}
+            for entry_id, website, username in rows]
+
+  def get_by_id(self, entry_id, key):
+    """Return a single decrypted entry, or None if it does not exist"""
+    with self._lock:
+      row = self._conn.execute(SELECT_PASSWORD_BY_ID, (entry_id,)).fetchone()
+
+    if row is None:
+      return None
+    entry_id, website, username, encrypted_pw = self.open_metadata([row], key)[0]
+    return {
+      'id': entry_id,
+      'website': website,
+      'username': username,
+      'password': as_cipher(key).decrypt(encrypted_pw)
+    }
+
+  def import_entries(self, entries, key, batch_size=IMPORT_BATCH_SIZE, workers=None, progress=None):
+    """Encrypt and insert entries in batches, all inside a single transaction"""
+    start = time.perf_counter()
+    imported = 0
+    cipher = as_cipher(key)
+    if workers and workers > 1:
+      from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+
+    try:
+      with self.transaction() as conn:
+        encrypted_metadata = self.encrypted_metadata
+        entries = iter(entries)
+        while True:
+          batch = list(islice(entries, batch_size))
+          if not batch:
+            break
+
+          passwords = [entry['password'] for entry in batch]
+          if executor:
+            # One chunk per worker, each through the batched path: a future per row costs more than it saves
+            chunks = parallel.chunked(passwords, -(-len(passwords) // workers))
+            encrypted = [token for chunk in executor.map(cipher.encrypt_many, chunks) for token in chunk]
+          else:
+            encrypted = cipher.encrypt_many(passwords)
+          stored = [self.seal_metadata(cipher, entry['website'], entry['username'], encrypted_metadata)
+                    for entry in batch]
+          now = int(time.time())
+          conn.executemany(INSERT_PASSWORD, [(website, username, encrypted_pw, now, now)
+                                             for (website, username), encrypted_pw in zip(stored, encrypted)])
+
+          if encrypted_metadata:
+            # New ids follow the current highest one, and nothing else writes inside this transaction
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.index_entries(conn, cipher, [(entry_id, entry['website'], entry['username']) for entry_id, entry
+                                              in enumerate(batch, start=last_id - len(batch) + 1)])
+
+          imported += len(batch)
+          if progress:
+            progress(imported, time.perf_counter() - start)
+    finally:
+      if executor:
+        executor.shutdown()
+
+    seconds = time.perf_counter() - start
+    return {
+      'imported': imported,
+      'seconds': seconds,
+      'rows_per_sec': imported / seconds if seconds else 0.0
+    }
+
+  def update(self, entry_id, website, username, password, key):
+    cipher = as_cipher(key)
+    encrypted_password = cipher.encrypt(password)
+    with self.transaction() as conn:
+      encrypted = self.encrypted_metadata
+      stored_website, stored_username = self.seal_metadata(cipher, website, username, encrypted)
+      conn.execute(UPDATE_PASSWORD, (stored_website, stored_username, encrypted_password, int(time.time()),
+                                     entry_id))
+      conn.execute(DELETE_AUDIT, (entry_id,))  # The secret may have changed: audit it again
+      if encrypted:
+        self.index_entry(conn, cipher, entry_id, website, username)
+
+  def mark_used(self, entry_id):
+    """Record that an entry's secret was just revealed or copied"""
+    with self.transaction() as conn:
+      conn.execute(MARK_PASSWORD_USED, (int(time.time()), entry_id))
+
+  def delete(self, entry_id):
+    with self.transaction() as conn:
+      conn.execute(DELETE_PASSWORD, (entry_id,))
+      conn.execute(DELETE_BLIND_TOKENS, (entry_id,))
+      conn.execute(DELETE_AUDIT, (entry_id,))
+
+  def get_meta(self, name):
+    with self._lock:
+      row = self._conn.execute(SELECT_META, (name,)).fetchone()
+    return row[0] if row else None
+
+  def get_all_meta(self):
+    with self._lock:
+      return dict(self._conn.execute(SELECT_ALL_META).fetchall())
+
+  def set_meta(self, name, value):
+    with self.transaction() as conn:
+      conn.execute(UPSERT_META, (name, value))
+
+  def rekey(self, old_key, new_key, kdf_header, batch_size=REKEY_BATCH_SIZE, progress=None):
+    """Re-encrypt every secret under new_key and store the matching KDF header.
+
+    Runs as one transaction, so the vault is never left with a mix of keys
+    or with a header that does not match its rows. Encrypted metadata is
+    re-encrypted too, and its blind index rebuilt under the new key's index
+    subkey. Returns a dict with 'rekeyed', 'seconds' and 'rows_per_sec'.
+    """
+    start = time.perf_counter()
+    rekeyed = 0
+    old_cipher, new_cipher = as_cipher(old_key), as_cipher(new_key)
+
+    with self.transaction() as conn:
+      encrypted_metadata = self.encrypted_metadata
+      if encrypted_metadata:
+        conn.execute("DELETE FROM blind_index")  # rebuilt batch by batch under the new index subkey
+      conn.execute("DELETE FROM password_audit")  # fingerprints are keyed by the old key
+      last_id = 0
+      while True:
+        rows = conn.execute(SELECT_ENTRIES_AFTER, (last_id, batch_size)).fetchall()
+        if not rows:
+          break
+
+        rekeyed_rows, plaintext = reencrypt_rows(rows, old_cipher, new_cipher, encrypted_metadata)
+        if encrypted_metadata:
+          conn.executemany(UPDATE_ENTRY_CIPHERTEXT, [(website, username, password, entry_id)
+                                                     for entry_id, website, username, password in rekeyed_rows])
+          self.index_entries(conn, new_cipher, plaintext)
+        else:
+          conn.executemany(UPDATE_SECRET, [(row[3], row[0]) for row in rekeyed_rows])
+
+        last_id = rows[-1][0]
+        rekeyed += len(rows)
+        if progress:
+          progress(rekeyed, time.perf_counter() - start)
+      conn.execute(UPSERT_META, ('kdf', kdf_header))
+
+    seconds = time.perf_counter() - start
+    return {
+      'rekeyed': rekeyed,
+      'seconds': seconds,
+      'rows_per_sec': rekeyed / seconds if seconds else 0.0
     }
+
+  def encrypt_metadata(self, key, batch_size=REKEY_BATCH_SIZE, progress=None):
+    """Switch the vault to encrypted website/username fields with a blind index.
+
+    Every row is rewritten in one transaction. The vault file is then
+    vacuumed, so the plaintext is not left behind in free pages or the WAL.
+    One-way: there is no switching back. Returns a dict with 'encrypted',
+    'seconds' and 'rows_per_sec'.
+    """
+    start = time.perf_counter()
+    done = 0
+    cipher = as_cipher(key)
+
+    with self.transaction() as conn:
+      if self.encrypted_metadata:
+        raise ValueError("This vault's metadata is already encrypted")
+      last_id = 0
+      while True:
+        rows = conn.execute(SELECT_METADATA_AFTER, (last_id, batch_size)).fetchall()
+        if not rows:
+          break
+
+        encrypted = parallel.encrypt_many(cipher, [row[column] for column in (1, 2) for row in rows])
+        conn.executemany(UPDATE_METADATA_CIPHERTEXT, zip((token.decode() for token in encrypted),
+                                                         (token.decode() for token in encrypted[len(rows):]),
+                                                         (row[0] for row in rows)))
+        self.index_entries(conn, cipher, rows)
+
+        last_id = rows[-1][0]
+        done += len(rows)
+        if progress:
+          progress(done, time.perf_counter() - start)
+      conn.execute(UPSERT_META, ('metadata', METADATA_ENCRYPTED))
+
+    with self._lock:
+      self._conn.execute("VACUUM")
+      self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    seconds = time.perf_counter() - start
+    return {
+      'encrypted': done,
+      'seconds': seconds,
+      'rows_per_sec': done / seconds if seconds else 0.0
+    }
+
+  def unaudited_rows(self, after_id, version, limit):
+    """Up to limit (id, encrypted_password) rows past after_id with no audit result of this version"""
+    with self._lock:
+      return self._conn.execute(SELECT_UNAUDITED_AFTER, (after_id, version, limit)).fetchall()
+
+  def store_audit(self, results):
+    """Cache (fingerprint, score, version, entry_id, audited encrypted_password) audit results.
+
+    A result is dropped if its entry was changed or deleted since it was
+    read, so a slow audit never overwrites the invalidation of a newer edit.
+    """
+    with self.transaction() as conn:
+      conn.executemany(UPSERT_AUDIT, results)
+
+  def audit_rows(self):
+    """(entry_id, fingerprint, score) of every cached audit result"""
+    with self._lock:
+      return self._conn.execute(SELECT_AUDIT).fetchall()
+
+  def fingerprint(self):
+    """Changes whenever an entry is added, edited or deleted, however close together"""
+    return f"changes:{self.get_meta('changes')}"
+
+  def rows_to_copy(self, after_id, limit):
+    """Up to limit whole rows, with timestamps, past after_id in id order"""
+    with self._lock:
+      return self._conn.execute(SELECT_ROWS_TO_COPY, (after_id, limit)).fetchall()
+
+  def rotation_checkpoint(self):
+    """(source, fingerprint, last_id, copied) of a rotation being written into this file, or None"""
+    with self._lock:
+      if not self._conn.execute("SELECT 1 FROM sqlite_master WHERE name='rotation_checkpoint'").fetchone():
+        return None
+      return self._conn.execute(SELECT_ROTATION_CHECKPOINT).fetchone()
+
+  def start_rotation(self, source, fingerprint, meta):
+    """Mark this file as the target of a rotation from source, with its settings"""
+    with self.transaction() as conn:
+      conn.execute(CREATE_ROTATION_CHECKPOINT)
+      conn.execute("INSERT INTO rotation_checkpoint (id, source, fingerprint, last_id, copied) "
+                   "VALUES (1, ?, ?, 0, 0)", (source, fingerprint))
+      conn.executemany(UPSERT_META, meta.items())
+
+  def append_rotated(self, rows, cipher, plaintext, copied):
+    """Insert a batch of re-encrypted rows and advance the checkpoint, in one transaction.
+
+    plaintext is the (id, website, username) of each row for the blind
+    index, or None if this vault does not encrypt metadata.
+    """
+    with self.transaction() as conn:
+      conn.executemany(INSERT_COPIED_ROW, rows)
+      if plaintext is not None:
+        self.index_entries(conn, cipher, plaintext)
+      conn.execute(UPDATE_ROTATION_CHECKPOINT, (rows[-1][0], copied))
+
+  def finish_rotation(self):
+    """Leave a single self-contained file, ready to be renamed.
+
+    The checkpoint stays until after the rename (see end_rotation), so a
+    run interrupted in between resumes with nothing left to copy.
+    """
+    with self._lock:
+      self._conn.execute("PRAGMA journal_mode=DELETE")
+
+  def end_rotation(self):
+    """Drop the checkpoint from a renamed, finished rotation"""
+    with self.transaction() as conn:
+      conn.execute("DROP TABLE IF EXISTS rotation_checkpoint")
+
+  def search(self, query, key, exact=False):
+    """Raw rows whose website or username matches query, found through the blind index.
+
+    exact matches a whole field, ignoring case and surrounding spaces;
+    otherwise every word of query must begin a word of the field. Each query
+    is indexed token lookups, and only the candidate rows are decrypted, to
+    confirm them. Only for vaults with encrypted metadata.
+    """
+    if not self.encrypted_metadata:
+      raise ValueError("Only vaults with encrypted metadata have a blind index")
+
+    cipher = as_cipher(key)
+    groups = [blind_query_tokens(cipher.index_key, field, query, exact) for field in BLIND_FIELDS]
+    if not groups[0]:
+      return []
+
+    # Entries carrying every token of the query in one field, for either field
+    matches = " UNION ".join(f"SELECT entry_id FROM ({' INTERSECT '.join([SELECT_BLIND_MATCHES] * len(tokens))})"
+                             for tokens in groups)
+    with self._lock:
+      rows = self._conn.execute(f"SELECT id, website, username, password FROM passwords WHERE id IN ({matches}) "
+                                f"ORDER BY id", [token for tokens in groups for token in tokens]).fetchall()
+    return [row for row in self.open_metadata(rows, cipher)
+            if blind_match(query, row[1], exact) or blind_match(query, row[2], exact)]
+
+  def close(self):
+    with self._lock:
+      self._conn.close()
+
+
+# One open Vault per vault file (by absolute path), so the module-level
+# functions below reuse the same connection for the whole session, whether
+# they are given the master password or a VaultFile
+_vaults = {}
+_vaults_lock = threading.Lock()
+
+
+def open_vault(master_password):
+  """Return the session's Vault for this master password (or VaultFile), opening it on first use"""
+  db_name = vault_file_name(master_password)
+  with _vaults_lock:
+    vault = _vaults.get(os.path.abspath(db_name))
+    if vault is None:
+      vault = _vaults[os.path.abspath(db_name)] = Vault(db_name)
+    return vault
+
+
+def close_vault(master_password):
+  """Close the session's Vault, e.g. on logout"""
+  with _vaults_lock:
+    vault = _vaults.pop(os.path.abspath(vault_file_name(master_password)), None)
+  if vault is not None:
+    vault.close()
+  forget_ciphers()
+
+
+def create_database(master_password):
+  open_vault(master_password)
+
+
+def load_kdf_params(master_password, kdf=DEFAULT_KDF, target_seconds=TARGET_UNLOCK_SECONDS):
+  """Return the vault's KDF parameters, choosing and storing them on first use.
+
+  A new vault gets fresh parameters for kdf, tuned to target_seconds on this
+  host. An existing vault without a header of its own adopts the shared
+  legacy salt, so it still derives the key its rows were encrypted with.
+  Without that salt, fresh parameters would derive a key none of its rows
+  decrypt under, so a vault with rows is refused with ValueError instead.
+
+  Two first unlocks can race (a cancelled unlock still running, or the CLI
+  and the GUI at once): only the first header stored is kept, and every
+  caller gets that one back, never the parameters it tuned itself.
+  """
+  vault = open_vault(master_password)
+  header = vault.get_meta('kdf')
+  if header is not None:
+    return decode_kdf_header(header)
+
+  params = None if vault.is_new else load_legacy_kdf_params()
+  if params is None:
+    if not vault.is_new and vault.count():
+      raise ValueError(f"{vault.db_name} has entries but no KDF parameters, and there is no "
+                       f"{LEGACY_SALT_FILE} next to it; restore that file to unlock it")
+    params = tune_kdf(kdf, target_seconds)
+  with vault.transaction() as conn:
+    conn.execute(INSERT_META_IF_ABSENT, ('kdf', encode_kdf_header(params)))
+  return decode_kdf_header(vault.get_meta('kdf'))
+
+
+def reencrypt_rows(rows, old_cipher, new_cipher, encrypted_metadata):
+  """Move (id, website, username, password, ...) rows from old_cipher to new_cipher.
+
+  The passwords of the batch, plus the websites and usernames if
+  encrypted_metadata, are decrypted and re-encrypted in one parallel pass.
+  Returns (the rows with those columns replaced, (id, website, username)
+  of each row in plaintext).
+  """
+  count = len(rows)
+  columns = (1, 2, 3) if encrypted_metadata else (3,)
+  plaintext = parallel.decrypt_many(old_cipher, [row[column] for column in columns for row in rows])
+  sealed = parallel.encrypt_many(new_cipher, plaintext)
+
+  if encrypted_metadata:
+    metadata = [(row[0], website, username) for row, website, username in zip(rows, plaintext, plaintext[count:])]
+    sealed = [token.decode() for token in sealed[:2 * count]] + sealed[2 * count:]
   else:
-    result = None
+    metadata = [row[:3] for row in rows]
+    sealed = [row[1] for row in rows] + [row[2] for row in rows] + sealed
+  return [(row[0], website, username, password) + tuple(row[4:]) for row, website, username, password
+          in zip(rows, sealed, sealed[count:], sealed[2 * count:])], metadata
+
+
+def remove_vault_files(db_name):
+  """Delete a vault file along with its WAL and shared-memory files"""
+  for path in (db_name, db_name + '-wal', db_name + '-shm'):
+    if os.path.exists(path):
+      os.remove(path)
+
+
+def rotate_master_password(old_master_password, old_key, new_master_password, new_params=None,
+                           batch_size=REKEY_BATCH_SIZE, progress=None):
+  """Move the vault to a new master password, and so to a new file.
+
+  Rows are streamed from the old vault in id order, re-encrypted under the
+  new key in parallel batches, and written to <new file>.rotating one
+  transaction per batch, together with a checkpoint of the last id copied.
+  Calling this again after an interruption resumes from that checkpoint,
+  unless the old vault has changed since, in which case it starts over.
+
+  The old vault stays writable while rows are copied. Its write lock is
+  taken for the final check and held until the rename: if it changed during
+  the copy, everything is copied again with writers locked out. The
+  finished file is renamed into place with os.replace, so the new vault
+  appears complete or not at all, and only then is the old file removed. A
+  run interrupted after the rename just does that cleanup.
+  new_params are the new KDF parameters (default: the vault's current KDF,
+  re-tuned with a fresh salt); a resumed rotation keeps the ones it started
+  with. Returns (new_key, stats) with 'rotated', 'resumed_from', 'seconds'
+  and 'rows_per_sec' for the rows copied by this call, timed from the end
+  of key derivation to the swap.
+  """
+  source = open_vault(old_master_password)
+  # By absolute path: the old vault may be named by a VaultFile (see open_vault)
+  source_name = os.path.abspath(source.db_name)
+  target_name = get_user_db_name(new_master_password)
+  if os.path.abspath(target_name) == source_name:
+    raise ValueError("The new master password must differ from the old one")
+  if os.path.exists(target_name):
+    return finish_renamed_rotation(source_name, old_master_password, target_name, new_master_password)
+
+  partial_name = target_name + ROTATION_SUFFIX
+  fingerprint = source.fingerprint()
+  target = Vault(partial_name)
+
+  def start_over():
+    """An empty partial file, marked as a copy of the old vault as it is now"""
+    nonlocal target
+    target.close()
+    remove_vault_files(partial_name)
+    target = Vault(partial_name)
+    meta = source.get_all_meta()
+    meta.pop('changes', None)  # The new file counts its own
+    meta['kdf'] = encode_kdf_header(params)
+    target.start_rotation(source_name, fingerprint, meta)
+
+  def copy_rows(last_id, copied):
+    while True:
+      rows = source.rows_to_copy(last_id, batch_size)
+      if not rows:
+        return copied
+      rotated_rows, plaintext = reencrypt_rows(rows, old_cipher, new_cipher, encrypted_metadata)
+      copied += len(rows)
+      target.append_rotated(rotated_rows, new_cipher, plaintext if encrypted_metadata else None, copied)
+      last_id = rows[-1][0]
+      if progress:
+        progress(copied, time.perf_counter() - start)
+
+  try:
+    checkpoint = target.rotation_checkpoint()
+    if (checkpoint is not None and checkpoint[:2] != (source_name, fingerprint)) or \
+        (checkpoint is None and target.count()):
+      checkpoint = None  # What was copied may be stale, or cannot be resumed
+
+    if checkpoint is None:
+      params = new_params or tune_kdf(decode_kdf_header(source.get_meta('kdf'))['kdf'])
+      start_over()
+      last_id = copied = 0
+    else:
+      params = decode_kdf_header(target.get_meta('kdf'))
+      _, _, last_id, copied = checkpoint
+
+    resumed_from = copied
+    new_key = derive_key(new_master_password, params)
+    old_cipher, new_cipher = as_cipher(old_key), as_cipher(new_key)
+    encrypted_metadata = source.encrypted_metadata
+
+    start = time.perf_counter()
+    copied = copy_rows(last_id, copied)
+
+    # No edit to the old vault may land between this check and the rename
+    with source.transaction(immediate=True):
+      if source.fingerprint() != fingerprint:
+        # Edited during the copy: copy it all again, this time with writers locked out
+        fingerprint = source.fingerprint()
+        start_over()
+        resumed_from = 0
+        copied = copy_rows(0, 0)
+      target.finish_rotation()
+      target.close()
+      os.replace(partial_name, target_name)
+  finally:
+    target.close()
+
+  close_vault(old_master_password)
+  complete_rotation(target_name, source_name)
+
+  seconds = time.perf_counter() - start
+  return new_key, {
+    'rotated': copied,
+    'resumed_from': resumed_from,
+    'seconds': seconds,
+    'rows_per_sec': (copied - resumed_from) / seconds if seconds else 0.0
+  }
+
+
+def finish_renamed_rotation(source_name, old_master_password, target_name, new_master_password):
+  """Clean up after a rotation interrupted between its rename and removing the old vault"""
+  finished = Vault(target_name)
+  try:
+    checkpoint = finished.rotation_checkpoint()
+    if checkpoint is None or checkpoint[0] != source_name:
+      raise ValueError("A vault already exists for the new master password")
+    params = decode_kdf_header(finished.get_meta('kdf'))
+  finally:
+    finished.close()
+
+  close_vault(old_master_password)
+  complete_rotation(target_name, source_name)
+  copied = checkpoint[3]
+  return derive_key(new_master_password, params), {
+    'rotated': copied,
+    'resumed_from': copied,
+    'seconds': 0.0,
+    'rows_per_sec': 0.0
+  }
+
+
+def complete_rotation(target_name, source_name):
+  """Drop the checkpoint from the renamed vault, then remove the old one"""
+  finished = Vault(target_name)
+  try:
+    finished.end_rotation()
+  finally:
+    finished.close()
+  remove_vault_files(source_name)
 
-  # Close the connection
-  conn.close()
-  return result
+
+def rekey_vault(master_password, old_key, new_params, progress=None):
+  """Move the vault to new KDF parameters, re-encrypting every secret.
+
+  Returns (new_key, stats); the caller must switch to new_key, since old
+  ciphers no longer decrypt the vault.
+  """
+  new_key = derive_key(master_password, new_params)
+  stats = open_vault(master_password).rekey(old_key, new_key, encode_kdf_header(new_params), progress=progress)
+  forget_ciphers()
+  return new_key, stats
+
+
+def encrypt_vault_metadata(master_password, key, progress=None):
+  """Opt the vault into encrypted website/username fields, searched through a blind index"""
+  return open_vault(master_password).encrypt_metadata(key, progress=progress)
+
+
+def metadata_encrypted(master_password):
+  return open_vault(master_password).encrypted_metadata
+
+
+def find_entries(master_password, key, query, exact=False):
+  """Raw rows matching query through the blind index of a vault with encrypted metadata, see Vault.search"""
+  return open_vault(master_password).search(query, key, exact)
+
+
+def save_password(website, username, password, key, master_password):
+  return open_vault(master_password).save(website, username, password, key)
+
+
+def get_passwords(key, master_password):
+  return open_vault(master_password).get_all(key)
+
+
+def get_passwords_page(key, master_password, after_id=None, limit=PAGE_SIZE, order_by='id'):
+  """Get one keyset page of decrypted entries; pass the last id seen as after_id"""
+  rows = open_vault(master_password).get_page("id, website, username, password", after_id, limit, order_by, key)
+  passwords = as_cipher(key).decrypt_many([row[3] for row in rows])
+  return [{
+    'id': entry_id,
+    'website': website,
+    'username': username,
+    'password': password
+  } for (entry_id, website, username, _), password in zip(rows, passwords)]
+
+
+def get_metadata_page(master_password, after_id=None, limit=PAGE_SIZE, order_by='id', key=None):
+  """Get one keyset page of id/website/username; key is only needed for encrypted metadata"""
+  rows = open_vault(master_password).get_page("id, website, username", after_id, limit, order_by, key)
+  return [{'id': entry_id, 'website': website, 'username': username}
+          for entry_id, website, username in rows]
+
+
+def get_encrypted_page(master_password, after_id=None, limit=PAGE_SIZE, order_by='id', key=None):
+  """Get one keyset page of raw (id, website, username, encrypted_password) rows"""
+  return open_vault(master_password).get_page("id, website, username, password", after_id, limit, order_by, key)
+
+
+def iter_passwords(key, master_password, order_by='id', page_size=PAGE_SIZE):
+  """Yield decrypted entries one page at a time, decrypting each page as it is reached"""
+  after_id = None
+  while True:
+    page = get_passwords_page(key, master_password, after_id, page_size, order_by)
+    yield from page
+    if len(page) < page_size:
+      return
+    after_id = page[-1]['id']
+
+
+def iter_metadata(master_password, order_by='id', page_size=PAGE_SIZE, key=None):
+  """Yield id/website/username of every entry in order_by order, one page at a time"""
+  if order_by in BLIND_FIELDS and metadata_encrypted(master_password):
+    # Ciphertext sorts meaninglessly, so this order needs everything decrypted first
+    entries = get_password_metadata(master_password, key)
+    yield from sorted(entries, key=lambda entry: (entry[order_by].lower(), entry['id']))
+    return
+
+  after_id = None
+  while True:
+    page = get_metadata_page(master_password, after_id, page_size, order_by, key)
+    yield from page
+    if len(page) < page_size:
+      return
+    after_id = page[-1]['id']
+
+
+def count_passwords(master_password):
+  return open_vault(master_password).count()
+
+
+def iter_encrypted_rows(master_password, chunk_size=STREAM_CHUNK_SIZE, key=None):
+  """Stream raw (id, website, username, encrypted_password) rows without decrypting the passwords"""
+  return open_vault(master_password).iter_rows(chunk_size, key)
+
+
+def iter_encrypted_chunks(master_password, chunk_size=STREAM_CHUNK_SIZE, key=None):
+  """Stream raw rows in chunks of up to chunk_size, without decrypting the passwords"""
+  return open_vault(master_password).iter_chunks(chunk_size, key)
+
+
+def get_password_metadata(master_password, key=None):
+  """Get id, website and username of every entry; key is only needed for encrypted metadata"""
+  return open_vault(master_password).get_metadata(key)
+
+
+def import_entries(entries, key, master_password, batch_size=IMPORT_BATCH_SIZE, workers=None, progress=None):
+  """Bulk-import an iterable of {'website', 'username', 'password'} dicts.
+
+  The iterable is consumed lazily, batch_size rows at a time; each batch is
+  encrypted (on a thread pool when workers > 1) and written with executemany,
+  and the whole import is committed as one transaction. progress, if given,
+  is called as progress(imported, elapsed_seconds) after every batch.
+  Returns a dict with 'imported', 'seconds' and 'rows_per_sec'.
+  """
+  return open_vault(master_password).import_entries(entries, key, batch_size, workers, progress)
+
+
+def update_password(entry_id, website, username, password, key, master_password):
+  """Update an existing password entry"""
+  open_vault(master_password).update(entry_id, website, username, password, key)
+
+
+def mark_password_used(entry_id, master_password):
+  """Update an entry's last_used_at timestamp"""
+  open_vault(master_password).mark_used(entry_id)
+
+
+def delete_password(entry_id, master_password):
+  """Delete a password entry"""
+  open_vault(master_password).delete(entry_id)
+
+
+def get_password_by_id(entry_id, key, master_password):
+  """Get a specific password entry by ID"""
+  return open_vault(master_password).get_by_id(entry_id, key)
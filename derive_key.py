@@ -1,35 +1,294 @@
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher as AESCipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
+from functools import lru_cache
 import os
 import base64
+import hmac
+import json
+import time
 
-def load_or_create_salt():
-    if not os.path.exists('salt.bin'):
-        salt = os.urandom(16)
-        with open('salt.bin', 'wb') as f:
-            f.write(salt)
-    else:
-        with open('salt.bin', 'rb') as f:
-            salt = f.read()
-    return salt
-
-def get_key_from_password(password, salt):
+from tracing import count, span, traced
+
+# Fernet token layout: version (1) | timestamp (8) | IV (16) | ciphertext | HMAC-SHA256 (32)
+FERNET_VERSION = 0x80
+FERNET_IV_OFFSET = 9
+FERNET_HEADER_SIZE = 25
+FERNET_MAC_SIZE = 32
+AES_BLOCK_SIZE = 16
+
+# Vault key-derivation parameters are kept as a small versioned JSON header:
+# {"version", "kdf", "salt", <cost parameters of that kdf>}. Vaults store it
+# themselves; older ones used the shared salt.bin with a fixed PBKDF2
+# iteration count.
+KDF_HEADER_VERSION = 1
+LEGACY_SALT_FILE = 'salt.bin'
+LEGACY_ITERATIONS = 600_000
+KEY_LENGTH = 32
+
+# HKDF info labels: each purpose gets its own subkey of the vault key
+BLIND_INDEX_INFO = b'password-manager blind index v1'
+AUDIT_INFO = b'password-manager audit v1'
+
+# Auto-tuning: aim for this unlock time, but never go below the minimum costs
+TARGET_UNLOCK_SECONDS = 0.5
+MIN_ITERATIONS = 310_000
+MAX_ITERATIONS = 10_000_000
+BENCHMARK_ITERATIONS = 100_000
+
+# scrypt: r=8, p=1, and N a power of two; memory is 128 * N * r bytes
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MIN_N = 2**15
+SCRYPT_MAX_N = 2**20
+
+# Argon2id (RFC 9106 second recommended option): 64 MiB, 4 lanes, t >= 3
+ARGON2_MEMORY_KIB = 64 * 1024
+ARGON2_LANES = 4
+ARGON2_MIN_ITERATIONS = 3
+ARGON2_MAX_ITERATIONS = 100
+
+try:
+  from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+  ARGON2_AVAILABLE = True
+except ImportError:  # cryptography < 44
+  ARGON2_AVAILABLE = False
+
+
+def pbkdf2_kdf(params):
+  return PBKDF2HMAC(algorithm=hashes.SHA256(), length=KEY_LENGTH, salt=params['salt'],
+                    iterations=params['iterations'], backend=default_backend())
+
+def scrypt_kdf(params):
+  return Scrypt(salt=params['salt'], length=KEY_LENGTH, n=params['n'], r=params['r'], p=params['p'],
+                backend=default_backend())
+
+def argon2id_kdf(params):
+  return Argon2id(salt=params['salt'], length=KEY_LENGTH, iterations=params['iterations'],
+                  lanes=params['lanes'], memory_cost=params['memory_cost'])
+
+# name -> factory building a one-shot KDF object from a vault's parameters
+KDFS = {
+  'pbkdf2-sha256': pbkdf2_kdf,
+  'scrypt': scrypt_kdf,
+}
+if ARGON2_AVAILABLE:
+  KDFS['argon2id'] = argon2id_kdf
+
+# New vaults get a memory-hard KDF
+DEFAULT_KDF = 'argon2id' if ARGON2_AVAILABLE else 'scrypt'
+
+def time_kdf(params, rounds=1):
+  """Best-of-rounds seconds to derive one key with params"""
+  best = None
+  for _ in range(rounds):
+    start = time.perf_counter()
+    KDFS[params['kdf']](params).derive(b'benchmark')
+    seconds = time.perf_counter() - start
+    best = seconds if best is None else min(best, seconds)
+  return best
+
+def kdf_memory_bytes(params):
+  """Memory a single derivation needs, per the KDF's cost parameters"""
+  if params['kdf'] == 'scrypt':
+    return 128 * params['n'] * params['r'] * params['p']
+  if params['kdf'] == 'argon2id':
+    return params['memory_cost'] * 1024
+  return 0
+
+def benchmark_kdf(iterations=BENCHMARK_ITERATIONS, rounds=3):
+  """Measure PBKDF2-SHA256 iterations per second on this host (best of rounds)"""
+  params = {'kdf': 'pbkdf2-sha256', 'salt': os.urandom(16), 'iterations': iterations}
+  return iterations / time_kdf(params, rounds)
+
+def tune_iterations(target_seconds=TARGET_UNLOCK_SECONDS, rate=None):
+  """Pick the PBKDF2 iteration count that takes about target_seconds to derive here"""
+  if rate is None:
+    rate = benchmark_kdf()
+  iterations = round(rate * target_seconds, -4)
+  return int(min(max(iterations, MIN_ITERATIONS), MAX_ITERATIONS))
+
+def tune_kdf(kdf=DEFAULT_KDF, target_seconds=TARGET_UNLOCK_SECONDS):
+  """Return fresh parameters (new salt included) for kdf, tuned to target_seconds here"""
+  if kdf not in KDFS:
+    raise ValueError(f"Unknown or unavailable KDF {kdf!r}, expected one of {tuple(KDFS)}")
+  params = {'kdf': kdf, 'salt': os.urandom(16)}
+
+  if kdf == 'pbkdf2-sha256':
+    params['iterations'] = tune_iterations(target_seconds)
+  elif kdf == 'scrypt':
+    # Time scales linearly with N; keep the largest power of two that fits
+    params.update(n=SCRYPT_MIN_N, r=SCRYPT_R, p=SCRYPT_P)
+    seconds = time_kdf(params)
+    while params['n'] < SCRYPT_MAX_N and seconds * 2 <= target_seconds:
+      params['n'] *= 2
+      seconds *= 2
+  elif kdf == 'argon2id':
+    # Fixed memory: one pass costs the memory fill plus a pass, each extra pass about the same again
+    params.update(iterations=1, lanes=ARGON2_LANES, memory_cost=ARGON2_MEMORY_KIB)
+    first = time_kdf(params)
+    params['iterations'] = 2
+    extra = max(time_kdf(params) - first, 1e-6)
+    passes = 1 + int((target_seconds - first) / extra)
+    params['iterations'] = min(max(passes, ARGON2_MIN_ITERATIONS), ARGON2_MAX_ITERATIONS)
+  return params
+
+def encode_kdf_header(params):
+  """Serialize KDF parameters to the versioned JSON header"""
+  header = dict(params, version=KDF_HEADER_VERSION, salt=base64.b64encode(params['salt']).decode())
+  return json.dumps(header, sort_keys=True)
+
+def decode_kdf_header(text):
+  """Parse a versioned JSON header back into KDF parameters"""
+  header = json.loads(text)
+  if header.get('version') != KDF_HEADER_VERSION:
+    raise ValueError("Unsupported key-derivation header version")
+  if header.get('kdf') not in KDFS:
+    raise ValueError(f"Vault uses the {header.get('kdf')!r} KDF, which is not available here")
+  params = {name: value for name, value in header.items() if name != 'version'}
+  params['salt'] = base64.b64decode(header['salt'])
+  return params
+
+def load_legacy_kdf_params():
+  """KDF parameters of vaults that predate per-vault headers, or None if there are none.
+
+  These vaults share the salt in salt.bin, with the old fixed iteration count.
+  """
+  if os.path.exists(LEGACY_SALT_FILE):
+    with open(LEGACY_SALT_FILE, 'rb') as f:
+      return {'kdf': 'pbkdf2-sha256', 'iterations': LEGACY_ITERATIONS, 'salt': f.read()}
+  return None
+
+def derive_key(password, params):
+  """Derive the vault key from the master password and the vault's KDF parameters"""
+  with span('kdf.derive_key', kdf=params['kdf']):
+    return base64.urlsafe_b64encode(KDFS[params['kdf']](params).derive(password.encode()))
+
+def derive_subkey(key, info, length=KEY_LENGTH):
+  """HKDF-SHA256 subkey of a Fernet key, for the purpose named by info"""
+  return HKDF(algorithm=hashes.SHA256(), length=length, salt=None, info=info).derive(base64.urlsafe_b64decode(key))
+
+@traced('kdf.get_key_from_password')
+def get_key_from_password(password, salt, iterations=LEGACY_ITERATIONS):
   kdf = PBKDF2HMAC(
     algorithm=hashes.SHA256(),
     length=32,
     salt=salt,  # this is a random value to make password cracking harder
                 # we should store it securely and reuse it each time we derive the key
-    iterations=600_000,
+    iterations=iterations,
     backend=default_backend()
   )
   return base64.urlsafe_b64encode(kdf.derive(password.encode()))
 
+
+class Cipher:
+  """Fernet session object: built once at unlock, then reused for every row"""
+
+  def __init__(self, key):
+    self.key = key
+    self._fernet = Fernet(key)
+    raw_key = base64.urlsafe_b64decode(key)
+    self._signing_key = raw_key[:16]
+    self._aes = algorithms.AES(raw_key[16:])
+    # Keys the blind index of vaults with encrypted metadata; never used to encrypt
+    self.index_key = derive_subkey(key, BLIND_INDEX_INFO)
+    # Keys the audit's password fingerprints, so equal secrets can be found without storing them
+    self.audit_key = derive_subkey(key, AUDIT_INFO)
+
+  def encrypt(self, password):
+    return self._fernet.encrypt(password.encode())
+
+  @traced('cipher.decrypt')
+  def decrypt(self, encrypted_password):
+    count('cipher.rows_decrypted')
+    return self._fernet.decrypt(encrypted_password).decode()
+
+  def encrypt_many(self, passwords):
+    encrypt = self._fernet.encrypt
+    return [encrypt(password.encode()) for password in passwords]
+
+  def decrypt_many(self, encrypted_passwords):
+    """Decrypt a batch of Fernet tokens, in order.
+
+    Each token's HMAC is still checked individually, but the AES work for the
+    whole batch is a single call: CBC decryption of a block is the raw AES
+    decryption of that block XORed with the previous ciphertext block (or the
+    IV), so every block is decrypted in one ECB pass and the XOR is done as
+    one big-integer operation. Raises InvalidToken for every token
+    Fernet.decrypt rejects, and also for a str token with non-ASCII
+    characters, where Fernet lets base64's ValueError through.
+    """
+    with span('cipher.decrypt_many', rows=len(encrypted_passwords)):
+      count('cipher.rows_decrypted', len(encrypted_passwords))
+      return self._decrypt_many(encrypted_passwords)
+
+  def _decrypt_many(self, encrypted_passwords):
+    signing_key = self._signing_key
+    blocks = []
+    chains = []
+    lengths = []
+
+    for token in encrypted_passwords:
+      if not isinstance(token, (str, bytes)):
+        raise TypeError("token must be bytes or str")
+      try:
+        data = base64.urlsafe_b64decode(token)
+      except ValueError:  # binascii.Error, or non-ASCII characters in a str
+        raise InvalidToken
+      ciphertext_size = len(data) - FERNET_HEADER_SIZE - FERNET_MAC_SIZE
+      if not data or data[0] != FERNET_VERSION or ciphertext_size <= 0 or ciphertext_size % AES_BLOCK_SIZE:
+        raise InvalidToken
+
+      mac_offset = len(data) - FERNET_MAC_SIZE
+      if not hmac.compare_digest(hmac.digest(signing_key, data[:mac_offset], 'sha256'), data[mac_offset:]):
+        raise InvalidToken
+
+      # Ciphertext blocks, and the block each one is chained to: IV + all but the last
+      blocks.append(data[FERNET_HEADER_SIZE:mac_offset])
+      chains.append(data[FERNET_IV_OFFSET:mac_offset - AES_BLOCK_SIZE])
+      lengths.append(ciphertext_size)
+
+    if not blocks:
+      return []
+
+    ciphertext = b''.join(blocks)
+    decryptor = AESCipher(self._aes, modes.ECB()).decryptor()
+    decrypted = decryptor.update(ciphertext) + decryptor.finalize()
+    size = len(ciphertext)
+    padded = (int.from_bytes(decrypted, 'big') ^ int.from_bytes(b''.join(chains), 'big')).to_bytes(size, 'big')
+
+    passwords = []
+    offset = 0
+    for length in lengths:
+      plaintext = padded[offset:offset + length]
+      offset += length
+      pad = plaintext[-1]
+      if not 1 <= pad <= AES_BLOCK_SIZE or plaintext[-pad:] != bytes([pad]) * pad:
+        raise InvalidToken
+      passwords.append(plaintext[:-pad].decode())
+    return passwords
+
+
+@lru_cache(maxsize=4)
+def get_cipher(key):
+  """Cipher for a raw Fernet key, reused across calls"""
+  return Cipher(key)
+
+def as_cipher(key):
+  """Accept either a Cipher or a raw Fernet key"""
+  return key if isinstance(key, Cipher) else get_cipher(key)
+
+def forget_ciphers():
+  """Drop cached Ciphers (and the keys they hold), e.g. on logout"""
+  get_cipher.cache_clear()
+
 def encrypt_password(key, password):
-  fernet = Fernet(key)
-  return fernet.encrypt(password.encode())
+  return as_cipher(key).encrypt(password)
 
+@traced('cipher.decrypt_password')
 def decrypt_password(key, encrypted_password):
-  fernet = Fernet(key)
-  return fernet.decrypt(encrypted_password).decode()
+  return as_cipher(key).decrypt(encrypted_password)
@@ -0,0 +1,216 @@
+"""Password and passphrase generator with exact entropy.
+
+Randomness comes from os.urandom in bulk buffers, never one call per
+character. Bytes become characters by rejection sampling: a byte is kept
+only below the largest multiple of the alphabet size, then reduced modulo
+that size, so every character is exactly equally likely. The mapping is a
+single bytes.translate per buffer, which is what makes millions of
+candidates per second possible.
+
+A policy knows how many distinct passwords it can produce, so its entropy
+is exact: log2 of that count. When every character class is required,
+candidates missing one are rejected whole, which keeps the rest uniform,
+and the count comes from inclusion-exclusion over the classes.
+
+Per-site rules live in a JSON file ($PASSWORD_MANAGER_GENERATOR_RULES, else
+generator_rules.json) mapping a domain to policy settings, e.g.
+{"bank.example.com": {"length": 16, "symbols": "!@#$%"},
+ "example.org": {"type": "diceware", "words": 5}}; a rule also covers the
+domain's subdomains.
+"""
+
+import json
+import math
+import os
+import re
+import string
+from functools import lru_cache
+from itertools import combinations
+
+LOWER = string.ascii_lowercase
+UPPER = string.ascii_uppercase
+DIGITS = string.digits
+# Printable ASCII punctuation, minus quotes, backslash and backtick, which
+# sites and shells often mangle
+SYMBOLS = '!#$%&()*+,-./:;<=>?@[]^_{|}~'
+AMBIGUOUS = frozenset('Il1|O0o')
+
+DEFAULT_LENGTH = 20
+DEFAULT_WORDS = 6
+DEFAULT_SEPARATOR = '-'
+
+# Bytes fetched from os.urandom at a time, at least
+RANDOM_BUFFER_SIZE = 64 * 1024
+
+WORDLIST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wordlist.txt')
+
+RULES_ENV = 'PASSWORD_MANAGER_GENERATOR_RULES'
+RULES_FILE = 'generator_rules.json'
+
+
+@lru_cache(maxsize=None)
+def byte_table(alphabet):
+    """bytes.translate table and rejected bytes mapping a random byte to a character of alphabet"""
+    size = len(alphabet)
+    limit = 256 - 256 % size
+    table = bytes(ord(alphabet[b % size]) if b < limit else 0 for b in range(256))
+    return table, bytes(range(limit, 256))
+
+
+def random_chars(alphabet, count):
+    """count characters drawn uniformly from alphabet (2-256 distinct ASCII characters)"""
+    table, rejected = byte_table(alphabet)
+    accept_rate = 1 - len(rejected) / 256
+    chunks, have = [], 0
+    while have < count:
+        chunk = os.urandom(max(RANDOM_BUFFER_SIZE, int((count - have) / accept_rate * 1.01)))
+        chunk = chunk.translate(table, rejected)
+        chunks.append(chunk)
+        have += len(chunk)
+    return b''.join(chunks)[:count].decode('ascii')
+
+
+def random_indexes(size, count):
+    """count integers drawn uniformly from range(size), size up to 65536"""
+    limit = 65536 - 65536 % size
+    indexes = []
+    while len(indexes) < count:
+        values = memoryview(os.urandom(2 * max(count - len(indexes), 64))).cast('H')
+        indexes.extend(value % size for value in values if value < limit)
+    return indexes[:count]
+
+
+@lru_cache(maxsize=None)
+def load_wordlist(path=WORDLIST_FILE):
+    """The bundled diceware list (or another one), one word per line"""
+    with open(path, encoding='utf-8') as f:
+        words = tuple(line.strip() for line in f if line.strip())
+    if len(set(words)) != len(words) or not 2 <= len(words) <= 65536:
+        raise ValueError(f"{path} must hold 2 to 65536 distinct words")
+    return words
+
+
+class CharsetPolicy:
+    """Random characters from the enabled classes; each one required at least once by default"""
+
+    def __init__(self, length=DEFAULT_LENGTH, lower=True, upper=True, digits=True, symbols=SYMBOLS,
+                 exclude_ambiguous=False, require_each=True):
+        symbols = SYMBOLS if symbols is True else symbols or ''
+        if any(ch not in string.punctuation for ch in symbols):
+            raise ValueError("symbols must be ASCII punctuation")
+        classes = [chars for chars, enabled in ((LOWER, lower), (UPPER, upper), (DIGITS, digits),
+                                                (''.join(dict.fromkeys(symbols)), True)) if enabled and chars]
+        if exclude_ambiguous:
+            classes = [chars for chars in (''.join(ch for ch in chars if ch not in AMBIGUOUS) for chars in classes)
+                       if chars]
+        if not classes:
+            raise ValueError("A password policy needs at least one character class")
+        if length < 1 or (require_each and length < len(classes)):
+            raise ValueError(f"A length of {length} cannot hold one character of each of {len(classes)} classes")
+
+        self.length = length
+        self.classes = classes
+        self.alphabet = ''.join(classes)
+        self.require_each = require_each and len(classes) > 1
+        self.required = re.compile(''.join(f'(?=.*[{re.escape(chars)}])' for chars in classes)) \
+            if self.require_each else None
+
+    def count(self):
+        """How many distinct passwords this policy can produce"""
+        size = len(self.alphabet)
+        if not self.require_each:
+            return size ** self.length
+        # Inclusion-exclusion: all strings, minus those missing each class, plus those missing each pair, ...
+        return sum((-1) ** len(missing) * (size - sum(len(chars) for chars in missing)) ** self.length
+                   for r in range(len(self.classes) + 1) for missing in combinations(self.classes, r))
+
+    def entropy_bits(self):
+        return math.log2(self.count())
+
+    def describe(self):
+        rule = ", one of each class" if self.require_each else ""
+        return f"{self.length} characters from {len(self.alphabet)}{rule}: {self.entropy_bits():.1f} bits"
+
+    def generate(self, count=1):
+        """count passwords, each uniform over the policy"""
+        length = self.length
+        accept_rate = self.count() / len(self.alphabet) ** length
+        passwords = []
+        while len(passwords) < count:
+            batch = math.ceil((count - len(passwords)) / accept_rate * 1.05) + 1
+            chars = random_chars(self.alphabet, batch * length)
+            candidates = [chars[i:i + length] for i in range(0, len(chars), length)]
+            if self.required is not None:
+                candidates = list(filter(self.required.match, candidates))
+            passwords.extend(candidates)
+        return passwords[:count]
+
+
+class DicewarePolicy:
+    """Words drawn uniformly from a wordlist, joined by a separator"""
+
+    def __init__(self, words=DEFAULT_WORDS, separator=DEFAULT_SEPARATOR, capitalize=False, wordlist=WORDLIST_FILE):
+        if words < 1:
+            raise ValueError("A passphrase needs at least one word")
+        # A separator made of letters could join two words into a third, and the count would overstate
+        if not separator or any(ch.isalpha() for ch in separator):
+            raise ValueError("The separator must be non-empty and contain no letters")
+        self.words = words
+        self.separator = separator
+        self.capitalize = capitalize
+        self.wordlist = load_wordlist(wordlist)
+
+    def count(self):
+        return len(self.wordlist) ** self.words
+
+    def entropy_bits(self):
+        return self.words * math.log2(len(self.wordlist))
+
+    def describe(self):
+        return f"{self.words} words from {len(self.wordlist):,}: {self.entropy_bits():.1f} bits"
+
+    def generate(self, count=1):
+        wordlist = [word.capitalize() for word in self.wordlist] if self.capitalize else self.wordlist
+        indexes = random_indexes(len(wordlist), count * self.words)
+        return [self.separator.join(wordlist[i] for i in indexes[start:start + self.words])
+                for start in range(0, len(indexes), self.words)]
+
+
+def policy_from_dict(settings):
+    """A policy from rule settings: {"type": "charset" (default) or "diceware", plus its arguments}"""
+    settings = dict(settings)
+    kind = settings.pop('type', 'charset')
+    policies = {'charset': CharsetPolicy, 'diceware': DicewarePolicy}
+    if kind not in policies:
+        raise ValueError(f"Unknown policy type {kind!r}, expected one of {tuple(policies)}")
+    try:
+        return policies[kind](**settings)
+    except TypeError as e:
+        raise ValueError(f"Bad {kind} policy settings: {e}") from None
+
+
+def load_site_rules(path=None):
+    """Per-site rule settings by domain; empty if there is no rules file"""
+    path = path or os.environ.get(RULES_ENV) or RULES_FILE
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    return {domain.lower().strip('.'): settings for domain, settings in rules.items()}
+
+
+def site_domain(website):
+    """The host of a website field: no scheme, path, port or leading www."""
+    host = re.sub(r'^[a-z][a-z0-9+.-]*://', '', website.strip().lower()).split('/')[0].split(':')[0]
+    return host[4:] if host.startswith('www.') else host
+
+
+def policy_for_site(website, rules=None):
+    """The policy of the most specific rule covering website, else the default charset policy"""
+    rules = load_site_rules() if rules is None else rules
+    labels = site_domain(website).split('.')
+    for i in range(len(labels)):
+        settings = rules.get('.'.join(labels[i:]))
+        if settings is not None:
+            return policy_from_dict(settings)
+    return CharsetPolicy()
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
 import customtkinter as ctk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 import tkinter as tk
+import threading
+import time
+from collections import deque
+
+from tracing import traced
 
 try:
     import pyperclip
@@ -11,8 +16,9 @@ except ImportError:
     CLIPBOARD_AVAILABLE = False
     print("Warning: pyperclip not available, clipboard features disabled")
 
-from derive_key import get_key_from_password, load_or_create_salt
-from database import create_database, save_password, get_passwords, update_password, delete_password
+# The vault core (cryptography, sqlite3, the cache) is imported where it is
+# first used, on the unlock worker thread, so the login window paints
+# without waiting for it
 
 # Set appearance mode and theme
 ctk.set_appearance_mode("dark")
@@ -62,13 +68,148 @@ ANIMATION = {
     'fade_steps': 20,
 }
 
+# How often the Tk loop checks on a running unlock (ms)
+UNLOCK_POLL_MS = 50
+
+# How often the Tk loop checks on queued database work (ms)
+DB_POLL_MS = 30
+
+# Search runs this long after the last keystroke (ms)
+SEARCH_DEBOUNCE_MS = 120
+
+# Card grid geometry, in unscaled pixels
+CARD_HEIGHT = 210
+CARD_PADDING = 12
+CARD_ROW_HEIGHT = CARD_HEIGHT + 2 * CARD_PADDING
+
+# Above this many entries the grid is virtualized: only the visible rows
+# (plus CARD_OVERSCAN_ROWS above and below) get card widgets, and those
+# widgets are recycled as the user scrolls
+VIRTUALIZE_THRESHOLD = 60
+CARD_OVERSCAN_ROWS = 2
+
+# After unlock, the rest of the vault's metadata is read on the database
+# worker in pages this large, each cached by the Tk loop as it arrives
+BACKGROUND_PAGE_SIZE = 2000
+
+# Shown on a card for each issue the last audit found with its secret
+BADGE_LABELS = {'reused': "♻ Reused", 'weak': "⚠ Weak"}
+
+
+def unlock_vault(password, report_stage=lambda stage: None):
+    """Derive the key and load the vault cache; runs on a worker thread, never touches Tk"""
+    report_stage("Loading")
+    from derive_key import derive_key, Cipher
+    from database import load_kdf_params
+    from cache import VaultCache
+
+    # Opens the vault; a new one benchmarks the KDF here to pick its cost parameters
+    report_stage("Opening vault")
+    kdf_params = load_kdf_params(password)
+    report_stage("Deriving key")
+    cipher = Cipher(derive_key(password, kdf_params))
+    report_stage("Loading entries")
+    vault = VaultCache(cipher, password)
+    vault.load()
+    return cipher, vault
+
+
+def confirm_unbreached(parent, password):
+    """Ask before saving a password found in the offline breach corpus; True to go ahead"""
+    from breach import open_corpus
+
+    try:
+        corpus = open_corpus()
+        if corpus is None:
+            return True  # No corpus built: nothing to check against
+        with corpus:
+            breached = corpus.is_breached(password)
+    except (ValueError, OSError) as e:
+        messagebox.showerror("Error", f"Failed to check the breach corpus: {str(e)}", parent=parent)
+        return True
+    return not breached or messagebox.askyesno(
+        "Breached Password",
+        "This password appears in a known data breach, so attackers try it first.\n\nSave it anyway?",
+        icon='warning', parent=parent)
+
+
+def create_generator_row(parent, website_entry, password_entry):
+    """Buttons that fill password_entry with a generated password, and a label with its entropy"""
+    row = ctk.CTkFrame(parent, fg_color="transparent")
+    row.pack(fill="x")
+
+    entropy_label = ctk.CTkLabel(row, text="", font=FONTS['small'], text_color=COLORS['text_secondary'])
+
+    def fill(passphrase):
+        from generator import DicewarePolicy, policy_for_site
+
+        try:
+            policy = DicewarePolicy() if passphrase else policy_for_site(website_entry.get())
+            password = policy.generate()[0]
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Failed to generate a password: {str(e)}", parent=parent)
+            return
+        password_entry.delete(0, "end")
+        password_entry.insert(0, password)
+        entropy_label.configure(text=policy.describe())
+
+    for text, passphrase in (("🎲 Generate", False), ("Passphrase", True)):
+        ctk.CTkButton(
+            row,
+            text=text,
+            font=FONTS['small'],
+            width=100,
+            height=32,
+            corner_radius=8,
+            fg_color=COLORS['bg_tertiary'],
+            hover_color=COLORS['border'],
+            command=lambda passphrase=passphrase: fill(passphrase)
+        ).pack(side="left", padx=(0, 8))
+    entropy_label.pack(side="left", padx=(4, 0))
+    return row
+
+
 class PasswordManagerGUI:
     def __init__(self):
         self.master_password = None
-        self.key = None
-        self.salt = load_or_create_salt()
+        self.cipher = None
+        self.vault = None
         self.current_passwords = []
 
+        # Small grids keep one card per entry id; larger ones are virtualized:
+        # entry index -> card widget, plus idle cards
+        self.cards_by_id = {}
+        self.visible_cards = {}
+        self.spare_cards = []
+        self.grid_spacer = None
+        self.render_pending = False
+        self.page_pending = False  # A background page read is on the database worker
+        self.search_job = None
+        self.search_generation = 0  # Bumped by every search, so a stale result can be told apart
+
+        # Single thread that runs every database write of the session, in order
+        self.db_worker = None
+
+        # worker -> deque of (future, on_done, on_error) not yet delivered to
+        # the Tk thread; each worker's results are delivered in the order
+        # they were submitted
+        self.task_callbacks = {}
+
+        # Audits run on a thread of their own, so writes never queue behind
+        # one. While one runs, further requests coalesce into a single rerun.
+        self.audit_worker = None
+        self.audit_cancel = None  # Event set on logout to stop the running audit
+        self.audit_running = False
+        self.audit_rerun = False
+
+        # Last password health audit, or None until the first one finishes
+        self.audit = None
+
+        # Pending unlock, if any: a Future resolved by the worker thread
+        self.unlock_job = None
+        self.unlock_started = 0.0
+        self.unlock_stage = ""
+
         # Animation state
         self.fade_alpha = 0.0
         self.is_animating = False
@@ -208,7 +349,7 @@ class PasswordManagerGUI:
         self.master_password_entry.bind('<FocusOut>', self.on_entry_blur)
 
         # Enhanced login button with gradient-like effect
-        login_btn = ctk.CTkButton(
+        self.login_btn = ctk.CTkButton(
             form_frame,
             text="🔓 Unlock Vault",  # Enhanced button text with icon
             font=FONTS['button'],
@@ -219,11 +360,50 @@ class PasswordManagerGUI:
             command=self.login,
             cursor="hand2"
         )
-        login_btn.pack(fill="x")
+        self.login_btn.pack(fill="x")
+
+        # Unlock progress, built on first unlock and shown in place of the button
+        self.login_form = form_frame
+        self.unlock_progress_frame = None
 
         # Focus and no fade in (removed fade_in_window call)
         self.master_password_entry.focus()
 
+    def build_unlock_progress(self):
+        """Create the spinner, stage label and cancel button under the login form"""
+        self.unlock_progress_frame = ctk.CTkFrame(self.login_form, fg_color="transparent")
+
+        self.unlock_progress_bar = ctk.CTkProgressBar(
+            self.unlock_progress_frame,
+            mode="indeterminate",
+            height=6,
+            corner_radius=3,
+            fg_color=COLORS['bg_tertiary'],
+            progress_color=COLORS['accent']
+        )
+        self.unlock_progress_bar.pack(fill="x", pady=(4, 8))
+
+        self.unlock_status_label = ctk.CTkLabel(
+            self.unlock_progress_frame,
+            text="",
+            font=FONTS['small'],
+            text_color=COLORS['text_secondary']
+        )
+        self.unlock_status_label.pack(anchor="w")
+
+        cancel_btn = ctk.CTkButton(
+            self.unlock_progress_frame,
+            text="Cancel",
+            font=FONTS['button'],
+            height=36,
+            corner_radius=10,
+            fg_color=COLORS['bg_tertiary'],
+            hover_color=COLORS['border'],
+            command=self.cancel_unlock,
+            cursor="hand2"
+        )
+        cancel_btn.pack(fill="x", pady=(6, 0))
+
     def on_entry_focus(self, event):
         """Add focus animation to entry fields - fixed for CustomTkinter"""
         # Use CustomTkinter's configure method correctly
@@ -252,13 +432,85 @@ class PasswordManagerGUI:
             messagebox.showerror("Authentication Required", "Please enter your master password.")
             return
 
+        if self.unlock_job is not None:
+            return  # Already unlocking
+
+        # Derive the key on a worker thread; the Tk loop polls for the result
+        from concurrent.futures import Future
+
+        future = Future()
+        self.unlock_job = future
+        self.unlock_started = time.perf_counter()
+        self.unlock_stage = "Deriving key"
+        threading.Thread(target=self.run_unlock, args=(future, password), daemon=True).start()
+
+        self.show_unlock_progress()
+        self.root.after(UNLOCK_POLL_MS, self.poll_unlock, future, password)
+
+    def run_unlock(self, future, password):
+        """Worker thread body: resolve future with (cipher, vault)"""
+        def report_stage(stage):
+            self.unlock_stage = stage
+
+        try:
+            future.set_result(unlock_vault(password, report_stage))
+        except Exception as e:
+            future.set_exception(e)
+
+    def poll_unlock(self, future, password):
+        """Check on the unlock worker from the Tk loop"""
+        if future is not self.unlock_job:
+            return  # Cancelled or superseded, drop the result
+
+        if not future.done():
+            elapsed = time.perf_counter() - self.unlock_started
+            self.unlock_status_label.configure(text=f"{self.unlock_stage}… {elapsed:.1f}s")
+            self.root.after(UNLOCK_POLL_MS, self.poll_unlock, future, password)
+            return
+
+        self.unlock_job = None
         try:
-            self.master_password = password
-            self.key = get_key_from_password(password, self.salt)
-            create_database(password)
-            self.show_main_screen()
+            self.cipher, self.vault = future.result()
         except Exception as e:
+            self.hide_unlock_progress()
             messagebox.showerror("Error", f"Login failed: {str(e)}")
+            return
+
+        self.master_password = password
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.db_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vault-db")
+        self.audit_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vault-audit")
+        self.audit_cancel = threading.Event()
+        self.vault.defer = self.db_worker.submit
+        self.show_main_screen()
+        self.load_remaining_pages()
+        self.start_audit()
+
+    def cancel_unlock(self):
+        """Abandon a running unlock; the worker's result is discarded when it finishes"""
+        self.unlock_job = None
+        self.hide_unlock_progress()
+        self.master_password_entry.focus()
+
+    def show_unlock_progress(self):
+        """Swap the unlock button for the spinner and cancel button"""
+        if self.unlock_progress_frame is None:
+            self.build_unlock_progress()
+        self.master_password_entry.configure(state="disabled")
+        self.login_btn.pack_forget()
+        self.unlock_status_label.configure(text=f"{self.unlock_stage}…")
+        self.unlock_progress_frame.pack(fill="x")
+        self.unlock_progress_bar.start()
+
+    def hide_unlock_progress(self):
+        """Restore the login form after a failed or cancelled unlock"""
+        if self.unlock_progress_frame is None:
+            return
+        self.unlock_progress_bar.stop()
+        self.unlock_progress_frame.pack_forget()
+        self.login_btn.pack(fill="x")
+        self.master_password_entry.configure(state="normal")
 
     def show_main_screen(self):
         """Enhanced main screen with better visual hierarchy"""
@@ -296,6 +548,10 @@ class PasswordManagerGUI:
         )
         self.cards_container.grid(row=1, column=0, sticky="nsew", pady=(20, 0))
         self.cards_container.grid_columnconfigure((0, 1), weight=1, uniform="cards")
+        self.current_passwords = []  # A fresh container: the first display builds every card
+
+        # Re-render the virtualized grid whenever the visible window moves
+        self.cards_container._parent_canvas.configure(yscrollcommand=self.on_cards_scrolled)
 
         self.refresh_passwords()
 
@@ -365,6 +621,36 @@ class PasswordManagerGUI:
         )
         new_btn.pack(side="right", padx=(12, 0))
 
+        # Bulk import button
+        import_btn = ctk.CTkButton(
+            actions_frame,
+            text="📥 Import",
+            font=FONTS['button'],
+            height=40,
+            width=100,
+            corner_radius=10,
+            fg_color=COLORS['bg_quaternary'],
+            hover_color=COLORS['accent'],
+            command=self.import_passwords,
+            cursor="hand2"
+        )
+        import_btn.pack(side="right", padx=(12, 0))
+
+        # Encrypted export button
+        export_btn = ctk.CTkButton(
+            actions_frame,
+            text="📤 Export",
+            font=FONTS['button'],
+            height=40,
+            width=100,
+            corner_radius=10,
+            fg_color=COLORS['bg_quaternary'],
+            hover_color=COLORS['accent'],
+            command=self.export_passwords,
+            cursor="hand2"
+        )
+        export_btn.pack(side="right", padx=(12, 0))
+
         # Enhanced Sign Out button
         signout_btn = ctk.CTkButton(
             actions_frame,
@@ -408,7 +694,7 @@ class PasswordManagerGUI:
 
         # Enhanced search entry
         self.search_var = tk.StringVar()
-        self.search_var.trace_add('write', self.filter_passwords)
+        self.search_var.trace_add('write', self.schedule_filter)
 
         self.search_entry = ctk.CTkEntry(
             search_content,
@@ -436,11 +722,31 @@ class PasswordManagerGUI:
         )
         self.stats_label.pack(anchor="w")
 
-    def display_password_cards(self, passwords):
-        """Display password cards in a 2-column grid"""
-        # Clear existing cards
+    @traced('gui.display_password_cards')
+    def display_password_cards(self, passwords, keep_position=False):
+        """Show passwords in the 2-column grid, touching only the cards that changed"""
+        virtual = len(passwords) > VIRTUALIZE_THRESHOLD
+        if not passwords or not self.current_passwords or virtual != (self.grid_spacer is not None):
+            # Into or out of the empty state, or switching grid modes
+            self.rebuild_password_cards(passwords)
+        elif virtual:
+            self.current_passwords = passwords
+            self.resize_grid_spacer()
+            if not keep_position:
+                self.cards_container._parent_canvas.yview_moveto(0)
+            self.render_visible_cards()
+        else:
+            self.reflow_password_cards(passwords)
+
+    @traced('gui.rebuild_password_cards')
+    def rebuild_password_cards(self, passwords):
+        """Destroy every card and build the grid for passwords from scratch"""
         for widget in self.cards_container.winfo_children():
             widget.destroy()
+        self.cards_by_id = {}
+        self.visible_cards = {}
+        self.spare_cards = []
+        self.grid_spacer = None
 
         self.current_passwords = passwords
 
@@ -448,25 +754,203 @@ class PasswordManagerGUI:
             self.show_empty_state()
             return
 
+        if len(passwords) > VIRTUALIZE_THRESHOLD:
+            self.show_virtual_grid()
+            return
+
         # Create cards in 2-column grid
         for i, pwd in enumerate(passwords):
             row = i // 2
             col = i % 2
 
-            self.create_password_card(pwd, row, col)
+            self.cards_by_id[pwd['id']] = self.create_password_card(pwd, row, col)
+
+    @traced('gui.reflow_password_cards')
+    def reflow_password_cards(self, passwords):
+        """Diff passwords against the cards on screen by entry id.
+
+        Cards of removed entries are destroyed, new entries get new cards,
+        edited ones are rebound in place, and only cards whose position
+        changed are moved in the grid.
+        """
+        cards = self.cards_by_id
+        wanted = {pwd['id'] for pwd in passwords}
+        for entry_id in [i for i in cards if i not in wanted]:
+            cards.pop(entry_id).destroy()
 
+        for i, pwd in enumerate(passwords):
+            row, col = divmod(i, 2)
+            card = cards.get(pwd['id'])
+            if card is None:
+                cards[pwd['id']] = self.create_password_card(pwd, row, col)
+                continue
+            if card.password_data is not pwd:
+                # The cache replaces an entry's handle when it is edited
+                self.bind_password_card(card, pwd)
+            if card.grid_position != (row, col):
+                card.grid_configure(row=row, column=col)
+                card.grid_position = (row, col)
+
+        self.current_passwords = passwords
+
+    def show_virtual_grid(self):
+        """Size the scroll region for every row, but only build the visible cards"""
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.cards_container)
+        total_rows = (len(self.current_passwords) + 1) // 2
+
+        # An empty frame as tall as the whole grid gives the canvas its scroll region
+        self.grid_spacer = tk.Frame(
+            self.cards_container,
+            height=int(total_rows * CARD_ROW_HEIGHT * scaling),
+            width=1,
+            bg=COLORS['bg_secondary'],
+            highlightthickness=0
+        )
+        self.grid_spacer.grid(row=0, column=0, columnspan=2, sticky="ew")
+
+        self.cards_container._parent_canvas.yview_moveto(0)
+        self.render_visible_cards()
+
+    def resize_grid_spacer(self):
+        """Make the virtual grid's scroll region fit current_passwords"""
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.cards_container)
+        total_rows = (len(self.current_passwords) + 1) // 2
+        self.grid_spacer.configure(height=int(total_rows * CARD_ROW_HEIGHT * scaling))
+
+    def on_cards_scrolled(self, first, last):
+        """yscrollcommand hook: update the scrollbar, then re-render once per idle"""
+        self.cards_container._scrollbar.set(first, last)
+        if self.grid_spacer is not None and not self.render_pending:
+            self.render_pending = True
+            self.root.after_idle(self.render_visible_cards)
+
+    def load_remaining_pages(self):
+        """Read the next page of entries on the database worker, until the cache holds them all"""
+        if self.page_pending or self.vault.complete:
+            return
+        self.page_pending = True
+        after = self.vault.cursor
+        self.run_db_task(self.vault.fetch_page, after, BACKGROUND_PAGE_SIZE,
+                         on_done=lambda rows: self.page_loaded(after, rows),
+                         on_error=self.page_failed)
+
+    def page_loaded(self, after, rows):
+        """Cache a page read in the background, show it, and ask for the next one"""
+        self.page_pending = False
+        page = self.vault.add_page(after, rows, BACKGROUND_PAGE_SIZE)
+        if self.search_var.get():
+            # Searches so far only covered the loaded pages
+            if self.vault.complete:
+                self.show_changed_entries()
+        elif page:
+            self.show_loaded_page(page)
+        self.load_remaining_pages()
+
+    def page_failed(self, error):
+        self.page_pending = False
+        self.show_toast_notification(f"Failed to load passwords: {str(error)}")
+
+    def show_loaded_page(self, page):
+        """Append a newly cached page of entries to the unfiltered grid"""
+        if self.grid_spacer is None:
+            self.display_password_cards(self.vault.entries())
+        else:
+            # Keep the scroll position: grow the scroll region and render into it
+            self.current_passwords.extend(page)
+            self.resize_grid_spacer()
+            self.render_visible_cards()
+        self.update_stats(len(self.current_passwords), self.vault.total)
+
+    @traced('gui.render_visible_cards')
+    def render_visible_cards(self):
+        """Bind card widgets to the rows in view, recycling cards that scrolled out"""
+        self.render_pending = False
+        if self.grid_spacer is None or not self.grid_spacer.winfo_exists():
+            return
+
+        passwords = self.current_passwords
+        canvas = self.cards_container._parent_canvas
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.cards_container)
+        grid_height = max(self.grid_spacer.winfo_reqheight(), 1)
+        row_height = CARD_ROW_HEIGHT * scaling
+
+        top, bottom = canvas.yview()
+        first_row = max(int(top * grid_height / row_height) - CARD_OVERSCAN_ROWS, 0)
+        last_row = int(bottom * grid_height / row_height) + CARD_OVERSCAN_ROWS
+        wanted = range(first_row * 2, min((last_row + 1) * 2, len(passwords)))
+
+        # Release cards that left the window
+        for index in [i for i in self.visible_cards if i not in wanted]:
+            card = self.visible_cards.pop(index)
+            card.master.place_forget()
+            self.spare_cards.append(card)
+
+        # Fill the newly visible slots, reusing released cards first. Slots
+        # already in view are rebound only if another entry now sits there.
+        for index in wanted:
+            card = self.visible_cards.get(index)
+            if card is not None:
+                if card.password_data is not passwords[index]:
+                    self.bind_password_card(card, passwords[index])
+                continue
+            if self.spare_cards:
+                card = self.spare_cards.pop()
+                self.bind_password_card(card, passwords[index])
+            else:
+                # Each card lives in a plain slot frame that is moved around with place()
+                slot = tk.Frame(self.cards_container, bg=COLORS['bg_secondary'], highlightthickness=0)
+                card = self.build_password_card(passwords[index], slot)
+                card.pack(fill="x", padx=CARD_PADDING, pady=CARD_PADDING)
+
+            row, col = divmod(index, 2)
+            card.master.place(x=0, y=int(row * row_height), relx=col * 0.5, relwidth=0.5,
+                              height=int(row_height))
+            self.visible_cards[index] = card
+
+    @traced('gui.create_password_card')
     def create_password_card(self, password_data, row, col):
+        """Build a card and place it in the 2-column grid"""
+        card = self.build_password_card(password_data)
+        card.grid(row=row, column=col, padx=CARD_PADDING, pady=CARD_PADDING, sticky="ew")
+        card.grid_position = (row, col)
+        return card
+
+    def bind_password_card(self, card, password_data):
+        """Point an existing card at another entry, so it can be recycled"""
+        card.password_data = password_data
+
+        website_text = password_data['website']
+        if len(website_text) > 22:
+            website_text = website_text[:19] + "..."
+        card.website_label.configure(text=f"🌐 {website_text}")
+
+        username_text = password_data['username']
+        if len(username_text) > 32:
+            username_text = username_text[:29] + "..."
+        card.username_value.configure(text=username_text)
+        self.set_card_badges(card)
+
+    def set_card_badges(self, card):
+        """Show the audit's findings for the card's entry"""
+        issues = self.audit.issues(card.password_data['id']) if self.audit is not None else []
+        text = "  ".join(BADGE_LABELS[issue] for issue in issues)
+        if text != card.badge_text:
+            card.badge_text = text
+            card.badge_label.configure(text=text)
+
+    @traced('gui.build_password_card')
+    def build_password_card(self, password_data, parent=None):
         """Enhanced password card with better visual hierarchy and hover effects"""
         card = ctk.CTkFrame(
-            self.cards_container,
+            parent if parent is not None else self.cards_container,
             fg_color=COLORS['bg_tertiary'],
             corner_radius=16,  # More rounded
-            height=210,        # Taller cards
+            height=CARD_HEIGHT,  # Taller cards
             border_width=1,
             border_color=COLORS['border']
         )
-        card.grid(row=row, column=col, padx=12, pady=12, sticky="ew")
         card.pack_propagate(False)
+        card.password_data = password_data
 
         # Subtle top accent line
         accent_line = ctk.CTkFrame(
@@ -490,19 +974,29 @@ class PasswordManagerGUI:
         if len(website_text) > 22:
             website_text = website_text[:19] + "..."
 
-        website_label = ctk.CTkLabel(
+        card.website_label = ctk.CTkLabel(
             header_frame,
             text=f"🌐 {website_text}",
             font=FONTS['subheading'],
             text_color=COLORS['text_primary'],
             anchor="w"
         )
-        website_label.pack(side="left", fill="x", expand=True)
+        card.website_label.pack(side="left", fill="x", expand=True)
 
         # Enhanced action buttons with better spacing
         actions_frame = ctk.CTkFrame(header_frame, fg_color="transparent")
         actions_frame.pack(side="right")
 
+        # Health badges, filled in by set_card_badges
+        card.badge_text = ""
+        card.badge_label = ctk.CTkLabel(
+            header_frame,
+            text="",
+            font=FONTS['small'],
+            text_color=COLORS['warning']
+        )
+        card.badge_label.pack(side="right", padx=(0, 8))
+
         # Copy password button with tooltip-like styling
         copy_btn = ctk.CTkButton(
             actions_frame,
@@ -513,7 +1007,7 @@ class PasswordManagerGUI:
             font=('SF Pro Display', 16),
             fg_color=COLORS['bg_quaternary'],
             hover_color=COLORS['accent'],
-            command=lambda: self.copy_to_clipboard(password_data['password'], "Password"),
+            command=lambda: self.copy_secret_to_clipboard(card.password_data),
             cursor="hand2"
         )
         copy_btn.pack(side="left", padx=(0, 6))
@@ -528,7 +1022,7 @@ class PasswordManagerGUI:
             font=('SF Pro Display', 16),
             fg_color=COLORS['bg_quaternary'],
             hover_color=COLORS['accent'],
-            command=lambda: self.copy_to_clipboard(password_data['username'], "Username"),
+            command=lambda: self.copy_to_clipboard(card.password_data['username'], "Username"),
             cursor="hand2"
         )
         copy_user_btn.pack(side="left", padx=(0, 6))
@@ -543,7 +1037,7 @@ class PasswordManagerGUI:
             font=('SF Pro Display', 18, 'bold'),
             fg_color=COLORS['bg_quaternary'],
             hover_color=COLORS['accent'],
-            command=lambda: self.show_card_menu(password_data, more_btn),
+            command=lambda: self.show_card_menu(card.password_data, more_btn),
             cursor="hand2"
         )
         more_btn.pack(side="left")
@@ -564,13 +1058,13 @@ class PasswordManagerGUI:
         if len(username_text) > 32:
             username_text = username_text[:29] + "..."
 
-        username_value = ctk.CTkLabel(
+        card.username_value = ctk.CTkLabel(
             username_frame,
             text=username_text,
             font=FONTS['body_medium'],
             text_color=COLORS['text_primary']
         )
-        username_value.pack(anchor="w")
+        card.username_value.pack(anchor="w")
 
         # Enhanced password section
         password_frame = ctk.CTkFrame(content_frame, fg_color="transparent")
@@ -593,6 +1087,9 @@ class PasswordManagerGUI:
         )
         password_dots.pack(anchor="w", pady=(4, 7))
 
+        self.set_card_badges(card)
+        return card
+
     def show_empty_state(self):
         """Enhanced empty state with better visual appeal"""
         empty_frame = ctk.CTkFrame(self.cards_container, fg_color="transparent")
@@ -649,7 +1146,7 @@ class PasswordManagerGUI:
                         command=lambda: self.show_edit_password_dialog(password_data))
         menu.add_separator()
         menu.add_command(label="📋 Copy Password",
-                        command=lambda: self.copy_to_clipboard(password_data['password'], "Password"))
+                        command=lambda: self.copy_secret_to_clipboard(password_data))
         menu.add_command(label="👤 Copy Username",
                         command=lambda: self.copy_to_clipboard(password_data['username'], "Username"))
         menu.add_command(label="🌐 Copy Website",
@@ -664,8 +1161,8 @@ class PasswordManagerGUI:
         menu.post(x, y)
 
     def show_password_details(self, password_data):
-        """Show password details dialog"""
-        dialog = PasswordDetailsDialog(self.root, password_data, self.copy_to_clipboard)
+        """Show password details dialog; the secret is decrypted only if shown or copied"""
+        dialog = PasswordDetailsDialog(self.root, password_data, self.copy_to_clipboard, self.vault.reveal)
 
     def show_add_password_dialog(self):
         """Show add password dialog"""
@@ -673,56 +1170,235 @@ class PasswordManagerGUI:
 
     def show_edit_password_dialog(self, password_data):
         """Show edit password dialog"""
+        try:
+            password_data = self.vault.with_secret(password_data)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to decrypt password: {str(e)}")
+            return
         dialog = EditPasswordDialog(self.root, self.update_password_entry, password_data)
 
+    def run_db_task(self, func, *args, on_done=None, on_error=None, worker=None):
+        """Queue func on the database worker, or on worker if given.
+
+        on_done(result) or on_error(exception) then runs on the Tk thread.
+        """
+        worker = worker or self.db_worker
+        future = worker.submit(func, *args)
+        queue = self.task_callbacks.setdefault(worker, deque())
+        queue.append((future, on_done, on_error))
+        if len(queue) == 1:
+            self.root.after(DB_POLL_MS, self.poll_db_tasks, worker, queue)
+        return future
+
+    def poll_db_tasks(self, worker, queue):
+        """Deliver worker's finished work from the Tk loop, strictly in submission order.
+
+        A callback may depend on the ones before it having run: a page read
+        before a delete must be cached while the delete is still pending.
+        """
+        while queue and queue[0][0].done():
+            if self.task_callbacks.get(worker) is not queue:
+                return  # Signed out since; the session this was for is gone
+            future, on_done, on_error = queue[0]
+            try:
+                error = future.exception()
+                if error is not None:
+                    if on_error:
+                        on_error(error)
+                elif on_done:
+                    on_done(future.result())
+            finally:
+                # Popped only now, so work queued by the callback joins this poll
+                queue.popleft()
+        if queue and self.task_callbacks.get(worker) is queue:
+            self.root.after(DB_POLL_MS, self.poll_db_tasks, worker, queue)
+
+    def start_audit(self):
+        """Re-audit the vault on the audit worker; only new or changed entries are decrypted"""
+        if self.audit_running:
+            self.audit_rerun = True  # Once the running audit finishes
+            return
+        from concurrent.futures import CancelledError
+        from audit import audit_vault
+
+        master_password, cipher, cancel = self.master_password, self.cipher, self.audit_cancel
+
+        def stop_if_cancelled(audited, elapsed):
+            if cancel.is_set():
+                raise CancelledError()
+
+        def failed(e):
+            self.audit_finished()
+            self.show_toast_notification(f"Password audit failed: {str(e)}")
+
+        self.audit_running = True
+        self.audit_rerun = False
+        self.run_db_task(lambda: audit_vault(master_password, cipher, progress=stop_if_cancelled),
+                         on_done=self.show_audit, on_error=failed, worker=self.audit_worker)
+
+    def audit_finished(self):
+        """Start the rerun asked for while the last audit ran, if any"""
+        self.audit_running = False
+        if self.audit_rerun:
+            self.start_audit()
+
+    def show_audit(self, result):
+        """Badge the cards on screen with a finished audit"""
+        self.audit = result
+        for card in list(self.cards_by_id.values()) + list(self.visible_cards.values()):
+            self.set_card_badges(card)
+        self.audit_finished()
+
     def save_new_password(self, website, username, password):
         """Save new password to database"""
-        try:
-            save_password(website, username, password, self.key, self.master_password)
+        def saved(entry_id):
+            self.vault.record_added(entry_id, website, username)
             messagebox.showinfo("Success", "Password saved successfully!")
-            self.refresh_passwords()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save password: {str(e)}")
+            self.show_changed_entries()
+            self.start_audit()
+
+        # Not optimistic: the card needs the id the database assigns
+        self.run_db_task(self.vault.save, website, username, password, on_done=saved,
+                         on_error=lambda e: messagebox.showerror("Error", f"Failed to save password: {str(e)}"))
 
     def update_password_entry(self, old_data, new_website, new_username, new_password):
         """Update existing password entry"""
-        try:
-            update_password(old_data['id'], new_website, new_username, new_password, self.key, self.master_password)
-            messagebox.showinfo("Success", "Password updated successfully!")
-            self.refresh_passwords()
-        except Exception as e:
+        # Show the edit right away, and put the old entry back if the write fails
+        entry_id = old_data['id']
+        staged = self.vault.stage_update(entry_id, new_website, new_username, new_password)
+        self.show_changed_entries()
+
+        def failed(e):
+            self.vault.restore(staged)
+            self.show_changed_entries()
             messagebox.showerror("Error", f"Failed to update password: {str(e)}")
 
+        def updated(_):
+            messagebox.showinfo("Success", "Password updated successfully!")
+            self.start_audit()
+
+        self.run_db_task(self.vault.write_update, entry_id, new_website, new_username, new_password,
+                         on_done=updated, on_error=failed)
+
     def delete_password_card(self, password_data):
         """Delete password with confirmation"""
         if messagebox.askyesno("Confirm Delete",
                              f"Are you sure you want to delete the password for {password_data['website']}?",
                              icon='warning'):
-            try:
-                delete_password(password_data['id'], self.master_password)
-                messagebox.showinfo("Success", "Password deleted successfully!")
-                self.refresh_passwords()
-            except Exception as e:
+            # Remove the card right away, and bring it back if the delete fails
+            staged = self.vault.stage_delete(password_data['id'])
+            self.show_changed_entries()
+
+            def failed(e):
+                self.vault.restore(staged)
+                self.show_changed_entries()
                 messagebox.showerror("Error", f"Failed to delete password: {str(e)}")
 
-    def filter_passwords(self, var_name, index, mode):
-        """Filter passwords based on search term"""
-        search_term = self.search_var.get().lower()
+            def deleted(_):
+                self.vault.record_deleted(password_data['id'])
+                messagebox.showinfo("Success", "Password deleted successfully!")
+                self.start_audit()
 
-        try:
-            passwords = get_passwords(self.key, self.master_password)
-            if search_term:
-                filtered_passwords = [pwd for pwd in passwords
-                                    if search_term in pwd['website'].lower()
-                                    or search_term in pwd['username'].lower()]
-            else:
-                filtered_passwords = passwords
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load passwords: {str(e)}")
+            self.run_db_task(self.vault.write_delete, password_data['id'], on_done=deleted, on_error=failed)
+
+    def import_passwords(self):
+        """Bulk-import a CSV, JSON or Bitwarden export into the vault"""
+        from transfer import detect_format, ARCHIVE_EXTENSION
+
+        path = filedialog.askopenfilename(
+            parent=self.root,
+            title="Import Passwords",
+            filetypes=[("Password exports", f"*.csv *.json *.jsonl *{ARCHIVE_EXTENSION}"), ("All files", "*.*")]
+        )
+        if not path:
             return
 
-        self.display_password_cards(filtered_passwords)
-        self.update_stats(len(filtered_passwords), len(passwords))
+        if detect_format(path) == 'archive':
+            PassphraseDialog(self.root, "Import Archive",
+                             lambda passphrase: self.run_import(path, passphrase))
+        else:
+            self.run_import(path)
+
+    def run_import(self, path, passphrase=None):
+        """Import path into the vault on the database worker and report the throughput"""
+        from transfer import read_entries
+
+        def imported(stats):
+            self.vault.load()
+            self.refresh_passwords()
+            self.load_remaining_pages()
+            self.show_toast_notification(
+                f"✓ Imported {stats['imported']} passwords ({stats['rows_per_sec']:,.0f}/s)")
+            self.start_audit()
+
+        self.run_db_task(lambda: self.vault.write_import(read_entries(path, passphrase=passphrase)),
+                         on_done=imported,
+                         on_error=lambda e: messagebox.showerror("Error", f"Failed to import passwords: {str(e)}"))
+
+    def export_passwords(self):
+        """Stream the vault into a passphrase-encrypted archive"""
+        from transfer import ARCHIVE_EXTENSION
+
+        path = filedialog.asksaveasfilename(
+            parent=self.root,
+            title="Export Passwords",
+            defaultextension=ARCHIVE_EXTENSION,
+            filetypes=[("Encrypted archive", f"*{ARCHIVE_EXTENSION}")]
+        )
+        if not path:
+            return
+
+        PassphraseDialog(self.root, "Export Archive",
+                         lambda passphrase: self.run_export(path, passphrase))
+
+    def run_export(self, path, passphrase):
+        """Write the archive on the database worker and report the throughput"""
+        from transfer import export_archive
+
+        self.run_db_task(
+            export_archive, path, self.cipher, self.master_password, passphrase,
+            on_done=lambda stats: self.show_toast_notification(
+                f"✓ Exported {stats['exported']} passwords ({stats['rows_per_sec']:,.0f}/s)"),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to export passwords: {str(e)}"))
+
+    def schedule_filter(self, var_name, index, mode):
+        """Debounce the search box: filter once typing pauses"""
+        self.cancel_pending_filter()
+        self.search_job = self.root.after(SEARCH_DEBOUNCE_MS, self.filter_passwords)
+
+    def cancel_pending_filter(self):
+        """Drop a debounced search that has not run yet"""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
+
+    def filter_passwords(self):
+        """Filter passwords based on search term"""
+        self.search_job = None
+        self.search_entries(self.display_password_cards)
+
+    def search_entries(self, display, **options):
+        """Run the current search and pass the matches to display(matches, **options).
+
+        Plain metadata is answered from the session cache, from the pages
+        loaded so far, right away. Encrypted metadata needs a blind-index
+        query, which runs on the database worker; a result that arrives after
+        a newer search was started is dropped.
+        """
+        self.search_generation += 1
+        generation = self.search_generation
+        search_term = self.search_var.get()
+
+        def show(matches):
+            if generation == self.search_generation:
+                display(matches, **options)
+                self.update_stats(len(matches), self.vault.total)
+
+        if not search_term or not self.vault.encrypted_metadata:
+            show(self.vault.filter(search_term))
+            return
+        self.run_db_task(self.vault.find, search_term, on_done=lambda rows: show(self.vault.matched(rows)),
+                         on_error=lambda e: self.show_toast_notification(f"Search failed: {str(e)}"))
 
     def update_stats(self, displayed_count, total_count):
         """Update stats display"""
@@ -731,17 +1407,21 @@ class PasswordManagerGUI:
         else:
             self.stats_label.configure(text=f"Total: {total_count} passwords")
 
+    def show_changed_entries(self):
+        """Redraw after an add, edit or delete, keeping the search and scroll position"""
+        self.search_entries(self.display_password_cards, keep_position=True)
+
+    @traced('gui.refresh_passwords')
     def refresh_passwords(self):
         """Refresh password display"""
         if hasattr(self, 'search_var'):
             self.search_var.set('')
+        self.cancel_pending_filter()
+        self.search_generation += 1  # Drop any search still running
 
-        try:
-            passwords = get_passwords(self.key, self.master_password)
-            self.display_password_cards(passwords)
-            self.update_stats(len(passwords), len(passwords))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load passwords: {str(e)}")
+        passwords = self.vault.entries()
+        self.display_password_cards(passwords)
+        self.update_stats(len(passwords), self.vault.total)
 
     def copy_to_clipboard(self, text, label):
         """Enhanced clipboard copy with better notification"""
@@ -752,6 +1432,15 @@ class PasswordManagerGUI:
         else:
             messagebox.showinfo(f"📋 {label}", f"{label}: {text}")
 
+    def copy_secret_to_clipboard(self, password_data):
+        """Decrypt a single password on demand and copy it"""
+        try:
+            password = self.vault.reveal(password_data['id'])
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to decrypt password: {str(e)}")
+            return
+        self.copy_to_clipboard(password, "Password")
+
     def show_toast_notification(self, message):
         """Show a modern toast notification"""
         toast = ctk.CTkToplevel(self.root)
@@ -785,8 +1474,29 @@ class PasswordManagerGUI:
 
     def logout(self):
         """Logout and return to login screen"""
+        if self.audit_worker is not None:
+            # Drop queued audits; the running one stops after its current batch
+            self.audit_cancel.set()
+            self.audit_worker.shutdown(wait=True, cancel_futures=True)
+            self.audit_worker = None
+            self.audit_running = self.audit_rerun = False
+        if self.db_worker is not None:
+            # Let already-queued writes land before the connection goes away
+            self.db_worker.shutdown(wait=True)
+            self.db_worker = None
+        self.task_callbacks = {}
+        if self.master_password is not None:
+            from database import close_vault
+
+            close_vault(self.master_password)
         self.master_password = None
-        self.key = None
+        self.cipher = None
+        self.vault = None
+        self.audit = None
+        self.page_pending = False
+        self.current_passwords = []
+        self.unlock_job = None
+        self.cancel_pending_filter()
         self.show_login_screen()
 
     def run(self):
@@ -795,9 +1505,11 @@ class PasswordManagerGUI:
 
 
 class PasswordDetailsDialog:
-    def __init__(self, parent, password_data, copy_callback):
+    def __init__(self, parent, password_data, copy_callback, reveal_callback):
         self.password_data = password_data
         self.copy_callback = copy_callback
+        self.reveal_callback = reveal_callback
+        self.password = None  # decrypted on first show/copy
         self.password_shown = False
 
         # Create dialog
@@ -924,13 +1636,122 @@ class PasswordDetailsDialog:
             self.password_var.set("•" * 12)
             self.password_shown = False
         else:
-            self.password_var.set(self.password_data['password'])
+            password = self.get_password()
+            if password is None:
+                return
+            self.password_var.set(password)
             self.password_shown = True
 
+    def get_password(self):
+        """Decrypt the password the first time it is needed"""
+        if self.password is None:
+            try:
+                self.password = self.reveal_callback(self.password_data['id'])
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to decrypt password: {str(e)}")
+        return self.password
+
     def copy_password(self):
         """Copy password and close dialog"""
-        self.copy_callback(self.password_data['password'], "Password")
+        password = self.get_password()
+        if password is None:
+            return
+        self.copy_callback(password, "Password")
+        self.dialog.destroy()
+
+
+class PassphraseDialog:
+    def __init__(self, parent, title, callback):
+        self.callback = callback
+
+        # Create dialog
+        self.dialog = ctk.CTkToplevel(parent)
+        self.dialog.title(title)
+        self.dialog.geometry("460x300")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+
+        # Center dialog
+        self.dialog.geometry(f"+{parent.winfo_rootx() + 200}+{parent.winfo_rooty() + 150}")
+
+        self.create_dialog(title)
+
+    def create_dialog(self, title):
+        # Main container
+        main_frame = ctk.CTkFrame(self.dialog, fg_color=COLORS['bg_secondary'], corner_radius=20)
+        main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+
+        # Content frame
+        content_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        content_frame.pack(fill="both", expand=True, padx=25, pady=25)
+
+        # Title
+        title_label = ctk.CTkLabel(
+            content_frame,
+            text=title,
+            font=FONTS['heading'],
+            text_color=COLORS['text_primary']
+        )
+        title_label.pack(pady=(0, 20))
+
+        # Passphrase field
+        self.passphrase_entry = ctk.CTkEntry(
+            content_frame,
+            placeholder_text="Archive passphrase",
+            font=FONTS['body_medium'],
+            height=45,
+            corner_radius=8,
+            border_width=1,
+            border_color=COLORS['border'],
+            fg_color=COLORS['bg_tertiary'],
+            text_color=COLORS['text_primary'],
+            placeholder_text_color=COLORS['text_muted'],
+            show="•"
+        )
+        self.passphrase_entry.pack(fill="x")
+        self.passphrase_entry.bind('<Return>', lambda e: self.submit())
+
+        # Buttons
+        button_frame = ctk.CTkFrame(content_frame, fg_color="transparent")
+        button_frame.pack(fill="x", pady=(25, 0))
+
+        ok_btn = ctk.CTkButton(
+            button_frame,
+            text="Continue",
+            font=FONTS['button'],
+            height=45,
+            corner_radius=10,
+            fg_color=COLORS['accent'],
+            hover_color=COLORS['accent_hover'],
+            command=self.submit
+        )
+        ok_btn.pack(side="left", fill="x", expand=True, padx=(0, 10))
+
+        cancel_btn = ctk.CTkButton(
+            button_frame,
+            text="Cancel",
+            font=FONTS['button'],
+            height=45,
+            corner_radius=10,
+            fg_color=COLORS['bg_tertiary'],
+            hover_color=COLORS['border'],
+            command=self.dialog.destroy
+        )
+        cancel_btn.pack(side="right")
+
+        self.passphrase_entry.focus()
+
+    def submit(self):
+        """Hand the passphrase to the callback"""
+        passphrase = self.passphrase_entry.get()
+
+        if not passphrase:
+            messagebox.showerror("Validation Error", "Please enter a passphrase.")
+            return
+
         self.dialog.destroy()
+        self.callback(passphrase)
 
 
 class AddPasswordDialog:
@@ -940,7 +1761,7 @@ class AddPasswordDialog:
         # Create dialog
         self.dialog = ctk.CTkToplevel(parent)
         self.dialog.title("Add New Password")
-        self.dialog.geometry("500x550")  # Slightly larger for bigger text
+        self.dialog.geometry("500x600")  # Slightly larger for bigger text
         self.dialog.resizable(False, False)
         self.dialog.transient(parent)
         self.dialog.grab_set()
@@ -976,6 +1797,7 @@ class AddPasswordDialog:
 
         # Password field
         self.password_entry = self.create_input_field(content_frame, "Password", show="•")
+        create_generator_row(content_frame, self.website_entry, self.password_entry)
 
         # Buttons
         button_frame = ctk.CTkFrame(content_frame, fg_color="transparent")
@@ -1046,6 +1868,9 @@ class AddPasswordDialog:
             messagebox.showerror("Validation Error", "Please fill in all fields.")
             return
 
+        if not confirm_unbreached(self.dialog, password):
+            return
+
         self.callback(website, username, password)
         self.dialog.destroy()
 
@@ -1058,7 +1883,7 @@ class EditPasswordDialog:
         # Create dialog
         self.dialog = ctk.CTkToplevel(parent)
         self.dialog.title("Edit Password")
-        self.dialog.geometry("500x500")  # Slightly larger for bigger text
+        self.dialog.geometry("500x550")  # Slightly larger for bigger text
         self.dialog.resizable(False, False)
         self.dialog.transient(parent)
         self.dialog.grab_set()
@@ -1094,6 +1919,7 @@ class EditPasswordDialog:
 
         # Password field
         self.password_entry = self.create_input_field(content_frame, "Password", self.existing_data['password'], show="•")
+        create_generator_row(content_frame, self.website_entry, self.password_entry)
 
         # Buttons
         button_frame = ctk.CTkFrame(content_frame, fg_color="transparent")
@@ -1165,6 +1991,9 @@ class EditPasswordDialog:
             messagebox.showerror("Validation Error", "Please fill in all fields.")
             return
 
+        if password != self.existing_data['password'] and not confirm_unbreached(self.dialog, password):
+            return
+
         self.callback(self.existing_data, website, username, password)
         self.dialog.destroy()
 
@@ -1,26 +1,378 @@
-from derive_key import get_key_from_password, load_or_create_salt
-from database import create_database, save_password, get_passwords
+import argparse
+import getpass
+import json
+import os
+import sys
+
+from derive_key import derive_key, tune_kdf, Cipher, KDFS
+from database import (load_kdf_params, rekey_vault, save_password, get_passwords, import_entries, close_vault,
+                      encrypt_vault_metadata, rotate_master_password, vault_file_name, PAGE_ORDERS)
+from audit import audit_vault
+from breach import open_corpus, CORPUS_ENV, DEFAULT_CORPUS
+from generator import CharsetPolicy, DicewarePolicy, policy_for_site, DEFAULT_LENGTH
+from transfer import read_entries, detect_format, export_archive, IMPORT_FORMATS
+from agent import connect_agent, AgentState, AgentError
+import tracing
+
+# File descriptor to read the master password from, e.g. PASSWORD_MANAGER_MASTER_FD=3 ... 3<secret
+MASTER_FD_ENV = 'PASSWORD_MANAGER_MASTER_FD'
+
+METADATA_FIELDS = ('id', 'website', 'username')
+SECRET_FIELDS = METADATA_FIELDS + ('password',)
+AUDIT_FIELDS = METADATA_FIELDS + ('score', 'reused', 'issues')
+
+def print_progress(done, elapsed):
+  # stderr, so progress never mixes with a command's JSON/TSV output
+  print(f"\r{done} passwords ({done / elapsed if elapsed else 0:,.0f} rows/sec)", end='', flush=True,
+        file=sys.stderr)
+
+def read_line(fd):
+  """Read one line from an already-open file descriptor, leaving it open"""
+  with os.fdopen(fd, closefd=False) as f:
+    return f.readline().rstrip('\n')
+
+def master_fd(args):
+  if args.master_password_fd is not None:
+    return args.master_password_fd
+  if os.environ.get(MASTER_FD_ENV):
+    return int(os.environ[MASTER_FD_ENV])
+  return None
+
+def read_master_password(args):
+  """From --master-password-fd / $PASSWORD_MANAGER_MASTER_FD, --master-password-stdin, or a prompt"""
+  fd = master_fd(args)
+  if fd is not None:
+    return read_line(fd)
+  if args.master_password_stdin:
+    return sys.stdin.readline().rstrip('\n')
+  try:
+    return getpass.getpass("Master password: ")
+  except EOFError:
+    raise ValueError("No master password given: start the agent, or pass --master-password-fd "
+                     "or --master-password-stdin") from None
+
+def read_new_master_password(args):
+  """From --new-master-password-fd, or a prompt asked twice"""
+  if args.new_master_password_fd is not None:
+    new_pw = read_line(args.new_master_password_fd)
+  else:
+    try:
+      new_pw = getpass.getpass("New master password: ")
+      if getpass.getpass("Repeat new master password: ") != new_pw:
+        raise ValueError("The new master passwords do not match")
+    except EOFError:
+      raise ValueError("No new master password given: pass --new-master-password-fd") from None
+  if not new_pw:
+    raise ValueError("The new master password is empty")
+  return new_pw
+
+def read_secret(args, prompt):
+  """An entry password or archive passphrase: the next stdin line when piped, else a prompt"""
+  if not sys.stdin.isatty():
+    return sys.stdin.readline().rstrip('\n')
+  return getpass.getpass(prompt)
+
+def open_session(args, need_key=False):
+  """Return something to send ops to: the agent if it holds a key, else an in-process session.
+
+  The agent is skipped when a master password source is given explicitly,
+  or when the command needs the key itself (need_key). A key derived here
+  is handed to an idle agent for the next command, with the absolute path
+  of the vault, never the master password.
+  """
+  explicit = master_fd(args) is not None or args.master_password_stdin
+  agent = None if args.no_agent else connect_agent()
+  if agent is not None and not explicit and not need_key and agent.status()['unlocked']:
+    return agent
+
+  master_pw = read_master_password(args)
+  cipher = Cipher(derive_key(master_pw, load_kdf_params(master_pw)))
+  vault_path = os.path.abspath(vault_file_name(master_pw))
+  if agent is not None and not agent.status()['unlocked']:
+    agent.add(vault_path, cipher.key)
+  session = AgentState()
+  session.add(vault_path, cipher.key)
+  return session
+
+def tsv_value(value):
+  return '' if value is None else str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+def emit(records, fields, args):
+  """Print records as a JSON array or as TSV rows of fields"""
+  if args.format == 'json':
+    json.dump([{field: record[field] for field in fields} for record in records], sys.stdout, indent=2)
+    print()
+  else:
+    for record in records:
+      print('\t'.join(tsv_value(record[field]) for field in fields))
+
+def emit_stats(stats, args):
+  if args.format == 'json':
+    print(json.dumps(stats))
+  else:
+    print('\t'.join(f"{name}={value}" for name, value in stats.items()))
+
+def cmd_get(args, session):
+  if args.entry.isdigit():
+    entry_id = int(args.entry)
+  else:
+    # Not an id: the entry whose website is exactly this, ignoring case. Only
+    # metadata is searched; the one secret shown is decrypted (and stamped
+    # as used) by the get below.
+    matches = [entry for entry in session.request('search', query=args.entry)['entries']
+               if entry['website'].lower() == args.entry.lower()]
+    if not matches:
+      raise KeyError(f"No entry for {args.entry}")
+    if len(matches) > 1:
+      ids = ', '.join(str(entry['id']) for entry in matches)
+      raise KeyError(f"{len(matches)} entries for {args.entry} (ids {ids}); get one by id")
+    entry_id = matches[0]['id']
+  entry = session.request('get', id=entry_id)['entry']
+
+  if args.field:
+    print(entry[args.field])
+  else:
+    emit([entry], SECRET_FIELDS, args)
+
+def cmd_add(args, session):
+  password = read_secret(args, f"Password for {args.website}: ")
+  entry_id = session.request('save', website=args.website, username=args.username, password=password)['id']
+  emit([{'id': entry_id, 'website': args.website, 'username': args.username}], METADATA_FIELDS, args)
+
+def cmd_list(args, session):
+  emit(session.request('list', order_by=args.order, limit=args.limit)['entries'], METADATA_FIELDS, args)
+
+def cmd_search(args, session):
+  entries = session.request('search', query=args.query, secrets=args.show_passwords)['entries']
+  emit(entries, SECRET_FIELDS if args.show_passwords else METADATA_FIELDS, args)
+
+def cmd_import(args, session):
+  fmt = args.type or detect_format(args.path)
+  passphrase = read_secret(args, "Archive passphrase: ") if fmt == 'archive' else None
+  stats = import_entries(read_entries(args.path, fmt, passphrase), session.cipher, session.vault_file,
+                         progress=print_progress)
+  print(file=sys.stderr)
+  emit_stats(stats, args)
+
+def cmd_export(args, session):
+  passphrase = read_secret(args, "Archive passphrase: ")
+  stats = export_archive(args.path, session.cipher, session.vault_file, passphrase, progress=print_progress)
+  print(file=sys.stderr)
+  emit_stats(stats, args)
+
+def cmd_encrypt_metadata(args, session):
+  stats = encrypt_vault_metadata(session.vault_file, session.cipher, progress=print_progress)
+  print(file=sys.stderr)
+  emit_stats(stats, args)
+
+def cmd_passwd(args, session):
+  new_pw = read_new_master_password(args)
+  _, stats = rotate_master_password(session.vault_file, session.cipher, new_pw, progress=print_progress)
+  print(file=sys.stderr)
+  agent = None if args.no_agent else connect_agent()
+  if agent is not None:
+    agent.lock()  # It may hold the old key, for a vault file that no longer exists
+  emit_stats(stats, args)
+
+def cmd_audit(args, session):
+  result = audit_vault(session.vault_file, session.cipher, find_duplicates=True, progress=print_progress)
+  if result.audited:
+    print(file=sys.stderr)
+  if args.summary:
+    emit_stats(result.summary(), args)
+  else:
+    emit(list(result.flagged()), AUDIT_FIELDS, args)
+
+def cmd_breached(args, session):
+  with open_corpus(args.corpus, required=True) as corpus:
+    entries = corpus.breached_entries(get_passwords(session.cipher, session.vault_file))
+  emit(entries, METADATA_FIELDS, args)
+
+def cmd_generate(args, session):
+  if args.words:
+    policy = DicewarePolicy(args.words)
+  elif args.site:
+    policy = policy_for_site(args.site)
+  else:
+    policy = CharsetPolicy(args.length, symbols=not args.no_symbols, exclude_ambiguous=args.no_ambiguous)
+  print(policy.describe(), file=sys.stderr)
+  passwords = policy.generate(args.count)
+  if args.format == 'json':
+    emit([{'password': password} for password in passwords], ('password',), args)
+  else:
+    sys.stdout.write('\n'.join(passwords) + '\n')
+
+def build_parser():
+  parser = argparse.ArgumentParser(
+    description="Password manager. Run without arguments for the interactive menu.",
+    epilog=f"The master password comes from a running agent, --master-password-fd (or ${MASTER_FD_ENV}), "
+           "--master-password-stdin, or a prompt, in that order.")
+  parser.add_argument("--format", choices=("tsv", "json"), default="tsv", help="output format (default: tsv)")
+  parser.add_argument("--master-password-fd", type=int, metavar="FD", help="read the master password from FD")
+  parser.add_argument("--master-password-stdin", action="store_true",
+                      help="read the master password from the first line of stdin")
+  parser.add_argument("--no-agent", action="store_true", help="neither use nor feed a running agent")
+  parser.add_argument("--trace", metavar="FILE",
+                      help=f"write a Chrome trace of the run to FILE and a timing summary to stderr "
+                           f"(or set ${tracing.TRACE_ENV})")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  get = commands.add_parser("get", help="print one entry, with its password")
+  get.add_argument("entry", help="entry id, or its exact website")
+  get.add_argument("--field", choices=SECRET_FIELDS, help="print only this field, unformatted")
+  get.set_defaults(func=cmd_get)
+
+  add = commands.add_parser("add", help="add an entry; its password is read from stdin or a prompt")
+  add.add_argument("website")
+  add.add_argument("username")
+  add.set_defaults(func=cmd_add)
+
+  list_cmd = commands.add_parser("list", help="list entries without their passwords")
+  list_cmd.add_argument("--order", choices=PAGE_ORDERS, default="id")
+  list_cmd.add_argument("--limit", type=int)
+  list_cmd.set_defaults(func=cmd_list)
+
+  search = commands.add_parser("search", help="entries whose website or username contains a term")
+  search.add_argument("query")
+  search.add_argument("--show-passwords", action="store_true")
+  search.set_defaults(func=cmd_search)
+
+  import_cmd = commands.add_parser("import", help="bulk-import a CSV, JSON, Bitwarden or .pmx file")
+  import_cmd.add_argument("path")
+  import_cmd.add_argument("--type", choices=IMPORT_FORMATS, help="file format (default: from the extension)")
+  import_cmd.set_defaults(func=cmd_import, need_key=True)
+
+  export = commands.add_parser("export", help="export to an encrypted .pmx archive")
+  export.add_argument("path")
+  export.set_defaults(func=cmd_export, need_key=True)
+
+  encrypt_metadata = commands.add_parser(
+    "encrypt-metadata", help="encrypt websites and usernames too (one-way); search then matches word prefixes")
+  encrypt_metadata.set_defaults(func=cmd_encrypt_metadata, need_key=True)
+
+  passwd = commands.add_parser("passwd", help="change the master password, re-encrypting the vault; "
+                                              "rerun to resume an interrupted change")
+  passwd.add_argument("--new-master-password-fd", type=int, metavar="FD",
+                      help="read the new master password from FD instead of prompting")
+  passwd.set_defaults(func=cmd_passwd, need_key=True)
+
+  audit = commands.add_parser("audit", help="list entries with a reused, weak or duplicated password (0-4 score)")
+  audit.add_argument("--summary", action="store_true", help="print only the counts")
+  audit.set_defaults(func=cmd_audit, need_key=True)
+
+  breached = commands.add_parser("breached", help="list entries whose password is in the offline breach corpus "
+                                                  "(build it with: python breach.py build)")
+  breached.add_argument("--corpus", help=f"corpus file (default: ${CORPUS_ENV} or {DEFAULT_CORPUS})")
+  breached.set_defaults(func=cmd_breached, need_key=True)
+
+  generate = commands.add_parser("generate", help="generate passwords; needs no vault. Prints the policy's "
+                                                  "exact entropy on stderr")
+  generate.add_argument("--count", type=int, default=1)
+  generate.add_argument("--length", type=int, default=DEFAULT_LENGTH)
+  generate.add_argument("--no-symbols", action="store_true")
+  generate.add_argument("--no-ambiguous", action="store_true", help="leave out look-alikes such as l, 1 and O")
+  generate.add_argument("--words", type=int, help="a diceware passphrase of this many words instead")
+  generate.add_argument("--site", help="use the generator rule for this website, if there is one")
+  generate.set_defaults(func=cmd_generate, need_vault=False)
+
+  commands.add_parser("bench", help="run a benchmark suite (see: bench --help)", add_help=False)
+  return parser
+
+def cli(argv=None):
+  """Run one subcommand; returns the process exit status"""
+  parser = build_parser()
+  args, extra = parser.parse_known_args(argv)
+  if args.trace:
+    tracing.enable(args.trace)
+  if args.command == 'bench':
+    # Everything after 'bench' belongs to the benchmark's own parser
+    import benchmark
+    benchmark.main(extra)
+    return 0
+  if extra:
+    parser.error(f"unrecognized arguments: {' '.join(extra)}")
+  session = None
+  try:
+    if getattr(args, 'need_vault', True):
+      session = open_session(args, getattr(args, 'need_key', False))
+    args.func(args, session)
+  except (AgentError, KeyError, ValueError, OSError) as e:
+    print(f"error: {e.args[0] if isinstance(e, KeyError) else e}", file=sys.stderr)
+    return 1
+  finally:
+    if isinstance(session, AgentState):
+      session.lock()
+  return 0
 
 def main():
-  salt = load_or_create_salt()
   master_pw = input("Enter your master password: ")
-  key = get_key_from_password(master_pw, salt)
 
-  # Create database for this user
-  create_database(master_pw)
+  # Opens (or creates) this user's database, which holds its KDF parameters
+  kdf_params = load_kdf_params(master_pw)
+  cipher = Cipher(derive_key(master_pw, kdf_params))
+
+  # Let a running agent serve later commands without deriving the key again
+  agent = connect_agent()
+  if agent is not None and not agent.status()['unlocked']:
+    agent.add(vault_file_name(master_pw), cipher.key)
 
   while True:
-    choice = input("1. Save Password\n2. View Passwords\n3. Exit\nChoose: ")
+    choice = input("1. Save Password\n2. View Passwords\n3. Import Passwords\n4. Export Passwords\n"
+                   "5. Change Key Derivation\n6. Change Master Password\n7. Exit\nChoose: ")
     if choice == '1':
       site = input("Website: ")
       user = input("Username: ")
       pw = input("Password: ")
-      save_password(site, user, pw, key, master_pw)
+      save_password(site, user, pw, cipher, master_pw)
       print("Password saved successfully!")
     elif choice == '2':
-      get_passwords(key, master_pw)
+      for entry in get_passwords(cipher, master_pw):
+        print(f"{entry['id']}. {entry['website']} | {entry['username']} | {entry['password']}")
+    elif choice == '3':
+      path = input("File to import (CSV, JSON, Bitwarden export or .pmx archive): ")
+      passphrase = input("Archive passphrase: ") if detect_format(path) == 'archive' else None
+      stats = import_entries(read_entries(path, passphrase=passphrase), cipher, master_pw,
+                             progress=print_progress)
+      print(f"\nImported {stats['imported']} passwords in {stats['seconds']:.2f}s "
+            f"({stats['rows_per_sec']:,.0f} rows/sec)")
+    elif choice == '4':
+      path = input("Export to (.pmx): ")
+      passphrase = input("Archive passphrase: ")
+      stats = export_archive(path, cipher, master_pw, passphrase, progress=print_progress)
+      print(f"\nExported {stats['exported']} passwords in {stats['seconds']:.2f}s "
+            f"({stats['rows_per_sec']:,.0f} rows/sec)")
+    elif choice == '5':
+      print(f"Current: {kdf_params['kdf']}")
+      kdf = input(f"New KDF ({', '.join(KDFS)}): ").strip()
+      try:
+        kdf_params = tune_kdf(kdf)
+      except ValueError as e:
+        print(f"error: {e}")
+        continue
+      key, stats = rekey_vault(master_pw, cipher, kdf_params, progress=print_progress)
+      cipher = Cipher(key)
+      if agent is not None:
+        agent.add(vault_file_name(master_pw), cipher.key)
+      print(f"\nRe-encrypted {stats['rekeyed']} passwords in {stats['seconds']:.2f}s "
+            f"({stats['rows_per_sec']:,.0f} rows/sec)")
+    elif choice == '6':
+      new_pw = input("New master password: ")
+      if not new_pw or input("Repeat new master password: ") != new_pw:
+        print("The new master passwords do not match")
+        continue
+      key, stats = rotate_master_password(master_pw, cipher, new_pw, progress=print_progress)
+      master_pw, cipher = new_pw, Cipher(key)
+      kdf_params = load_kdf_params(master_pw)
+      if agent is not None:
+        agent.add(vault_file_name(master_pw), cipher.key)
+      print(f"\nRe-encrypted {stats['rotated']} passwords into the new vault in {stats['seconds']:.2f}s "
+            f"({stats['rows_per_sec']:,.0f} rows/sec)")
     else:
       break
 
+  close_vault(master_pw)
+
 if __name__ == "__main__":
+  if len(sys.argv) > 1:
+    sys.exit(cli())
   main()
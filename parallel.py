@@ -0,0 +1,98 @@
+"""Parallel bulk encryption/decryption for full-vault operations.
+
+Rows are split into ordered chunks, each chunk goes through the batched
+Cipher path on a worker, and the results are stitched back together in the
+original order. Small inputs, and hosts with a single core, stay serial.
+
+Threads only help as far as OpenSSL releases the GIL; the per-token base64
+and HMAC bookkeeping in Cipher.decrypt_many holds it. Worker processes
+scale with cores but pay a start-up cost (spawned, so they are safe to use
+from the threaded GUI), so they are the default only above
+PROCESS_THRESHOLD rows.
+
+The pool machinery (concurrent.futures, multiprocessing) is only imported
+once a batch is big enough to need it, keeping it off the start-up path.
+"""
+
+import os
+
+from derive_key import Cipher, as_cipher
+from tracing import span
+
+CHUNK_SIZE = 5_000
+SERIAL_THRESHOLD = 10_000
+PROCESS_THRESHOLD = 50_000
+MAX_WORKERS = 8
+
+# Per-process Cipher, installed by init_worker in each pool process
+worker_cipher = None
+
+
+def default_workers():
+    return min(os.cpu_count() or 1, MAX_WORKERS)
+
+
+def init_worker(key):
+    global worker_cipher
+    worker_cipher = Cipher(key)
+
+
+def decrypt_chunk(tokens):
+    return worker_cipher.decrypt_many(tokens)
+
+
+def encrypt_chunk(passwords):
+    return worker_cipher.encrypt_many(passwords)
+
+
+def chunked(items, chunk_size):
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def run_chunked(cipher, items, method, workers=None, mode=None, chunk_size=CHUNK_SIZE):
+    """Run cipher.<method> ('decrypt_many' or 'encrypt_many') over items in parallel chunks"""
+    items = list(items)
+    cipher = as_cipher(cipher)
+    workers = default_workers() if workers is None else workers
+
+    if workers <= 1 or len(items) < SERIAL_THRESHOLD:
+        return getattr(cipher, method)(items)
+
+    if mode is None:
+        mode = 'process' if len(items) >= PROCESS_THRESHOLD else 'thread'
+
+    # Spans inside worker processes are not collected; this one covers the whole batch
+    with span(f"parallel.{method}", rows=len(items), workers=workers, mode=mode):
+        return run_pool(cipher, chunked(items, chunk_size), method, workers, mode)
+
+
+def run_pool(cipher, chunks, method, workers, mode):
+    """Map cipher.<method> over chunks on a thread or process pool, in order"""
+    if mode == 'thread':
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(getattr(cipher, method), chunks)
+            return [value for chunk in results for value in chunk]
+
+    if mode == 'process':
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        task = decrypt_chunk if method == 'decrypt_many' else encrypt_chunk
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker, initargs=(cipher.key,)) as pool:
+            results = pool.map(task, chunks)
+            return [value for chunk in results for value in chunk]
+
+    raise ValueError(f"Unknown parallel mode: {mode}")
+
+
+def decrypt_many(cipher, tokens, workers=None, mode=None):
+    """Decrypt tokens in order, spreading large batches across workers"""
+    return run_chunked(cipher, tokens, 'decrypt_many', workers, mode)
+
+
+def encrypt_many(cipher, passwords, workers=None, mode=None):
+    """Encrypt passwords in order, spreading large batches across workers"""
+    return run_chunked(cipher, passwords, 'encrypt_many', workers, mode)
@@ -0,0 +1,166 @@
+import hashlib
+import hmac
+import re
+from collections import defaultdict
+
+# Queries shorter than this are answered by a scan instead of the index
+GRAM_SIZE = 3
+
+# If even the rarest trigram of a query matches more than this share of
+# the entries, a straight scan is cheaper than intersecting and sorting
+SCAN_RATIO = 0.125
+
+# Joins website and username into one haystack; never typed into a query
+FIELD_SEPARATOR = '\0'
+
+
+# Blind index (vaults with encrypted metadata): tokens are truncated
+# HMAC-SHA256s of normalized values and word prefixes, so equal inputs give
+# equal tokens without revealing the text. Prefixes longer than
+# BLIND_PREFIX_MAX are indexed by their first BLIND_PREFIX_MAX characters.
+BLIND_FIELDS = ('website', 'username')
+BLIND_TOKEN_SIZE = 16
+BLIND_PREFIX_MAX = 16
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def trigrams(text):
+    """Every distinct GRAM_SIZE-character substring of text"""
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def normalize(text):
+    return text.strip().casefold()
+
+
+def blind_hmac(index_key, field, kind):
+    """HMAC already fed the token's (field, kind) header; copy it per token"""
+    return hmac.new(index_key, f"{field}{FIELD_SEPARATOR}{kind}{FIELD_SEPARATOR}".encode(), hashlib.sha256)
+
+
+def blind_token(index_key, field, kind, text):
+    """Token for one (field, 'exact' or 'prefix', normalized text)"""
+    mac = blind_hmac(index_key, field, kind)
+    mac.update(text.encode())
+    return mac.digest()[:BLIND_TOKEN_SIZE]
+
+
+def blind_index_tokens(index_key, website, username):
+    """Every token stored for an entry: each field's exact value plus every prefix of its words"""
+    tokens = set()
+    for field, value in zip(BLIND_FIELDS, (website, username)):
+        value = normalize(value)
+        tokens.add(blind_token(index_key, field, 'exact', value))
+
+        # Dozens of prefixes per entry: skip re-keying the HMAC for each one
+        header = blind_hmac(index_key, field, 'prefix')
+        for word in set(WORD_PATTERN.findall(value)):
+            for end in range(1, min(len(word), BLIND_PREFIX_MAX) + 1):
+                mac = header.copy()
+                mac.update(word[:end].encode())
+                tokens.add(mac.digest()[:BLIND_TOKEN_SIZE])
+    return tokens
+
+
+def blind_query_tokens(index_key, field, query, exact=False):
+    """Tokens a field must all carry to match query; empty if query has no words"""
+    query = normalize(query)
+    if exact:
+        return [blind_token(index_key, field, 'exact', query)] if query else []
+    words = dict.fromkeys(word[:BLIND_PREFIX_MAX] for word in WORD_PATTERN.findall(query))
+    return [blind_token(index_key, field, 'prefix', word) for word in words]
+
+
+def blind_match(query, value, exact=False):
+    """Confirm a blind-index hit on the decrypted value.
+
+    Exact: equal after normalizing. Otherwise every word of query must start
+    some word of value.
+    """
+    query, value = normalize(query), normalize(value)
+    if exact:
+        return query == value
+    words = WORD_PATTERN.findall(value)
+    return all(any(word.startswith(prefix) for word in words) for prefix in WORD_PATTERN.findall(query))
+
+
+class SearchIndex:
+    """Incremental trigram index over the website and username of each entry.
+
+    Matches are case-insensitive substring matches on either field, returned
+    as entry ids in ascending order. Consecutive queries that extend the
+    previous one (typing another character) are answered by narrowing the
+    previous result instead of going back to the index.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(set)  # trigram -> ids containing it
+        self._haystacks = {}               # id -> "website\0username", lowercased
+        self._last_query = None
+        self._last_result = None
+
+    def __len__(self):
+        return len(self._haystacks)
+
+    def add(self, entry_id, website, username):
+        """Index an entry, replacing any previous version of it"""
+        if entry_id in self._haystacks:
+            self.remove(entry_id)
+
+        haystack = website.lower() + FIELD_SEPARATOR + username.lower()
+        self._haystacks[entry_id] = haystack
+        for gram in trigrams(haystack):
+            self._postings[gram].add(entry_id)
+        self._last_result = None
+
+    def remove(self, entry_id):
+        """Drop an entry from the index"""
+        haystack = self._haystacks.pop(entry_id, None)
+        if haystack is None:
+            return
+
+        for gram in trigrams(haystack):
+            ids = self._postings[gram]
+            ids.discard(entry_id)
+            if not ids:
+                del self._postings[gram]
+        self._last_result = None
+
+    def clear(self):
+        self._postings.clear()
+        self._haystacks.clear()
+        self._last_result = None
+
+    def search(self, query):
+        """Return the ids of entries whose website or username contains query"""
+        query = query.lower().replace(FIELD_SEPARATOR, '')
+        if not query:
+            return sorted(self._haystacks)
+
+        haystacks = self._haystacks
+
+        # If the query extends the previous one, only the previous matches can still match
+        previous = None
+        if self._last_result is not None and self._last_query in query:
+            previous = self._last_result
+
+        postings = None
+        if len(query) >= GRAM_SIZE:
+            postings = sorted((self._postings.get(gram, ()) for gram in trigrams(query)), key=len)
+            if len(postings[0]) > len(haystacks) * SCAN_RATIO:
+                postings = None
+            elif previous is not None and len(previous) <= len(postings[0]):
+                postings = None
+
+        if postings is not None:
+            # Every trigram matching is necessary but not sufficient, so confirm the substring
+            candidates = set(postings[0]).intersection(*postings[1:])
+            result = sorted(entry_id for entry_id in candidates if query in haystacks[entry_id])
+        elif previous is not None:
+            result = [entry_id for entry_id in previous if query in haystacks[entry_id]]
+        else:
+            result = sorted(entry_id for entry_id, haystack in haystacks.items() if query in haystack)
+
+        self._last_query = query
+        self._last_result = result
+        return result
@@ -0,0 +1,44 @@
+"""The agent finds the vault by absolute path, wherever it runs, and never holds the master password"""
+
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+import database
+from agent import AgentError, AgentState
+
+
+@pytest.fixture
+def vault_path(tmp_path, monkeypatch):
+    """An empty vault's absolute path, and its key; the working directory is elsewhere"""
+    (tmp_path / 'cli').mkdir()
+    (tmp_path / 'agent').mkdir()
+    monkeypatch.chdir(tmp_path / 'cli')
+    database.create_database('master')
+    path = os.path.abspath(database.get_user_db_name('master'))
+    database.close_vault('master')
+    monkeypatch.chdir(tmp_path / 'agent')
+    return path, Fernet.generate_key()
+
+
+def test_saves_land_in_the_vault_it_was_given(vault_path):
+    path, key = vault_path
+    state = AgentState()
+    state.request('add', vault=path, key=key.decode())
+    try:
+        entry_id = state.request('save', website='b.com', username='u', password='pw')['id']
+        assert state.request('get', id=entry_id)['entry']['password'] == 'pw'
+        assert not hasattr(state, 'master_password')
+    finally:
+        state.lock()
+
+    assert os.listdir('.') == []
+    assert database.get_password_by_id(entry_id, key, database.VaultFile(path))['website'] == 'b.com'
+    database.close_vault(database.VaultFile(path))
+
+
+@pytest.mark.parametrize('path', ['vault.db', '/nonexistent/vault.db'])
+def test_refuses_a_relative_or_missing_vault(vault_path, path):
+    with pytest.raises(AgentError):
+        AgentState().add(path, vault_path[1])
@@ -0,0 +1,131 @@
+"""VaultCache paging, searching and staged changes"""
+
+import pytest
+from cryptography.fernet import Fernet
+
+import database
+from cache import VaultCache
+from derive_key import Cipher
+
+MASTER_PASSWORD = 'master'
+
+
+@pytest.fixture
+def vault(tmp_path, monkeypatch):
+    """A cache over a 5-entry vault, read 2 entries per page, with its first page loaded"""
+    monkeypatch.chdir(tmp_path)
+    cipher = Cipher(Fernet.generate_key())
+    database.import_entries(({'website': f"site{i}", 'username': f"user{i}", 'password': f"p{i}"}
+                             for i in range(5)), cipher, MASTER_PASSWORD)
+    cache = VaultCache(cipher, MASTER_PASSWORD, page_size=2)
+    cache.load()
+    yield cache
+    database.close_vault(MASTER_PASSWORD)
+
+
+def test_filter_searches_only_the_loaded_pages(vault):
+    assert [e.id for e in vault.filter("site")] == [1, 2]
+    assert not vault.complete
+
+    vault.load_all()
+    assert [e.id for e in vault.filter("site")] == [1, 2, 3, 4, 5]
+
+
+def test_pages_fetched_in_the_background_are_added_in_order(vault):
+    rows = vault.fetch_page(vault.cursor, 10)
+    assert [e.id for e in vault.add_page(2, rows, 10)] == [3, 4, 5]
+    assert vault.complete and len(vault) == 5
+
+
+def test_a_page_fetched_before_a_reload_is_dropped(vault):
+    rows = vault.fetch_page(vault.cursor)
+    vault.load()
+    vault.load_more()  # The cursor has moved past the page read above
+
+    assert vault.add_page(2, rows) == []
+    assert [e.id for e in vault.entries()] == [1, 2, 3, 4]
+
+
+def test_restoring_a_failed_delete_puts_the_entry_and_total_back(vault):
+    staged = vault.stage_delete(1)
+    assert vault.total == 4 and [e.id for e in vault.entries()] == [2]
+
+    vault.restore(staged)
+    assert vault.total == 5 and [e.id for e in vault.entries()] == [1, 2]
+
+
+def test_restoring_a_failed_delete_of_an_uncached_entry_puts_the_total_back(vault):
+    vault.restore(vault.stage_delete(5))
+    assert vault.total == 5 and [e.id for e in vault.entries()] == [1, 2]
+
+
+def test_restoring_a_failed_edit_brings_back_the_old_entry(vault):
+    staged = vault.stage_update(2, "edited", "user2", "new")
+    assert vault.filter("edited")[0].id == 2
+
+    vault.restore(staged)
+    assert vault.filter("edited") == [] and vault.entries()[1].website == "site1"
+
+
+def test_editing_an_uncached_entry_leaves_the_pages_in_order(vault):
+    vault.restore(vault.stage_update(5, "edited", "user4", "new"))
+    vault.stage_update(5, "edited", "user4", "new")
+    vault.load_all()
+    assert [e.id for e in vault.entries()] == [1, 2, 3, 4, 5]
+
+
+def test_entry_saved_before_the_last_page_is_added_is_kept(vault):
+    rows = vault.fetch_page(vault.cursor, 10)  # Read before the save
+    entry_id = vault.save("site5", "user5", "p5")
+    vault.record_added(entry_id, "site5", "user5")
+
+    assert [e.id for e in vault.add_page(2, rows, 10)] == [3, 4, 5, 6]
+    assert vault.total == 6 and [e.id for e in vault.entries()] == [1, 2, 3, 4, 5, 6]
+
+
+def test_entry_saved_and_read_with_the_last_page_is_cached_once(vault):
+    entry_id = vault.save("site5", "user5", "p5")
+    vault.record_added(entry_id, "site5", "user5")
+    vault.add_page(2, vault.fetch_page(vault.cursor, 10), 10)  # Read after the save
+
+    assert vault.total == 6 and [e.id for e in vault.entries()] == [1, 2, 3, 4, 5, 6]
+
+
+def test_page_read_before_a_delete_does_not_bring_the_entry_back(vault):
+    rows = vault.fetch_page(vault.cursor, 10)  # Still has entry 4
+    staged = vault.stage_delete(4)
+    vault.write_delete(4)
+    vault.add_page(2, rows, 10)
+    vault.record_deleted(4)
+
+    assert vault.total == 4 and [e.id for e in vault.entries()] == [1, 2, 3, 5]
+    assert staged[1] is None
+
+
+def test_page_read_after_a_delete_and_its_restore(vault):
+    staged = vault.stage_delete(4)
+    vault.restore(staged)  # The write failed
+    vault.add_page(2, vault.fetch_page(vault.cursor, 10), 10)
+
+    assert vault.total == 5 and [e.id for e in vault.entries()] == [1, 2, 3, 4, 5]
+
+
+def test_deleting_an_entry_saved_while_pages_load(vault):
+    entry_id = vault.save("site5", "user5", "p5")
+    vault.record_added(entry_id, "site5", "user5")
+    staged = vault.stage_delete(entry_id)
+    vault.restore(staged)
+    vault.load_all()
+
+    assert [e.id for e in vault.entries()] == [1, 2, 3, 4, 5, 6]
+
+
+def test_blind_index_search_split_for_a_worker_thread(vault):
+    database.encrypt_vault_metadata(MASTER_PASSWORD, vault.cipher)
+    vault.load()
+    vault.stage_delete(4)
+
+    rows = vault.find("site")  # What the GUI runs on its database worker
+    assert [row[0] for row in rows] == [1, 2, 3, 4, 5]
+    assert [e.id for e in vault.matched(rows)] == [1, 2, 3, 5]
+    assert vault.matched(rows)[0] is vault.entries()[0]
@@ -0,0 +1,92 @@
+"""Cipher.decrypt_many must accept and reject exactly the tokens Fernet.decrypt does"""
+
+import base64
+import hmac
+import os
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.ciphers import Cipher as AESCipher, algorithms, modes
+
+from derive_key import Cipher
+
+KEY = Fernet.generate_key()
+
+
+def forge(plaintext, version=0x80, pad=True, key=KEY):
+    """A token with a valid MAC around plaintext, padded (or not) and under any version byte"""
+    raw_key = base64.urlsafe_b64decode(key)
+    if pad:
+        size = 16 - len(plaintext) % 16
+        plaintext += bytes([size]) * size
+    iv = os.urandom(16)
+    encryptor = AESCipher(algorithms.AES(raw_key[16:]), modes.CBC(iv)).encryptor()
+    data = bytes([version]) + bytes(8) + iv + encryptor.update(plaintext) + encryptor.finalize()
+    return base64.urlsafe_b64encode(data + hmac.digest(raw_key[:16], data, 'sha256'))
+
+
+def fernet_outcome(token):
+    try:
+        return Fernet(KEY).decrypt(token).decode()
+    except InvalidToken:
+        return InvalidToken
+
+
+def decrypt_many_outcome(tokens):
+    try:
+        return Cipher(KEY).decrypt_many(tokens)
+    except InvalidToken:
+        return InvalidToken
+
+
+@pytest.mark.parametrize('size', [0, 1, 15, 16, 17, 32, 100, 4096])
+def test_plaintexts_of_every_shape_match_fernet(size):
+    fernet = Fernet(KEY)
+    tokens = [fernet.encrypt(b'x' * size), fernet.encrypt('é'.encode() * size), forge(b'y' * size)]
+    assert decrypt_many_outcome(tokens) == [fernet_outcome(token) for token in tokens]
+    assert decrypt_many_outcome([t.decode() for t in tokens]) == [fernet_outcome(token) for token in tokens]
+
+
+def tampered_mac():
+    data = bytearray(base64.urlsafe_b64decode(Fernet(KEY).encrypt(b'secret')))
+    data[-1] ^= 1
+    return base64.urlsafe_b64encode(bytes(data))
+
+
+def tampered_ciphertext():
+    data = bytearray(base64.urlsafe_b64decode(Fernet(KEY).encrypt(b'secret')))
+    data[30] ^= 1
+    return base64.urlsafe_b64encode(bytes(data))
+
+
+@pytest.mark.parametrize('token', [
+    pytest.param(tampered_mac(), id='tampered mac'),
+    pytest.param(tampered_ciphertext(), id='tampered ciphertext'),
+    pytest.param(Fernet(Fernet.generate_key()).encrypt(b'secret'), id='other key'),
+    pytest.param(forge(b'secret', version=0x81), id='bad version'),
+    pytest.param(forge(b'secret' + bytes(10), pad=False), id='zero padding'),
+    pytest.param(forge(b'secret' + bytes([1, 2, 3] * 3) + b'\x03', pad=False), id='wrong padding bytes'),
+    pytest.param(forge(b'x' * 15 + b'\x11', pad=False), id='padding past the block'),
+    pytest.param(forge(b'', pad=False), id='no ciphertext'),
+    pytest.param(b'', id='empty'),
+    pytest.param(b'not base64!', id='not base64'),
+    pytest.param(base64.urlsafe_b64encode(b'\x80' + bytes(60)), id='truncated'),
+])
+def test_bad_tokens_are_rejected_like_fernet(token):
+    assert fernet_outcome(token) is InvalidToken
+    good = Fernet(KEY).encrypt(b'fine')
+    assert decrypt_many_outcome([good, token]) is InvalidToken
+
+
+def test_non_ascii_str_token_is_an_invalid_token():
+    with pytest.raises(InvalidToken):
+        Cipher(KEY).decrypt_many(['gAAAAAé'])
+
+
+def test_a_token_that_is_not_bytes_or_str_is_a_type_error():
+    with pytest.raises(TypeError):
+        Cipher(KEY).decrypt_many([42])
+
+
+def test_empty_batch():
+    assert Cipher(KEY).decrypt_many([]) == []
@@ -0,0 +1,59 @@
+"""KDF parameters of a vault: agreed on by racing first unlocks, never invented for existing rows"""
+
+import threading
+
+import pytest
+from cryptography.fernet import Fernet
+
+import database
+
+
+def test_racing_first_unlocks_get_the_stored_params(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    barrier = threading.Barrier(2)
+    real_tune = database.tune_kdf
+
+    def tune_together(*args):
+        params = real_tune(*args)
+        barrier.wait()  # Both callers have tuned before either stores
+        return params
+
+    monkeypatch.setattr(database, 'tune_kdf', tune_together)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        database.load_kdf_params('master', 'pbkdf2-sha256', 0.01))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    try:
+        stored = database.load_kdf_params('master')
+        assert results == [stored, stored]
+    finally:
+        database.close_vault('master')
+
+
+def test_vault_with_rows_but_no_kdf_params_is_refused(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.save_password('site', 'user', 'secret', Fernet.generate_key(), 'master')
+    database.close_vault('master')  # Reopened below as an existing vault, with no header and no salt.bin
+
+    try:
+        with pytest.raises(ValueError, match="no KDF parameters"):
+            database.load_kdf_params('master', 'pbkdf2-sha256', 0.01)
+        assert database.open_vault('master').get_meta('kdf') is None
+    finally:
+        database.close_vault('master')
+
+
+def test_existing_empty_vault_gets_fresh_params(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.create_database('master')
+    database.close_vault('master')
+
+    try:
+        params = database.load_kdf_params('master', 'pbkdf2-sha256', 0.01)
+        assert database.load_kdf_params('master') == params
+    finally:
+        database.close_vault('master')
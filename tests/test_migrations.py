@@ -0,0 +1,50 @@
+"""Two processes opening an old vault at once must apply each migration once"""
+
+import sqlite3
+import threading
+import time
+
+import database
+
+DB_NAME = 'vault.db'
+
+
+def make_v5_vault():
+    """A vault file as the last schema version before the change counter left it"""
+    database.Vault(DB_NAME).close()
+    conn = sqlite3.connect(DB_NAME, isolation_level=None)
+    for event in ('insert', 'update', 'delete'):
+        conn.execute(f"DROP TRIGGER passwords_changed_{event}")
+    conn.execute("DELETE FROM vault_meta WHERE name = 'changes'")
+    conn.execute("PRAGMA user_version = 5")
+    conn.close()
+
+
+def test_concurrent_opens_migrate_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    make_v5_vault()
+
+    migrating = threading.Event()
+    applied = []
+    real_migration = database.MIGRATIONS[5]
+
+    def slow_migration(conn):
+        applied.append(threading.current_thread().name)
+        migrating.set()
+        time.sleep(0.2)  # The other opener reads the old version meanwhile
+        real_migration(conn)
+
+    monkeypatch.setattr(database, 'MIGRATIONS', database.MIGRATIONS[:5] + [slow_migration])
+    vaults = []
+    first = threading.Thread(target=lambda: vaults.append(database.Vault(DB_NAME)), name='first')
+    first.start()
+    migrating.wait()
+    vaults.append(database.Vault(DB_NAME))
+    first.join()
+
+    try:
+        assert applied == ['first']
+        assert sorted([version for version, _ in vault.migration_log] for vault in vaults) == [[], [6]]
+    finally:
+        for vault in vaults:
+            vault.close()
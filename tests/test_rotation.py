@@ -0,0 +1,111 @@
+"""Resuming an interrupted master-password rotation must never lose an edit"""
+
+import os
+
+import pytest
+
+import database
+from derive_key import Cipher, derive_key, tune_kdf
+
+OLD_PASSWORD = 'old master password'
+NEW_PASSWORD = 'new master password'
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def vault(tmp_path, monkeypatch):
+    """A 4-entry vault in a scratch directory, and its key"""
+    monkeypatch.chdir(tmp_path)
+    key = derive_key(OLD_PASSWORD, database.load_kdf_params(OLD_PASSWORD, 'pbkdf2-sha256', 0.01))
+    database.import_entries(({'website': f"site{i}", 'username': f"user{i}", 'password': f"p{i}"}
+                             for i in range(4)), key, OLD_PASSWORD)
+    yield key
+    database.close_vault(OLD_PASSWORD)
+    database.close_vault(NEW_PASSWORD)
+
+
+def rotate(key, **options):
+    return database.rotate_master_password(OLD_PASSWORD, key, NEW_PASSWORD, tune_kdf('pbkdf2-sha256', 0.01),
+                                           batch_size=2, **options)
+
+
+def stop_after_first_batch(done, elapsed):
+    raise Interrupted
+
+
+def new_vault_secrets(new_key):
+    return {entry['id']: entry['password'] for entry in database.get_passwords(Cipher(new_key), NEW_PASSWORD)}
+
+
+def test_edit_after_interruption_restarts_the_copy(vault):
+    with pytest.raises(Interrupted):
+        rotate(vault, progress=stop_after_first_batch)
+
+    # Same second as the interrupted batch: timestamps alone cannot tell
+    database.update_password(1, "site0", "user0", "CHANGED", vault, OLD_PASSWORD)
+
+    new_key, stats = rotate(vault)
+    assert stats['resumed_from'] == 0
+    assert new_vault_secrets(new_key) == {1: "CHANGED", 2: "p1", 3: "p2", 4: "p3"}
+
+
+def test_unchanged_vault_resumes(vault):
+    with pytest.raises(Interrupted):
+        rotate(vault, progress=stop_after_first_batch)
+
+    new_key, stats = rotate(vault)
+    assert stats['resumed_from'] == 2
+    assert new_vault_secrets(new_key) == {1: "p0", 2: "p1", 3: "p2", 4: "p3"}
+
+
+def test_interrupted_rename_resumes(vault, monkeypatch):
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        raise Interrupted
+
+    monkeypatch.setattr(database.os, 'replace', failing_replace)
+    with pytest.raises(Interrupted):
+        rotate(vault)
+    monkeypatch.setattr(database.os, 'replace', real_replace)
+
+    new_key, stats = rotate(vault)
+    assert stats['resumed_from'] == 4
+    assert new_vault_secrets(new_key) == {1: "p0", 2: "p1", 3: "p2", 4: "p3"}
+    assert not os.path.exists(database.get_user_db_name(OLD_PASSWORD))
+
+
+def test_edit_during_the_copy_is_not_lost(vault):
+    edited = []
+
+    def edit_copied_row(done, elapsed):
+        if not edited:
+            database.update_password(1, "site0", "user0", "CHANGED", vault, OLD_PASSWORD)
+            edited.append(done)
+
+    new_key, stats = rotate(vault, progress=edit_copied_row)
+    assert stats['resumed_from'] == 0 and stats['rotated'] == 4
+    assert new_vault_secrets(new_key) == {1: "CHANGED", 2: "p1", 3: "p2", 4: "p3"}
+    assert not os.path.exists(database.get_user_db_name(OLD_PASSWORD))
+
+
+def test_run_interrupted_after_the_rename_only_cleans_up(vault, monkeypatch):
+    real_end_rotation = database.Vault.end_rotation
+
+    def failing_end_rotation(self):
+        raise Interrupted
+
+    monkeypatch.setattr(database.Vault, 'end_rotation', failing_end_rotation)
+    with pytest.raises(Interrupted):
+        rotate(vault)
+    monkeypatch.setattr(database.Vault, 'end_rotation', real_end_rotation)
+    assert os.path.exists(database.get_user_db_name(OLD_PASSWORD))
+
+    new_key, stats = rotate(vault)
+    assert stats['resumed_from'] == 4
+    assert new_vault_secrets(new_key) == {1: "p0", 2: "p1", 3: "p2", 4: "p3"}
+    assert not os.path.exists(database.get_user_db_name(OLD_PASSWORD))
+    assert database.open_vault(NEW_PASSWORD).rotation_checkpoint() is None
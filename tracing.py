@@ -0,0 +1,226 @@
+"""Opt-in tracing of the hot paths: spans and counters that cost next to nothing when off.
+
+Set $PASSWORD_MANAGER_TRACE to a file name (or to 1, for trace.json), or
+pass --trace FILE to the CLI. At exit the spans are written there as Chrome
+trace JSON, to open in chrome://tracing or ui.perfetto.dev, and a table of
+time per span name goes to stderr.
+
+    with span('vault.search', query=query):
+        ...
+    count('cipher.rows_decrypted', len(tokens))
+
+    @traced('kdf.get_key_from_password')
+    def get_key_from_password(...): ...
+
+When tracing is off, span() hands back one shared no-op context manager,
+count() returns at once, and a traced function costs one extra call and a
+None check.
+"""
+
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+import types
+from collections import defaultdict
+
+TRACE_ENV = 'PASSWORD_MANAGER_TRACE'
+# Set by the traced process, so worker processes inheriting TRACE_ENV do not
+# each write (over) the trace at their own exit
+TRACE_OWNER_ENV = 'PASSWORD_MANAGER_TRACE_PID'
+DEFAULT_TRACE_FILE = 'trace.json'
+
+# code.co_flags bit of generator functions (inspect.CO_GENERATOR; inspect itself is slow to import)
+CO_GENERATOR = 0x20
+
+# Spans past this many still count in the summary, but are not written to the trace
+MAX_EVENTS = 500_000
+
+_tracer = None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class Tracer:
+    """Collects spans and counters for one process; thread-safe"""
+
+    def __init__(self, path):
+        self.path = path
+        self.origin = time.perf_counter_ns()
+        self.events = []
+        self.dropped = 0
+        self.totals = {}  # name -> [calls, total ns, max ns]
+        self.counters = defaultdict(int)
+        self.threads = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, start, end, args):
+        duration = end - start
+        thread_id = threading.get_ident()
+        with self.lock:
+            totals = self.totals.get(name)
+            if totals is None:
+                self.totals[name] = [1, duration, duration]
+            else:
+                totals[0] += 1
+                totals[1] += duration
+                if duration > totals[2]:
+                    totals[2] = duration
+            if len(self.events) < MAX_EVENTS:
+                self.events.append((name, start, duration, thread_id, args))
+            else:
+                self.dropped += 1
+            if thread_id not in self.threads:
+                self.threads[thread_id] = threading.current_thread().name
+
+    def add(self, name, amount):
+        with self.lock:
+            self.counters[name] += amount
+
+    def chrome_trace(self):
+        """The trace as a Chrome trace-event document; times are in microseconds"""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': name}}
+                  for thread_id, name in self.threads.items()]
+        for name, start, duration, thread_id, args in self.events:
+            event = {'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': thread_id,
+                     'ts': (start - self.origin) / 1000, 'dur': duration / 1000}
+            if args:
+                event['args'] = args
+            events.append(event)
+        if self.counters:
+            end = (time.perf_counter_ns() - self.origin) / 1000
+            events.append({'name': 'counters', 'ph': 'C', 'pid': pid, 'tid': 0, 'ts': end,
+                           'args': dict(self.counters)})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'dropped_spans': self.dropped}}
+
+    def write(self):
+        import json
+
+        with open(self.path, 'w') as f:
+            json.dump(self.chrome_trace(), f, default=str)
+
+    def summary_rows(self):
+        """[name, calls, total ms, mean µs, max ms] per span name, the most total time first"""
+        return [[name, f"{calls:,}", f"{total / 1e6:,.2f}", f"{total / calls / 1e3:,.1f}", f"{longest / 1e6:,.2f}"]
+                for name, (calls, total, longest)
+                in sorted(self.totals.items(), key=lambda item: item[1][1], reverse=True)]
+
+    def print_summary(self, file=sys.stderr):
+        header = ["span", "calls", "total ms", "mean µs", "max ms"]
+        rows = self.summary_rows()
+        widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+        print(f"\ntrace: {len(self.events):,} spans written to {self.path}"
+              + (f" ({self.dropped:,} more only counted)" if self.dropped else ""), file=file)
+        for row in [header, ['-' * width for width in widths]] + rows:
+            print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)), file=file)
+        for name, value in sorted(self.counters.items()):
+            print(f"{name} = {value:,}", file=file)
+
+
+def span(name, **args):
+    """Context manager timing the block as a span called name; args are shown with it in the trace"""
+    if _tracer is None:
+        return NULL_SPAN
+    return _Span(_tracer, name, args)
+
+
+def count(name, amount=1):
+    """Add amount to the counter called name"""
+    if _tracer is not None:
+        _tracer.add(name, amount)
+
+
+def traced(name=None):
+    """Decorator: every call of the function is a span (named after it by default)"""
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _Span(_tracer, label, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def trace_methods(prefix):
+    """Class decorator: trace __init__ and every public method as prefix.method.
+
+    Generator methods, and context managers built from one, are left alone:
+    a span around one would also time whatever the caller does in between.
+    """
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            if (isinstance(value, types.FunctionType) and (attr == '__init__' or not attr.startswith('_'))
+                    and not getattr(value, '__wrapped__', value).__code__.co_flags & CO_GENERATOR):
+                setattr(cls, attr, traced(f"{prefix}.{attr.strip('_')}")(value))
+        return cls
+    return decorate
+
+
+def enabled():
+    return _tracer is not None
+
+
+def enable(path=DEFAULT_TRACE_FILE):
+    """Start tracing (if it is not on already); the trace is written at exit"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(path)
+        atexit.register(finish)
+    return _tracer
+
+
+def disable():
+    """Stop tracing and return the Tracer, without writing anything"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def finish():
+    """Stop tracing, write the trace file and print the summary"""
+    tracer = disable()
+    if tracer is None:
+        return None
+    tracer.write()
+    tracer.print_summary()
+    return tracer
+
+
+if os.environ.get(TRACE_ENV) and os.environ.setdefault(TRACE_OWNER_ENV, str(os.getpid())) == str(os.getpid()):
+    enable(DEFAULT_TRACE_FILE if os.environ[TRACE_ENV] == '1' else os.environ[TRACE_ENV])
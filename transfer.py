@@ -0,0 +1,241 @@
+"""Import readers and the streaming encrypted export archive.
+
+Every reader is a generator yielding {'website', 'username', 'password'}
+dicts, so database.import_entries can consume large files in batches.
+
+An export archive is a text file: a JSON header line with the KDF salt and
+iteration count, one Fernet token per entry, and a final token recording
+the entry count. Each token is keyed by the export passphrase and carries a
+sequence number, so a reader can detect reordered, dropped or truncated
+records while streaming.
+"""
+
+import base64
+import csv
+import json
+import os
+import time
+
+from cryptography.fernet import Fernet
+
+from database import iter_encrypted_chunks
+from derive_key import get_key_from_password, as_cipher
+
+# Column names accepted for each field, in order of preference. Covers our
+# own exports plus the usual browser and Bitwarden CSV layouts.
+WEBSITE_COLUMNS = ('website', 'name', 'url', 'login_uri', 'uri')
+USERNAME_COLUMNS = ('username', 'login_username', 'login', 'user', 'email')
+PASSWORD_COLUMNS = ('password', 'login_password')
+
+# Bitwarden item type for logins
+BITWARDEN_LOGIN = 1
+
+IMPORT_FORMATS = ('csv', 'json', 'jsonl', 'bitwarden', 'archive')
+
+ARCHIVE_FORMAT = 'password-manager-archive'
+ARCHIVE_VERSION = 1
+ARCHIVE_EXTENSION = '.pmx'
+ARCHIVE_ITERATIONS = 600_000
+
+
+def first_value(record, columns):
+    """Return the first non-empty value among columns, or ''"""
+    for column in columns:
+        value = record.get(column)
+        if value:
+            return str(value).strip()
+    return ''
+
+
+def normalize_entry(record):
+    """Map a loosely-keyed record to an entry dict, or None if it can't be stored"""
+    record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+    if record.get('type') not in (None, '', 'login'):
+        return None  # Bitwarden CSV notes, cards and identities
+
+    entry = {
+        'website': first_value(record, WEBSITE_COLUMNS),
+        'username': first_value(record, USERNAME_COLUMNS),
+        'password': first_value(record, PASSWORD_COLUMNS),
+    }
+    if not entry['website'] or not entry['password']:
+        return None
+    return entry
+
+
+def read_csv_entries(path):
+    """Stream entries from a CSV file with a header row"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for record in csv.DictReader(f):
+            entry = normalize_entry(record)
+            if entry:
+                yield entry
+
+
+def read_jsonl_entries(path):
+    """Stream entries from a JSON Lines file, one object per line"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = normalize_entry(json.loads(line))
+                if entry:
+                    yield entry
+
+
+def bitwarden_entries(items):
+    """Yield entries for the login items of a Bitwarden JSON export"""
+    for item in items:
+        if item.get('type') != BITWARDEN_LOGIN:
+            continue
+        login = item.get('login') or {}
+        uris = login.get('uris') or []
+        entry = {
+            'website': (item.get('name') or (uris[0].get('uri') if uris else '') or '').strip(),
+            'username': (login.get('username') or '').strip(),
+            'password': login.get('password') or '',
+        }
+        if entry['website'] and entry['password']:
+            yield entry
+
+
+def read_json_entries(path):
+    """Read entries from a JSON array or a Bitwarden JSON export.
+
+    The json module has no incremental parser, so the document itself is
+    loaded whole; use JSON Lines for exports too large for that.
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict) and 'items' in data:
+        yield from bitwarden_entries(data['items'])
+        return
+
+    for record in data:
+        entry = normalize_entry(record)
+        if entry:
+            yield entry
+
+
+def archive_fernet(passphrase, header):
+    """Build the Fernet for an archive from its passphrase and header"""
+    if header.get('format') != ARCHIVE_FORMAT or header.get('version') != ARCHIVE_VERSION:
+        raise ValueError("Not a supported password export archive")
+    salt = base64.b64decode(header['salt'])
+    return Fernet(get_key_from_password(passphrase, salt, header['iterations']))
+
+
+def export_archive(path, key, master_password, passphrase, progress=None):
+    """Stream the vault into an encrypted archive at path, one row at a time.
+
+    Rows are read in chunks, batch-decrypted with the vault key and immediately
+    re-encrypted under the passphrase, so peak memory does not grow with
+    the vault. The file is written under a temporary name and renamed into
+    place once complete. Returns a dict with 'exported', 'seconds' and
+    'rows_per_sec'.
+    """
+    start = time.perf_counter()
+    header = {
+        'format': ARCHIVE_FORMAT,
+        'version': ARCHIVE_VERSION,
+        'kdf': 'pbkdf2-sha256',
+        'iterations': ARCHIVE_ITERATIONS,
+        'salt': base64.b64encode(os.urandom(16)).decode(),
+    }
+    fernet = archive_fernet(passphrase, header)
+    cipher = as_cipher(key)
+    exported = 0
+    tmp_path = path + '.tmp'
+
+    try:
+        with open(tmp_path, 'w', encoding='ascii') as f:
+            f.write(json.dumps(header) + '\n')
+            for rows in iter_encrypted_chunks(master_password, key=cipher):
+                passwords = cipher.decrypt_many([row[3] for row in rows])
+                for (_, website, username, _), password in zip(rows, passwords):
+                    record = {
+                        'seq': exported,
+                        'website': website,
+                        'username': username,
+                        'password': password,
+                    }
+                    f.write(fernet.encrypt(json.dumps(record).encode()).decode() + '\n')
+                    exported += 1
+                if progress:
+                    progress(exported, time.perf_counter() - start)
+
+            trailer = {'seq': exported, 'end': True, 'count': exported}
+            f.write(fernet.encrypt(json.dumps(trailer).encode()).decode() + '\n')
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    seconds = time.perf_counter() - start
+    return {
+        'exported': exported,
+        'seconds': seconds,
+        'rows_per_sec': exported / seconds if seconds else 0.0
+    }
+
+
+def read_archive(path, passphrase):
+    """Stream and verify the entries of an encrypted export archive.
+
+    Raises ValueError on a wrong passphrase or on a tampered, reordered or
+    truncated archive; since that can only be known once the trailer is
+    reached, importers should consume this inside a single transaction.
+    """
+    with open(path, encoding='ascii') as f:
+        fernet = archive_fernet(passphrase, json.loads(f.readline()))
+        expected_seq = 0
+        for line in f:
+            try:
+                record = json.loads(fernet.decrypt(line.strip().encode()))
+            except Exception:
+                raise ValueError("Archive record could not be decrypted: wrong passphrase or corrupted file") from None
+
+            if record.get('seq') != expected_seq:
+                raise ValueError("Archive records are out of order or missing")
+            if record.get('end'):
+                if record.get('count') != expected_seq or f.readline():
+                    raise ValueError("Archive trailer does not match its contents")
+                return
+
+            yield {'website': record['website'], 'username': record['username'], 'password': record['password']}
+            expected_seq += 1
+
+    raise ValueError("Archive is truncated: trailer record missing")
+
+
+def verify_archive(path, passphrase):
+    """Read an archive end to end without importing it; returns the entry count"""
+    return sum(1 for _ in read_archive(path, passphrase))
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if '.' + extension == ARCHIVE_EXTENSION:
+        return 'archive'
+    if extension in ('json', 'bitwarden'):
+        return 'json'
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_entries(path, fmt=None, passphrase=None):
+    """Stream entries from path, picking the reader from fmt or the file extension"""
+    fmt = fmt or detect_format(path)
+    if fmt == 'archive':
+        if passphrase is None:
+            raise ValueError("A passphrase is required to import an export archive")
+        return read_archive(path, passphrase)
+    if fmt == 'csv':
+        return read_csv_entries(path)
+    if fmt == 'jsonl':
+        return read_jsonl_entries(path)
+    if fmt in ('json', 'bitwarden'):
+        return read_json_entries(path)
+    raise ValueError(f"Unsupported import format: {fmt}")